@@ -0,0 +1,303 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+# One <artifact>.manifest.json next to every pipeline artifact: content hash,
+# lineage, tensor specs, op histogram, FLOPs, preprocessing and DPU target.
+# check_manifest() is what loaders call - it hashes only the artifact's key
+# file (the .pb itself, or a SavedModel's saved_model.pb, not its variables)
+# and compares a few fields. A copy to the board keeps the hash, unlike mtime.
+
+# --- CONFIG ---
+ARCH_JSON       = "arch.json"
+MANIFEST_SUFFIX = ".manifest.json"
+ONNX_MODEL      = "yolo12n_op12_static_1_640.onnx"
+ONNX_OPT        = "yolo12n_op12_static_1_640_opt.onnx"   # coco_calib.py converts this one
+
+# artifact -> what it was produced from
+SOURCES = {
+    ONNX_OPT:                              ONNX_MODEL,
+    "yolo12_tf_model":                     ONNX_OPT,
+    "yolo12_tf_fixed":                     "yolo12_tf_model",
+    "frozen_yolo.pb":                      "yolo12_tf_fixed",
+    "frozen_yolo_clean.pb":                "frozen_yolo.pb",
+    "frozen_yolo_stripped.pb":             "frozen_yolo_clean.pb",
+    "frozen_yolo_no_split.pb":             "frozen_yolo_stripped.pb",
+    "frozen_yolo_dpu_only.pb":             "frozen_yolo_no_split.pb",
+    "frozen_yolo_backbone.pb":             "frozen_yolo_clean.pb",
+    "quant_output/quantized.h5":           "yolo12_tf_fixed",
+    "quant_output/quantize_eval_model.pb": "frozen_yolo_no_split.pb",
+    "quant_output/deploy_model.pb":        "frozen_yolo_no_split.pb",
+}
+ARTIFACTS = [ONNX_MODEL] + list(SOURCES)
+
+# Quantized/compiled artifacts only run on the DPU they were built for
+DPU_KINDS = {'keras_h5', 'quantized_pb', 'xmodel'}
+
+
+def manifest_path(path):
+    return path.rstrip('/') + MANIFEST_SUFFIX
+
+
+def target_fingerprint(arch_json=ARCH_JSON):
+    if not os.path.exists(arch_json):
+        return None
+    with open(arch_json) as f:
+        return json.load(f).get('fingerprint')
+
+
+def preprocess_config():
+    """What the network input means - must match between calibration, eval and runtime."""
+    import preprocess
+    return {
+        'height': preprocess.INPUT_HEIGHT, 'width': preprocess.INPUT_WIDTH,
+        'layout': 'NHWC', 'color': 'RGB', 'scale': '1/255', 'letterbox': True,
+        'pad_value': preprocess.PAD_VALUE,
+    }
+
+
+def key_hash(path):
+    """Change detector: sha256 of the file, or of a SavedModel's saved_model.pb."""
+    if os.path.isdir(path):
+        path = os.path.join(path, "saved_model.pb")
+    return content_hash(path)
+
+
+def content_hash(path):
+    """sha256 of a file, or of every (relative path, file hash) pair under a directory."""
+    if not os.path.isdir(path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            h.update(os.path.relpath(full, path).encode())
+            h.update(content_hash(full).encode())
+    return h.hexdigest()
+
+
+def artifact_kind(path):
+    if os.path.isdir(path):
+        return 'saved_model'
+    if path.endswith(".onnx"):
+        return 'onnx'
+    if path.endswith(".h5"):
+        return 'keras_h5'
+    if path.endswith(".xmodel"):
+        return 'xmodel'
+    if path.endswith(".pb"):
+        return 'quantized_pb' if os.path.basename(os.path.dirname(path)).startswith("quant") else 'frozen_pb'
+    return 'file'
+
+
+# ----------------------------------------------------------------------------
+# Per-kind description: tensor specs, node names, ops, FLOPs
+# ----------------------------------------------------------------------------
+
+def _spec(name, shape, dtype):
+    return {'name': name, 'shape': [d if d is None else int(d) for d in shape], 'dtype': dtype}
+
+
+def _describe_graph_def(graph_def):
+    import tensorflow as tf
+    from graph_stats import flop_profile, op_histogram
+    from rewrite_utils import graph_endpoints
+
+    inputs, outputs = graph_endpoints(graph_def)
+    flops, shapes = flop_profile(graph_def)
+    nodes = {n.name: n for n in graph_def.node}
+
+    def spec(tensor):
+        base, _, idx = tensor.partition(':')
+        outs = shapes.get(base) or []
+        shape = outs[int(idx or 0)] if outs else None
+        node = nodes[base]
+        dtype_attr = 'dtype' if 'dtype' in node.attr else 'T' if 'T' in node.attr else None
+        dtype = tf.as_dtype(node.attr[dtype_attr].type).name if dtype_attr else None
+        return _spec(tensor, shape or [], dtype)
+
+    return {
+        'inputs': [spec(t) for t in inputs],
+        'outputs': [spec(t) for t in outputs],
+        'nodes': len(graph_def.node),
+        'op_histogram': op_histogram(graph_def),
+        'flops': int(sum(flops.values())),
+    }
+
+
+def describe(path, kind):
+    if kind in ('frozen_pb', 'quantized_pb'):
+        from const_store import load_topology
+        return _describe_graph_def(load_topology(path))
+
+    if kind == 'onnx':
+        import onnx
+        model = onnx.load(path, load_external_data=False)
+
+        def spec(v):
+            t = v.type.tensor_type
+            return _spec(v.name, [d.dim_value or None for d in t.shape.dim],
+                         onnx.TensorProto.DataType.Name(t.elem_type).lower())
+
+        ops = {}
+        for n in model.graph.node:
+            ops[n.op_type] = ops.get(n.op_type, 0) + 1
+        return {'inputs': [spec(v) for v in model.graph.input],
+                'outputs': [spec(v) for v in model.graph.output],
+                'nodes': len(model.graph.node), 'op_histogram': ops, 'flops': None,
+                'opset': [o.version for o in model.opset_import]}
+
+    if kind == 'saved_model':
+        import tensorflow as tf
+        loaded = tf.saved_model.load(path)
+        if "serving_default" not in loaded.signatures:
+            return {'inputs': [], 'outputs': [], 'nodes': None, 'op_histogram': {}, 'flops': None,
+                    'signatures': list(loaded.signatures)}
+        fn = loaded.signatures["serving_default"]
+        graph_def = fn.graph.as_graph_def()
+        ops = {}
+        for n in list(graph_def.node) + [n for f in graph_def.library.function for n in f.node_def]:
+            ops[n.op] = ops.get(n.op, 0) + 1
+        return {
+            'inputs': [_spec(k, v.shape.as_list(), v.dtype.name)
+                       for k, v in fn.structured_input_signature[1].items()],
+            'outputs': [_spec(k, v.shape.as_list(), v.dtype.name)
+                        for k, v in sorted(fn.structured_outputs.items())],
+            'nodes': sum(ops.values()), 'op_histogram': ops, 'flops': None,
+            'signatures': list(loaded.signatures),
+        }
+
+    if kind == 'keras_h5':
+        import tensorflow as tf
+        try:
+            from tensorflow_model_optimization.quantization.keras import vitis_quantize
+            with vitis_quantize.quantize_scope():
+                model = tf.keras.models.load_model(path, compile=False)
+        except ImportError:
+            model = tf.keras.models.load_model(path, compile=False)
+        ops = {}
+        for layer in model.layers:
+            ops[type(layer).__name__] = ops.get(type(layer).__name__, 0) + 1
+        return {'inputs': [_spec(t.name, t.shape.as_list(), t.dtype.name) for t in model.inputs],
+                'outputs': [_spec(t.name, t.shape.as_list(), t.dtype.name) for t in model.outputs],
+                'nodes': len(model.layers), 'op_histogram': ops, 'flops': None}
+
+    return {'inputs': [], 'outputs': [], 'nodes': None, 'op_histogram': {}, 'flops': None}
+
+
+# ----------------------------------------------------------------------------
+# Generate / check
+# ----------------------------------------------------------------------------
+
+def _source_entry(path):
+    source = SOURCES.get(path)
+    if source is None or not os.path.exists(source):
+        return None
+    mpath = manifest_path(source)
+    if os.path.exists(mpath):
+        with open(mpath) as f:
+            return {'path': source, 'sha256': json.load(f)['sha256']}
+    return {'path': source, 'sha256': content_hash(source)}
+
+
+def write_manifest(path):
+    kind = artifact_kind(path)
+    start = time.perf_counter()
+    manifest = {
+        'path': path,
+        'kind': kind,
+        'sha256': content_hash(path),
+        'key_sha256': key_hash(path),
+        'source': _source_entry(path),
+        'fingerprint': target_fingerprint(),
+        'preprocess': preprocess_config(),
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    manifest.update(describe(path, kind))
+    with open(manifest_path(path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"  {path}: {kind}, {manifest['nodes']} nodes, "
+          f"{len(manifest['inputs'])} in / {len(manifest['outputs'])} out "
+          f"({time.perf_counter() - start:.1f}s)")
+    return manifest
+
+
+def check_manifest(path, inputs=None, outputs=None):
+    """
+    Startup check for loaders. Returns the manifest (None if there isn't one).
+    Raises ValueError when the artifact can't work here: other DPU target,
+    different preprocessing, or missing input/output nodes. A stale manifest
+    (artifact rewritten since) prints a warning, and the checks still run.
+    """
+    mpath = manifest_path(path)
+    if not os.path.exists(mpath):
+        return None
+    with open(mpath) as f:
+        manifest = json.load(f)
+
+    if os.path.exists(path) and key_hash(path) != manifest.get('key_sha256'):
+        print(f"[manifest] {path} changed since {mpath} was written - "
+              f"regenerate with: python artifact_manifest.py generate {path}")
+
+    if manifest['kind'] in DPU_KINDS:
+        current = target_fingerprint()
+        if current and manifest.get('fingerprint') and current != manifest['fingerprint']:
+            raise ValueError(f"{path} was built for DPU {manifest['fingerprint']}, "
+                             f"{ARCH_JSON} targets {current}")
+    if manifest.get('preprocess') and manifest['preprocess'] != preprocess_config():
+        raise ValueError(f"{path} was calibrated with preprocessing {manifest['preprocess']}, "
+                         f"preprocess.py now does {preprocess_config()}")
+
+    def names(specs):
+        return {s['name'] for s in specs} | {s['name'].split(':')[0] for s in specs}
+
+    for want, have, label in ((inputs, manifest['inputs'], 'input'),
+                              (outputs, manifest['outputs'], 'output')):
+        missing = [n for n in (want or []) if n not in names(have)]
+        if missing:
+            raise ValueError(f"{path} has no {label} {missing}; it has {sorted(names(have))}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Artifact manifests: generate and validate")
+    parser.add_argument("cmd", choices=["generate", "check"])
+    parser.add_argument("paths", nargs="*", help="default: every existing pipeline artifact")
+    parser.add_argument("--deep", action="store_true", help="check: also recompute content hashes")
+    args = parser.parse_args()
+
+    paths = args.paths or [p for p in ARTIFACTS if os.path.exists(p)]
+    if args.cmd == "generate":
+        print(f"Writing manifests for {len(paths)} artifacts (target {target_fingerprint()})...")
+        for p in paths:
+            write_manifest(p)
+        return
+
+    bad = 0
+    for p in paths:
+        try:
+            manifest = check_manifest(p)
+        except ValueError as e:
+            print(f"  [FAIL] {e}")
+            bad += 1
+            continue
+        if manifest is None:
+            print(f"  [----] {p}: no manifest")
+            continue
+        if args.deep and content_hash(p) != manifest['sha256']:
+            print(f"  [FAIL] {p}: content hash differs from manifest")
+            bad += 1
+            continue
+        print(f"  [ OK ] {p}")
+    print(f"{len(paths) - bad}/{len(paths)} artifacts compatible")
+
+
+if __name__ == "__main__":
+    main()
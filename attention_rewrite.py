@@ -0,0 +1,224 @@
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from graph_profiler import block_of
+from graph_stats import infer_shapes, op_histogram
+from rewrite_utils import (base_name, compare_graphs, const_value, consumers_map,
+                           graph_endpoints, list_attr, make_const, make_node, node_map,
+                           print_comparison, prune, replace_nodes, sample_feeds,
+                           save_graph_def, type_attr, unique_name)
+
+# --- CONFIG ---
+INPUT_GRAPH  = "frozen_yolo_clean.pb"
+OUTPUT_GRAPH = "frozen_yolo_attn_rewritten.pb"
+CHECK_FEEDS  = 2        # calibration images used for the equivalence check
+
+MATMUL_OPS = {'MatMul', 'BatchMatMul', 'BatchMatMulV2'}
+
+
+def _static_shape(shapes, inp):
+    base, _, idx = inp.lstrip('^').partition(':')
+    outs = shapes.get(base) or []
+    shape = outs[int(idx) if idx else 0] if outs else None
+    return shape if shape is not None and None not in shape else None
+
+
+def fold_static_reshapes(graph_def, shapes):
+    """Reshape whose shape comes from Shape/Pack/... but is statically known -> Const shape."""
+    nodes = node_map(graph_def)
+    replacements = {}
+    for n in graph_def.node:
+        if n.op != 'Reshape' or const_value(nodes, n.input[1]) is not None:
+            continue
+        out = _static_shape(shapes, n.name)
+        if out is None:
+            continue
+        shape_const = make_const(n.name + "/static_shape", np.array(out, np.int32))
+        new = tf.compat.v1.NodeDef()
+        new.CopyFrom(n)
+        new.input[1] = shape_const.name
+        new.attr['Tshape'].CopyFrom(type_attr(tf.int32))
+        replacements[n.name] = [shape_const, new]
+    return replace_nodes(graph_def, replacements), sorted(replacements)
+
+
+def matmul_to_conv(graph_def, shapes):
+    """
+    x @ W with constant W -> Reshape(x, [1, 1, rows, K]) -> 1x1 Conv2D -> Reshape.
+    Exact: a 1x1 conv is a matmul over every spatial position. The final
+    Reshape keeps the MatMul's name so consumers don't change.
+    """
+    nodes = node_map(graph_def)
+    replacements = {}
+    for n in graph_def.node:
+        if n.op not in MATMUL_OPS:
+            continue
+        if any(k in n.attr and n.attr[k].b for k in ('transpose_a', 'adj_x')):
+            continue
+        w = const_value(nodes, n.input[1])
+        x_shape = _static_shape(shapes, n.input[0])
+        out_shape = _static_shape(shapes, n.name)
+        if w is None or x_shape is None or out_shape is None or w.dtype != np.float32:
+            continue
+        if w.ndim > 2:
+            if any(d != 1 for d in w.shape[:-2]):
+                continue  # per-batch weights: not a shared projection
+            w = w.reshape(w.shape[-2:])
+        if any(k in n.attr and n.attr[k].b for k in ('transpose_b', 'adj_y')):
+            w = w.T
+        k, units = w.shape
+        rows = int(np.prod(x_shape[:-1]))
+
+        f32 = type_attr(tf.float32)
+        i32 = type_attr(tf.int32)
+        in_shape = make_const(n.name + "/conv_in_shape", np.array([1, 1, rows, k], np.int32))
+        conv_in = make_node('Reshape', n.name + "/conv_in", [n.input[0], in_shape.name],
+                            T=f32, Tshape=i32)
+        filt = make_const(n.name + "/conv_filter", w.reshape(1, 1, k, units).astype(np.float32))
+        conv = make_node('Conv2D', n.name + "/conv", [conv_in.name, filt.name], T=f32,
+                         strides=list_attr([1, 1, 1, 1]), dilations=list_attr([1, 1, 1, 1]),
+                         padding=tf.compat.v1.AttrValue(s=b'VALID'),
+                         data_format=tf.compat.v1.AttrValue(s=b'NHWC'))
+        out = make_const(n.name + "/conv_out_shape", np.array(out_shape, np.int32))
+        result = make_node('Reshape', n.name, [conv.name, out.name], T=f32, Tshape=i32)
+        replacements[n.name] = [in_shape, conv_in, filt, conv, out, result]
+    return replace_nodes(graph_def, replacements), sorted(replacements)
+
+
+def collapse_layout_chains(graph_def, shapes):
+    """
+    Reshape(Reshape(x)) -> Reshape(x); Transpose(Transpose(x, p1), p2) ->
+    Transpose(x, p1[p2]); identity Transpose / same-shape Reshape -> Identity.
+    Leaves one static layout op where onnx2tf emitted a chain.
+    """
+    nodes = node_map(graph_def)
+    consumers = consumers_map(graph_def)
+    replacements = {}
+    for n in graph_def.node:
+        if n.op not in ('Reshape', 'Transpose'):
+            continue
+        new = tf.compat.v1.NodeDef()
+        new.CopyFrom(n)
+        inner = nodes.get(base_name(n.input[0]))
+        single_use = inner is not None and len(consumers[inner.name]) == 1
+
+        if n.op == 'Reshape':
+            if single_use and inner.op == 'Reshape' and ':' not in n.input[0]:
+                new.input[0] = inner.input[0]
+            in_shape = _static_shape(shapes, new.input[0])
+            if in_shape is not None and in_shape == _static_shape(shapes, n.name):
+                new = make_node('Identity', n.name, [new.input[0]], T=n.attr['T'])
+        else:
+            perm = const_value(nodes, n.input[1])
+            if perm is None:
+                continue
+            perm = [int(p) for p in perm]
+            extra = []
+            if single_use and inner.op == 'Transpose':
+                inner_perm = const_value(nodes, inner.input[1])
+                if inner_perm is not None:
+                    perm = [int(inner_perm[p]) for p in perm]
+                    perm_const = make_const(unique_name(nodes, n.name + "/composed_perm"),
+                                            np.array(perm, np.int32))
+                    new.input[0], new.input[1] = inner.input[0], perm_const.name
+                    new.attr['Tperm'].CopyFrom(type_attr(tf.int32))
+                    extra = [perm_const]
+            if perm == list(range(len(perm))):
+                new = make_node('Identity', n.name, [new.input[0]], T=n.attr['T'])
+                extra = []
+            if extra:
+                replacements[n.name] = extra + [new]
+                continue
+
+        if new != n:
+            replacements[n.name] = [new]
+    return replace_nodes(graph_def, replacements), sorted(replacements)
+
+
+def remaining_cpu_ops(graph_def, shapes):
+    """Attention ops that still need the CPU, grouped by model.N block."""
+    nodes = node_map(graph_def)
+    blocks = {}
+    for n in graph_def.node:
+        if n.op in MATMUL_OPS:
+            if const_value(nodes, n.input[1]) is not None:
+                continue
+            reason = "activation x activation"
+        elif n.op == 'Softmax':
+            reason = "softmax"
+        else:
+            continue
+        blocks.setdefault(block_of(n.name), []).append((n.op, reason, n.name))
+    return blocks
+
+
+def rewrite_attention(graph_def):
+    """All passes, to a fixpoint on the layout chains. Returns (graph_def, log)."""
+    inputs, outputs = graph_endpoints(graph_def)
+    log = {}
+
+    shapes = infer_shapes(graph_def)
+    graph_def, log['static_reshape'] = fold_static_reshapes(graph_def, shapes)
+    shapes = infer_shapes(graph_def)
+    graph_def, log['matmul_to_conv'] = matmul_to_conv(graph_def, shapes)
+
+    log['layout_collapse'] = []
+    while True:
+        shapes = infer_shapes(graph_def)
+        graph_def, changed = collapse_layout_chains(graph_def, shapes)
+        graph_def = prune(graph_def, outputs)
+        if not changed:
+            break
+        log['layout_collapse'].extend(changed)
+    return graph_def, log
+
+
+def main():
+    print(f"Loading {INPUT_GRAPH}...")
+    original = load_graph(INPUT_GRAPH)
+    inputs, outputs = graph_endpoints(original)
+    before = op_histogram(original)
+    print(f"Original graph: {len(original.node)} nodes")
+
+    rewritten, log = rewrite_attention(original)
+    after = op_histogram(rewritten)
+
+    print("\n" + "=" * 70)
+    print("REWRITES")
+    print("=" * 70)
+    for key, names in log.items():
+        print(f"  {key}: {len(names)}")
+    print(f"\nNodes: {len(original.node)} -> {len(rewritten.node)}")
+    for op in ('BatchMatMulV2', 'BatchMatMul', 'MatMul', 'Softmax', 'Reshape', 'Transpose', 'Conv2D'):
+        if before.get(op, 0) != after.get(op, 0):
+            print(f"  {op}: {before.get(op, 0)} -> {after.get(op, 0)}")
+
+    print("\n" + "=" * 70)
+    print("NUMERICAL CHECK (original vs rewritten)")
+    print("=" * 70)
+    existing = {n.name for n in rewritten.node}
+    checked = [n + ":0" for n in log['matmul_to_conv'] + log['static_reshape'] if n in existing]
+    feeds = sample_feeds(original, CHECK_FEEDS)
+    ok = print_comparison(compare_graphs(original, rewritten, outputs + checked, feeds))
+    if not ok:
+        print("\nERROR: Rewritten graph is not equivalent - not saving.")
+        return
+
+    save_graph_def(rewritten, OUTPUT_GRAPH)
+    print(f"\nSaved to {OUTPUT_GRAPH}")
+
+    print("\n" + "=" * 70)
+    print("STILL ON CPU (both operands are activations - no conv equivalent)")
+    print("=" * 70)
+    blocks = remaining_cpu_ops(rewritten, infer_shapes(rewritten))
+    if not blocks:
+        print("  None - the attention blocks are fully DPU-compatible.")
+    for block, ops in sorted(blocks.items()):
+        print(f"  {block}: {len(ops)} ops")
+        for op, reason, name in ops[:4]:
+            print(f"    [{op}] {name} ({reason})")
+
+
+if __name__ == "__main__":
+    main()
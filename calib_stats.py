@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from preprocess import Preprocessor, list_images, read_fix_pos
+from rewrite_utils import graph_endpoints
+
+# --- CONFIG ---
+INPUT_GRAPH = "frozen_yolo_clean.pb"
+CALIB_DIR   = "calib_dataset"
+STATS_FILE  = "calib_stats.npz"
+BINS        = 2048        # |x| histogram bins per tensor
+BIT_WIDTH   = 8
+PERCENTILE  = 99.99
+
+# Ops whose outputs vai_q puts an activation quantizer on
+TRACK_OPS = {
+    'Placeholder', 'Conv2D', 'DepthwiseConv2dNative', 'BiasAdd', 'Add', 'AddV2',
+    'Sub', 'Mul', 'Sigmoid', 'Relu', 'Relu6', 'LeakyRelu', 'MaxPool', 'AvgPool',
+    'ConcatV2', 'ResizeNearestNeighbor', 'MatMul', 'BatchMatMulV2', 'Softmax',
+}
+STRATEGIES = ('max', 'percentile', 'mse', 'kl')
+
+
+def graph_digest(graph_def):
+    """Stats are only valid for the graph they were collected on."""
+    return hashlib.sha1(graph_def.SerializeToString(deterministic=True)).hexdigest()
+
+
+class CalibStats:
+    """
+    Streaming per-tensor min/max and |x| histograms.
+
+    Each histogram covers [0, range) with BINS equal bins, where range is
+    the smallest power of two above every |x| seen so far. When a batch
+    exceeds it, the range doubles and bin pairs merge into the lower half.
+    Power-of-two ranges make that merge match binning at the final range
+    directly (bin edges scale exactly), so the result doesn't depend on the
+    order images arrive in. All-zero batches wait in bin 0 for a range.
+    """
+
+    def __init__(self, names, bins=BINS, digest=None):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.bins = bins
+        self.digest = digest
+        self.images = []
+        t = len(self.names)
+        self.count = np.zeros(t, np.int64)
+        self.min = np.full(t, np.inf)
+        self.max = np.full(t, -np.inf)
+        self.range = np.zeros(t)
+        self.hist = np.zeros((t, bins), np.float64)
+
+    def update(self, name, values):
+        i = self.index[name]
+        values = np.asarray(values, np.float32).ravel()
+        self.count[i] += values.size
+        self.min[i] = min(self.min[i], float(values.min(initial=np.inf)))
+        self.max[i] = max(self.max[i], float(values.max(initial=-np.inf)))
+        values = np.abs(values)
+        peak = float(values.max(initial=0.0))
+        if peak == 0:
+            self.hist[i, 0] += values.size
+            return
+        target = 2.0 ** (np.floor(np.log2(peak)) + 1)     # strictly above peak
+        if self.range[i] == 0:
+            self.range[i] = target
+        while self.range[i] < target:
+            h = self.hist[i]
+            h[:self.bins // 2] = h[0::2] + h[1::2]
+            h[self.bins // 2:] = 0
+            self.range[i] *= 2
+        counts, _ = np.histogram(values, bins=self.bins, range=(0, self.range[i]))
+        self.hist[i] += counts
+
+    def abs_max(self, name):
+        i = self.index[name]
+        return max(abs(self.min[i]), abs(self.max[i]))
+
+    def percentile(self, name, q=PERCENTILE):
+        """|x| percentile from the histogram, interpolated inside the bin."""
+        i = self.index[name]
+        cdf = np.cumsum(self.hist[i])
+        if cdf[-1] == 0:
+            return 0.0
+        target = cdf[-1] * q / 100.0
+        b = min(int(np.searchsorted(cdf, target)), self.bins - 1)
+        below = cdf[b - 1] if b else 0.0
+        frac = (target - below) / max(self.hist[i, b], 1.0)
+        return (b + frac) * self.range[i] / self.bins
+
+    def save(self, path=STATS_FILE):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, names=np.array(self.names), images=np.array(self.images, dtype=str),
+                 digest=np.array(self.digest or ""), bins=self.bins, count=self.count,
+                 min=self.min, max=self.max, range=self.range, hist=self.hist)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=STATS_FILE):
+        data = np.load(path)
+        stats = cls(data['names'].tolist(), int(data['bins']), str(data['digest']) or None)
+        stats.images = data['images'].tolist()
+        for key in ('count', 'min', 'max', 'range', 'hist'):
+            setattr(stats, key, data[key])
+        return stats
+
+
+# ----------------------------------------------------------------------------
+# Collection
+# ----------------------------------------------------------------------------
+
+def tracked_tensors(graph, all_float=False):
+    names = []
+    for op in graph.get_operations():
+        if not all_float and op.type not in TRACK_OPS:
+            continue
+        names.extend(t.name for t in op.outputs if t.dtype == tf.float32)
+    return names
+
+
+def accumulate(graph_def, image_files, stats=None, stats_path=STATS_FILE, all_float=False,
+               save_every=10):
+    """Run the float graph over images not yet in `stats`; saves as it goes so it can resume."""
+    digest = graph_digest(graph_def)
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+    if stats is None:
+        stats = CalibStats(tracked_tensors(graph, all_float), digest=digest)
+    elif stats.digest != digest:
+        raise ValueError("Stats were collected on a different graph - rerun with --reset")
+
+    seen = set(stats.images)
+    todo = [f for f in image_files if os.path.basename(f) not in seen]
+    print(f"{len(seen)} images already accumulated, {len(todo)} new")
+    if not todo:
+        return stats
+
+    input_name = graph_endpoints(graph_def)[0][0]
+    x = graph.get_tensor_by_name(input_name)
+    _, h, w, _ = x.shape.as_list()
+    pre = Preprocessor(batch_size=1, height=h, width=w)
+    fetches = [graph.get_tensor_by_name(n) for n in stats.names]
+
+    with tf.compat.v1.Session(graph=graph) as sess:
+        for k, path in enumerate(todo, 1):
+            pre.load_file(path)
+            for name, value in zip(stats.names, sess.run(fetches, {x: pre.batch})):
+                stats.update(name, value)
+            stats.images.append(os.path.basename(path))
+            if k % save_every == 0 or k == len(todo):
+                stats.save(stats_path)
+                print(f"  {len(stats.images)} images, saved {stats_path}")
+    return stats
+
+
+# ----------------------------------------------------------------------------
+# Fix positions (offline, from the histograms)
+# ----------------------------------------------------------------------------
+
+def fix_pos_for(threshold, bit_width=BIT_WIDTH):
+    """Largest fix position whose int range still covers `threshold`."""
+    q_max = 2 ** (bit_width - 1) - 1
+    if threshold <= 0:
+        return bit_width - 1
+    return int(np.floor(np.log2(q_max / threshold)))
+
+
+def _candidates(stats, name, bit_width, span=8):
+    top = fix_pos_for(stats.abs_max(name), bit_width)
+    return list(range(top, top + span + 1))
+
+
+def _mse(stats, i, pos, bit_width):
+    """Expected squared error: rounding noise inside the range, clipping outside."""
+    h = stats.hist[i]
+    width = stats.range[i] / stats.bins
+    centers = (np.arange(stats.bins) + 0.5) * width
+    step = 2.0 ** -pos
+    limit = (2 ** (bit_width - 1) - 1) * step
+    err = np.where(centers > limit, (centers - limit) ** 2, step * step / 12.0)
+    return float((h * err).sum() / max(h.sum(), 1.0))
+
+
+def _kl(stats, i, pos, bit_width):
+    """KL(P || Q): P = histogram clipped at the threshold, Q = P squashed to the int levels."""
+    h = stats.hist[i]
+    levels = 2 ** (bit_width - 1)
+    limit = (levels - 1) * 2.0 ** -pos
+    rng = stats.range[i] or 1.0     # 0 while only zeros were seen; they all sit in bin 0
+    edge = int(np.clip(round(limit / rng * stats.bins), 1, stats.bins))
+    p = h[:edge].copy()
+    p[-1] += h[edge:].sum()
+    if p.sum() == 0:
+        return 0.0
+    q = np.zeros_like(p)
+    for chunk in np.array_split(np.arange(edge), min(levels, edge)):
+        nonzero = p[chunk] > 0
+        if nonzero.any():
+            q[chunk[nonzero]] = p[chunk].sum() / nonzero.sum()
+    p, q = p / p.sum(), q / q.sum()
+    mask = p > 0
+    return float((p[mask] * np.log(p[mask] / np.maximum(q[mask], 1e-12))).sum())
+
+
+def fix_positions(stats, strategy='mse', bit_width=BIT_WIDTH, percentile=PERCENTILE):
+    """{tensor: fix position} for every tensor with data."""
+    out = {}
+    for name in stats.names:
+        i = stats.index[name]
+        if stats.count[i] == 0:
+            continue
+        if strategy == 'max':
+            out[name] = fix_pos_for(stats.abs_max(name), bit_width)
+        elif strategy == 'percentile':
+            out[name] = fix_pos_for(stats.percentile(name, percentile), bit_width)
+        elif strategy in ('mse', 'kl'):
+            cost = _mse if strategy == 'mse' else _kl
+            out[name] = min(_candidates(stats, name, bit_width), key=lambda p: cost(stats, i, p, bit_width))
+        else:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+    return out
+
+
+def compare_with_vai_q(positions):
+    """(tensor, ours, vai_q) for tensors vai_q left an aquant file for."""
+    rows = []
+    for name, pos in positions.items():
+        try:
+            rows.append((name, pos, read_fix_pos(name.split(':')[0])))
+        except (OSError, ValueError):
+            continue
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental calibration statistics")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    u = sub.add_parser("update", help="accumulate stats for images not seen yet")
+    u.add_argument("--graph", default=INPUT_GRAPH)
+    u.add_argument("--images", default=CALIB_DIR)
+    u.add_argument("--limit", type=int)
+    u.add_argument("--reset", action="store_true", help="discard existing stats")
+    u.add_argument("--all", action="store_true", help="track every float tensor")
+    f = sub.add_parser("fixpos", help="derive fix positions from the stored stats")
+    f.add_argument("--strategy", choices=STRATEGIES, default="mse")
+    f.add_argument("--bits", type=int, default=BIT_WIDTH)
+    f.add_argument("--percentile", type=float, default=PERCENTILE)
+    f.add_argument("--out", default="fix_pos.json")
+    for p in (u, f):
+        p.add_argument("--stats", default=STATS_FILE)
+    args = parser.parse_args()
+
+    if args.cmd == "update":
+        stats = None if args.reset or not os.path.exists(args.stats) else CalibStats.load(args.stats)
+        graph_def = load_graph(args.graph)
+        stats = accumulate(graph_def, list_images(args.images, args.limit), stats, args.stats, args.all)
+        print(f"{len(stats.names)} tensors over {len(stats.images)} images in {args.stats}")
+        return
+
+    stats = CalibStats.load(args.stats)
+    positions = fix_positions(stats, args.strategy, args.bits, args.percentile)
+    with open(args.out, "w") as fp:
+        json.dump({'strategy': args.strategy, 'bit_width': args.bits, 'images': len(stats.images),
+                   'fix_pos': positions}, fp, indent=2)
+    print(f"{args.strategy}: {len(positions)} fix positions from {len(stats.images)} images -> {args.out}")
+
+    rows = compare_with_vai_q(positions)
+    if rows:
+        diff = [r for r in rows if r[1] != r[2]]
+        print(f"vs vai_q ({len(rows)} tensors): {len(diff)} differ")
+        for name, ours, theirs in diff[:15]:
+            print(f"  {name}: {ours} (vai_q {theirs})")
+
+
+if __name__ == "__main__":
+    main()
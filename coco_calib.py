@@ -1,12 +1,20 @@
 import os
 import shutil
+import time
+
+import onnx
 from onnx2tf import convert
 
+from onnx_optimize import optimize
+
 # --- CONFIGURATION ---
 # The name of your ONNX file
 ONNX_FILE = "yolo12n_op12_static_1_640.onnx"
 # The output folder name
 OUTPUT_FOLDER = "yolo12_tf_model"
+# Simplify the ONNX graph first (onnx_optimize.py): fewer Identity / Transpose /
+# Reshape nodes for onnx2tf to turn into TF ops
+SIMPLIFY = True
 
 def main():
     # 1. Get absolute paths
@@ -28,8 +36,21 @@ def main():
         print("Removing old output folder...")
         shutil.rmtree(output_path)
 
-    # 4. Run Conversion
+    # 4. Simplify
+    if SIMPLIFY:
+        print("\nSimplifying ONNX graph...")
+        start = time.perf_counter()
+        model = onnx.load(input_path)
+        before = len(model.graph.node)
+        model, log = optimize(model)
+        input_path = os.path.splitext(input_path)[0] + "_opt.onnx"
+        onnx.save(model, input_path)
+        print(f"  {before} -> {len(model.graph.node)} nodes in {time.perf_counter() - start:.1f}s {log}")
+        print(f"  Converting {os.path.basename(input_path)}")
+
+    # 5. Run Conversion
     print("\nStarting conversion (this may take a minute)...")
+    start = time.perf_counter()
     try:
         # Convert ONNX to TF SavedModel
         # output_signature_defs=True helps Vitis identify inputs/outputs
@@ -40,7 +61,7 @@ def main():
             output_signature_defs=True,
             disable_group_convolution=True  # <--- ADD THIS LINE
         )
-        print("\nSUCCESS!")
+        print(f"\nSUCCESS! ({time.perf_counter() - start:.1f}s)")
         print(f"TensorFlow model saved to: {output_path}")
         print("You can now switch to Docker and run the quantization script.")
         
@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+import os
+import time
+import zlib
+
+import numpy as np
+import tensorflow as tf
+
+from artifact_manifest import check_manifest
+
+# --- CONFIG ---
+STORE_DIR   = "const_store"     # shared by every stage
+TOPO_SUFFIX = ".topo.pb"
+MIN_BYTES   = 1024              # smaller Consts stay inline in the topology
+STAGES = [
+    "frozen_yolo.pb",
+    "frozen_yolo_clean.pb",
+    "frozen_yolo_stripped.pb",
+    "frozen_yolo_no_split.pb",
+    "frozen_yolo_dpu_only.pb",
+    "frozen_yolo_backbone.pb",
+]
+
+# Const nodes moved to the store carry their blob digest in this attr; the
+# TensorProto keeps dtype and shape but no content.
+BLOB_ATTR = '_blob'
+ZLIB_EXT  = ".z"
+
+
+def topo_path(pb_path):
+    return pb_path[:-3] + TOPO_SUFFIX if pb_path.endswith(".pb") else pb_path + TOPO_SUFFIX
+
+
+def _blob_path(store_dir, digest, compressed=False):
+    return os.path.join(store_dir, digest[:2], digest + (ZLIB_EXT if compressed else ""))
+
+
+def _put_blob(store_dir, data, compress=False):
+    """Write data under its SHA-256 unless it's already there. Returns (digest, new)."""
+    digest = hashlib.sha256(data).hexdigest()
+    raw, packed = _blob_path(store_dir, digest), _blob_path(store_dir, digest, True)
+    if os.path.exists(raw) or os.path.exists(packed):
+        return digest, False
+    path = packed if compress else raw
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(zlib.compress(data, 6) if compress else data)
+    os.replace(tmp, path)  # atomic: concurrent writers of the same blob are harmless
+    return digest, True
+
+
+def _get_blob(store_dir, digest):
+    """Blob bytes. Raw blobs are memory-mapped; compressed ones are inflated."""
+    raw = _blob_path(store_dir, digest)
+    if os.path.exists(raw):
+        return np.memmap(raw, dtype=np.uint8, mode='r')
+    with open(_blob_path(store_dir, digest, True), "rb") as f:
+        return np.frombuffer(zlib.decompress(f.read()), np.uint8)
+
+
+def save_graph(graph_def, path, store_dir=STORE_DIR, min_bytes=MIN_BYTES, compress=False):
+    """
+    Write graph_def as a small topology .pb; Const payloads go to the shared
+    content-addressed store. Returns stats for the report.
+    """
+    topo = tf.compat.v1.GraphDef()
+    topo.CopyFrom(graph_def)
+    stats = {'consts': 0, 'stored': 0, 'new_blobs': 0, 'new_bytes': 0, 'stored_bytes': 0}
+    for node in topo.node:
+        if node.op != 'Const':
+            continue
+        stats['consts'] += 1
+        tensor = node.attr['value'].tensor
+        if tensor.ByteSize() < min_bytes or tensor.dtype == tf.string.as_datatype_enum:
+            continue
+        data = tf.make_ndarray(tensor).tobytes()
+        digest, new = _put_blob(store_dir, data, compress)
+        stats['stored'] += 1
+        stats['stored_bytes'] += len(data)
+        if new:
+            stats['new_blobs'] += 1
+            stats['new_bytes'] += len(data)
+
+        dtype, shape = tensor.dtype, tf.TensorShape(tensor.tensor_shape)
+        tensor.Clear()
+        tensor.dtype = dtype
+        tensor.tensor_shape.CopyFrom(shape.as_proto())
+        node.attr[BLOB_ATTR].s = digest.encode()
+
+    with tf.io.gfile.GFile(path, "wb") as f:
+        f.write(topo.SerializeToString())
+    return stats
+
+
+def load_topology(path):
+    """GraphDef without Const payloads - enough for op histograms, diffs, cut search."""
+    graph_def = tf.compat.v1.GraphDef()
+    with tf.io.gfile.GFile(path, "rb") as f:
+        graph_def.ParseFromString(f.read())
+    return graph_def
+
+
+def const_array(node, store_dir=STORE_DIR):
+    """Value of a Const node as an ndarray (memory-mapped when stored raw)."""
+    tensor = node.attr['value'].tensor
+    if BLOB_ATTR not in node.attr:
+        return tf.make_ndarray(tensor)
+    dtype = tf.as_dtype(tensor.dtype).as_numpy_dtype
+    shape = tf.TensorShape(tensor.tensor_shape).as_list()
+    return _get_blob(store_dir, node.attr[BLOB_ATTR].s.decode()).view(dtype).reshape(shape)
+
+
+def rehydrate(graph_def, store_dir=STORE_DIR):
+    """Fill stored Const payloads back in, in place. Returns the now-standard GraphDef."""
+    for node in graph_def.node:
+        if BLOB_ATTR in node.attr:
+            data = _get_blob(store_dir, node.attr[BLOB_ATTR].s.decode())
+            node.attr['value'].tensor.tensor_content = data.tobytes()
+            del node.attr[BLOB_ATTR]
+    return graph_def
+
+
+def load_graph(path, store_dir=STORE_DIR):
+    """
+    Standard GraphDef from either a plain frozen .pb or a topology .pb. A
+    missing .pb falls back to its topology (stages saved with full=False).
+    """
+    if not os.path.exists(path) and os.path.exists(topo_path(path)):
+        path = topo_path(path)
+    check_manifest(path)
+    return rehydrate(load_topology(path), store_dir)
+
+
+def collect_garbage(store_dir=STORE_DIR, topo_paths=None):
+    """
+    Delete blobs no live topology refers to. Returns bytes freed.
+    topo_paths defaults to every *.topo.pb next to the store directory.
+    """
+    if topo_paths is None:
+        parent = os.path.dirname(os.path.abspath(store_dir))
+        topo_paths = [os.path.join(parent, f) for f in os.listdir(parent) if f.endswith(TOPO_SUFFIX)]
+    if not topo_paths:
+        raise ValueError(f"No topologies refer to {store_dir} - refusing to delete every blob")
+    live = set()
+    for path in topo_paths:
+        for node in load_topology(path).node:
+            if BLOB_ATTR in node.attr:
+                live.add(node.attr[BLOB_ATTR].s.decode())
+    freed = 0
+    for root, _, files in os.walk(store_dir):
+        for name in files:
+            if name.split('.')[0] not in live:
+                path = os.path.join(root, name)
+                freed += os.path.getsize(path)
+                os.remove(path)
+    return freed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicated Const storage for frozen graphs")
+    parser.add_argument("graphs", nargs='*', help="Frozen .pb files to pack (default: STAGES)")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--compress", action="store_true",
+                        help="zlib blobs (smaller, but no longer memory-mappable)")
+    parser.add_argument("--unpack", action="store_true",
+                        help="Rehydrate .topo.pb files back into standard .pb files")
+    parser.add_argument("--gc", action="store_true",
+                        help="Delete blobs no .topo.pb next to the store refers to")
+    args = parser.parse_args()
+
+    if args.gc:
+        freed = collect_garbage(args.store, [p for p in args.graphs if p.endswith(TOPO_SUFFIX)] or None)
+        print(f"Freed {freed / 2**20:.1f} MB from {args.store}/")
+        return
+
+    if args.unpack:
+        for path in args.graphs:
+            out = path.replace(TOPO_SUFFIX, ".pb")
+            with tf.io.gfile.GFile(out, "wb") as f:
+                f.write(load_graph(path, args.store).SerializeToString())
+            print(f"{path} -> {out}")
+        return
+
+    graphs = args.graphs or [s for s in STAGES if os.path.exists(s)]
+    if not graphs:
+        print("No frozen graphs found.")
+        return
+
+    print("=" * 70)
+    print(f"Packing {len(graphs)} graphs into {args.store}/")
+    print("=" * 70)
+    total_pb = total_new = 0
+    for path in graphs:
+        with tf.io.gfile.GFile(path, "rb") as f:
+            graph_def = tf.compat.v1.GraphDef()
+            graph_def.ParseFromString(f.read())
+        out = topo_path(path)
+        stats = save_graph(graph_def, out, args.store, compress=args.compress)
+        pb_size, topo_size = os.path.getsize(path), os.path.getsize(out)
+        total_pb += pb_size
+        total_new += topo_size + stats['new_bytes']
+        print(f"\n{path}")
+        print(f"  .pb {pb_size / 2**20:.1f} MB -> topology {topo_size / 2**10:.0f} KB "
+              f"+ {stats['new_blobs']} new blobs ({stats['new_bytes'] / 2**20:.1f} MB), "
+              f"{stats['stored'] - stats['new_blobs']} shared")
+
+        start = time.perf_counter()
+        load_topology(out)
+        t_topo = time.perf_counter() - start
+        start = time.perf_counter()
+        tf.compat.v1.GraphDef().ParseFromString(open(path, "rb").read())
+        t_full = time.perf_counter() - start
+        print(f"  load: topology {t_topo * 1000:.1f} ms vs full .pb {t_full * 1000:.1f} ms")
+
+    print("\n" + "=" * 70)
+    print(f"Disk: {total_pb / 2**20:.1f} MB as separate .pb files -> "
+          f"{total_new / 2**20:.1f} MB packed (only new blobs counted)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
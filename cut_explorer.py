@@ -0,0 +1,272 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import tensorflow as tf
+from tensorflow.python.framework import graph_util
+
+from const_store import load_graph, load_topology
+from graph_stats import flop_profile, op_histogram, tensor_bytes
+from split_runtime import CPU_OPS
+
+# --- CONFIG ---
+INPUT_GRAPH     = "frozen_yolo_clean.pb"   # plain .pb or const_store .topo.pb
+OUTPUT_DIR      = "cuts"
+TOP_K           = 5
+WORKERS         = 4
+TRANSFER_WEIGHT = 0.01      # score penalty per MB crossing DPU -> CPU per frame
+MAX_OUTPUTS     = 8         # cut sets wider than this are hard to quantize/compile
+MAX_STEPS       = 500000    # decisions in the down-set search before it gives up
+
+# Anything whose ancestors include one of these can't go to the DPU
+UNSUPPORTED_OPS = CPU_OPS
+PASSTHROUGH_OPS = {'Const', 'Identity', 'Placeholder', 'NoOp'}
+
+
+def _cut_entry(outputs, nodes, covered, total_flops, shapes):
+    """nodes: included non-Const nodes."""
+    return {
+        'outputs': list(outputs),
+        'nodes': nodes,
+        'flops': covered,
+        'coverage': covered / total_flops,
+        'transfer_bytes': sum(tensor_bytes(shapes, o + ":0") for o in outputs),
+    }
+
+
+def enumerate_cuts(graph_def, flops, shapes, unsupported=UNSUPPORTED_OPS, max_outputs=MAX_OUTPUTS,
+                   max_steps=MAX_STEPS):
+    """
+    Ancestor-closed, unsupported-free node sets (down-sets) of the graph and
+    their cut sets: the included nodes that still have a consumer outside.
+
+    Two sources, merged by cut set (the one covering more FLOPs wins):
+      - every prefix of one topological order, which is cheap and complete
+        for chains
+      - a depth-first search over the down-set lattice. Supported nodes are
+        decided in topological order (include only if all inputs are
+        included). An included node becomes a permanent output as soon as
+        one of its consumers is excluded, so branches with more than
+        `max_outputs` outputs are cut early.
+    The search stops after `max_steps` decisions. Returns (cuts, exhaustive).
+    """
+    nodes = {n.name: n for n in graph_def.node}
+    consumers = {name: [] for name in nodes}
+    for n in graph_def.node:
+        for inp in n.input:
+            base = inp.lstrip('^').split(':')[0]
+            if base in consumers:
+                consumers[base].append(n.name)
+
+    # Topological order (inputs before consumers), iterative
+    order, done = [], set()
+    for root in nodes:
+        stack = [(root, False)]
+        while stack:
+            name, expanded = stack.pop()
+            if name in done or name not in nodes:
+                continue
+            if expanded:
+                done.add(name)
+                order.append(name)
+                continue
+            stack.append((name, True))
+            stack.extend((i.lstrip('^').split(':')[0], False) for i in nodes[name].input)
+
+    unsafe = set()
+    for name in order:
+        n = nodes[name]
+        if n.op in unsupported or any(i.lstrip('^').split(':')[0] in unsafe for i in n.input):
+            unsafe.add(name)
+
+    def resolve(name):
+        """Frontier Identity -> the node it forwards; Consts are not outputs."""
+        while nodes[name].op == 'Identity' and nodes[name].input:
+            name = nodes[name].input[0].split(':')[0]
+        return None if nodes[name].op in PASSTHROUGH_OPS else name
+
+    total_flops = sum(flops.values()) or 1
+    best = {}       # outputs tuple -> cut
+
+    def record(outputs, count, covered):
+        if outputs and (outputs not in best or covered > best[outputs]['flops']):
+            best[outputs] = _cut_entry(outputs, count, covered, total_flops, shapes)
+
+    # --- Prefixes of one topological order ---
+    included, frontier = set(), set()
+    waiting = {}      # node -> consumers not yet included
+    covered = count = 0
+    for name in order:
+        if name in unsafe or nodes[name].op == 'Placeholder':
+            continue
+        included.add(name)
+        covered += flops.get(name, 0)
+        count += nodes[name].op != 'Const'
+        waiting[name] = len(consumers[name])
+        if waiting[name] or not consumers[name]:
+            frontier.add(name)
+        for inp in nodes[name].input:
+            base = inp.lstrip('^').split(':')[0]
+            if base in waiting:
+                waiting[base] -= 1
+                if waiting[base] == 0:
+                    frontier.discard(base)
+        record(tuple(sorted({o for o in map(resolve, frontier) if o})), count, covered)
+
+    # --- Down-set search; Consts are free and always included ---
+    decide = [name for name in order
+              if name not in unsafe and nodes[name].op not in ('Placeholder', 'Const')]
+    idx = {name: i for i, name in enumerate(decide)}
+    preds = [sorted({idx[b] for b in (i.lstrip('^').split(':')[0] for i in nodes[name].input)
+                     if b in idx}) for name in decide]
+    out = [resolve(name) for name in decide]
+    # Outputs from the moment they are included: graph sinks, or read by an unsupported node
+    pin_self = [out[k] if not consumers[name] or any(c not in idx for c in consumers[name]
+                                                      if nodes[c].op not in PASSTHROUGH_OPS)
+                else None for k, name in enumerate(decide)]
+    node_flops = [flops.get(name, 0) for name in decide]
+
+    taken = [False] * len(decide)
+    pinned = {}
+    state = {'covered': 0, 'count': 0}
+
+    def pin(name, delta):
+        if name is None:
+            return
+        pinned[name] = pinned.get(name, 0) + delta
+        if not pinned[name]:
+            del pinned[name]
+
+    steps = 0
+    stack = [(0, 'enter')]
+    while stack:
+        k, action = stack.pop()
+        if action == 'enter':
+            steps += 1
+            if steps > max_steps:
+                break
+            if len(pinned) > max_outputs:
+                continue
+            if k == len(decide):
+                record(tuple(sorted(pinned)), state['count'], state['covered'])
+                continue
+            stack.append((k, 'exclude'))
+            if all(taken[p] for p in preds[k]):
+                stack.append((k, 'include'))      # popped first: larger sets first
+        elif action == 'include':
+            taken[k] = True
+            state['covered'] += node_flops[k]
+            state['count'] += 1
+            pin(pin_self[k], 1)
+            stack += [(k, 'undo_include'), (k + 1, 'enter')]
+        elif action == 'undo_include':
+            taken[k] = False
+            state['covered'] -= node_flops[k]
+            state['count'] -= 1
+            pin(pin_self[k], -1)
+        elif action == 'exclude':
+            for p in preds[k]:
+                if taken[p]:
+                    pin(out[p], 1)
+            stack += [(k, 'undo_exclude'), (k + 1, 'enter')]
+        else:
+            for p in preds[k]:
+                if taken[p]:
+                    pin(out[p], -1)
+    exhaustive = steps <= max_steps
+    return list(best.values()), exhaustive
+
+
+def score_cut(cut, transfer_weight=TRANSFER_WEIGHT):
+    return cut['coverage'] - transfer_weight * cut['transfer_bytes'] / 2**20
+
+
+def quantize_command(pb_path, outputs, input_node="images", input_shape="1,640,640,3"):
+    return f'''vai_q_tensorflow quantize \\
+  --input_frozen_graph {pb_path} \\
+  --input_nodes {input_node} \\
+  --input_shapes {input_shape} \\
+  --output_nodes {",".join(outputs)} \\
+  --input_fn input_fn.calib_input \\
+  --output_dir quant_{os.path.splitext(os.path.basename(pb_path))[0]} \\
+  --calib_iter 10'''
+
+
+def _extract_worker(args):
+    """Runs in a worker process: extract, check and save one candidate."""
+    graph_path, outputs, out_path = args
+    start = time.perf_counter()
+    graph_def = load_graph(graph_path)
+    sub = graph_util.extract_sub_graph(graph_def, outputs)
+    ops = op_histogram(sub)
+    bad = sorted(op for op in ops if op in UNSUPPORTED_OPS)
+    with tf.io.gfile.GFile(out_path, "wb") as f:
+        f.write(sub.SerializeToString())
+    return {'path': out_path, 'nodes': len(sub.node), 'unsupported': bad,
+            'seconds': time.perf_counter() - start}
+
+
+def explore(graph_path=INPUT_GRAPH, top_k=TOP_K, workers=WORKERS, output_dir=OUTPUT_DIR,
+            max_outputs=MAX_OUTPUTS, transfer_weight=TRANSFER_WEIGHT, max_steps=MAX_STEPS):
+    print(f"Loading topology of {graph_path}...")
+    graph_def = load_topology(graph_path)
+    flops, shapes = flop_profile(graph_def)
+    total = sum(flops.values())
+    print(f"{len(graph_def.node)} nodes, {total / 1e9:.2f} GFLOPs per frame")
+
+    start = time.perf_counter()
+    cuts, exhaustive = enumerate_cuts(graph_def, flops, shapes, max_outputs=max_outputs,
+                                      max_steps=max_steps)
+    cuts = [c for c in cuts if len(c['outputs']) <= max_outputs]
+    print(f"{len(cuts)} valid cut sets with <= {max_outputs} outputs "
+          f"({time.perf_counter() - start:.1f}s)")
+    if not exhaustive:
+        print(f"  Down-set search stopped after {max_steps} steps: not every cut set was seen "
+              f"(raise --max-steps)")
+    if not cuts:
+        print("ERROR: No valid cut set found!")
+        return []
+
+    ranked = sorted(cuts, key=lambda c: -score_cut(c, transfer_weight))[:top_k]
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(graph_path, c['outputs'], os.path.join(output_dir, f"cut_{rank}.pb"))
+            for rank, c in enumerate(ranked)]
+
+    print(f"Extracting top {len(jobs)} candidates on {workers} workers...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_extract_worker, jobs))
+
+    print("\n" + "=" * 70)
+    print("TOP CANDIDATES")
+    print("=" * 70)
+    for rank, (cut, res) in enumerate(zip(ranked, results)):
+        cut.update(res)
+        cut['command'] = quantize_command(res['path'], cut['outputs'])
+        status = "OK" if not res['unsupported'] else f"UNSUPPORTED {res['unsupported']}"
+        print(f"\n#{rank}  {res['path']}  score {score_cut(cut, transfer_weight):.3f}  [{status}]")
+        print(f"  FLOP coverage: {100 * cut['coverage']:.1f}% "
+              f"({cut['flops'] / 1e9:.2f} of {total / 1e9:.2f} GFLOPs)")
+        print(f"  Nodes: {res['nodes']}, outputs: {len(cut['outputs'])}, "
+              f"DPU->CPU transfer: {cut['transfer_bytes'] / 2**20:.2f} MB/frame")
+        for o in cut['outputs']:
+            print(f"    {o}")
+        print(cut['command'])
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search DPU cut sets by FLOP coverage")
+    parser.add_argument("graph", nargs='?', default=INPUT_GRAPH)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--max-outputs", type=int, default=MAX_OUTPUTS)
+    parser.add_argument("--transfer-weight", type=float, default=TRANSFER_WEIGHT)
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS, help="down-set search budget")
+    args = parser.parse_args()
+    explore(args.graph, args.top_k, args.workers, OUTPUT_DIR, args.max_outputs,
+            args.transfer_weight, args.max_steps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+from collections import namedtuple
+
+from artifact_manifest import target_fingerprint
+from const_store import load_graph
+from graph_stats import _numel, flop_profile, tensor_bytes
+from mixed_precision import CPU_GFLOPS, LINK_GBPS
+from resize_lowering import target_capabilities
+from rewrite_utils import base_name, consumers_map, graph_endpoints, node_map
+from silu_substitute import TARGET_CPU_OPS
+from split_runtime import count_partitions
+
+# Analytical per-frame latency for a candidate graph on the DPU behind the
+# arch.json fingerprint, so graph surgery can be judged without a board.
+# Every DPU layer costs max(compute cycles, DDR traffic time) - the DPU
+# overlaps loads with compute - plus a fixed per-layer overhead. Layers whose
+# feature map or weights don't fit on chip pay for reloading them per tile.
+# CPU islands add their float compute, the int8 <-> float tensors crossing
+# the boundary, and one DPU runner call per DPU partition.
+
+# --- CONFIG ---
+DEFAULT_GRAPHS = ["frozen_yolo_no_split.pb"]
+TOP_LAYERS     = 15
+
+# DPUCZDX8G sizes: (pixel parallelism, input-channel parallelism, output-channel parallelism)
+ARCHS = {
+    'B512':  (4, 8, 8),   'B800':  (4, 10, 10), 'B1024': (8, 8, 8),   'B1152': (4, 12, 12),
+    'B1600': (8, 10, 10), 'B2304': (8, 12, 12), 'B3136': (8, 14, 14), 'B4096': (8, 16, 16),
+}
+
+DpuConfig = namedtuple("DpuConfig", ["name", "pp", "icp", "ocp", "freq_mhz", "ddr_gbps",
+                                     "fmap_buf_kb", "wgt_buf_kb", "layer_overhead_us", "call_overhead_us"])
+
+# Board builds by fingerprint. Buffer sizes are the low-RAM configuration;
+# DDR is what the DPU's AXI ports sustain in practice, not the LPDDR4 peak.
+TARGETS = {
+    "0x101000016010405": DpuConfig("B2304 Ultra96-V2", *ARCHS['B2304'], freq_mhz=300, ddr_gbps=3.2,
+                                   fmap_buf_kb=256, wgt_buf_kb=144,
+                                   layer_overhead_us=6.0, call_overhead_us=150.0),
+}
+
+CONV_OPS = {'Conv2D', 'DepthwiseConv2dNative', 'Conv2DBackpropInput'}
+FUSED_OPS = {'BiasAdd', 'Relu', 'Relu6', 'LeakyRelu'}           # folded into the preceding conv
+FREE_OPS = {'Identity', 'Reshape', 'ConcatV2', 'Squeeze', 'ExpandDims', 'Pad', 'Const', 'Placeholder',
+            'NoOp'}                                              # addressing only
+POOL_OPS = {'MaxPool', 'AvgPool'}
+UPSAMPLE_OPS = {'ResizeNearestNeighbor', 'DepthToSpace'}
+
+
+def target_config(arch=None):
+    """DpuConfig for an ARCHS name (Ultra96 clocks and buffers) or the arch.json fingerprint."""
+    if arch:
+        base = TARGETS["0x101000016010405"]
+        return base._replace(name=f"{arch} (Ultra96 platform)", pp=ARCHS[arch][0],
+                             icp=ARCHS[arch][1], ocp=ARCHS[arch][2])
+    fingerprint = target_fingerprint()
+    if fingerprint not in TARGETS:
+        raise ValueError(f"No DPU config for fingerprint {fingerprint}; known: {sorted(TARGETS)}. "
+                         f"Pass --arch one of {sorted(ARCHS)}.")
+    return TARGETS[fingerprint]
+
+
+def _ceil(a, b):
+    return -(-int(a) // int(b))
+
+
+def layer_cost(node, shapes, nodes, cfg):
+    """{'cycles', 'bytes', 'ms', 'bound'} for one DPU layer (int8 tensors), or None if it is free."""
+    if node.op in FREE_OPS:
+        return None
+    out = (shapes.get(node.name) or [None])[0]
+    if not out or None in out:
+        return None
+    data = [i for i, inp in enumerate(node.input)
+            if not inp.startswith('^') and nodes[base_name(inp)].op != 'Const']
+    in_bytes = sum(tensor_bytes(shapes, node.input[i], itemsize=1) for i in data)
+    out_bytes = _numel(out)
+    w_bytes = 0
+
+    n, h, w, c = out if len(out) == 4 else (1, 1, 1, _numel(out))
+    wshape = (shapes.get(base_name(node.input[1])) or [None])[0] if node.op in CONV_OPS else None
+    if node.op in CONV_OPS and (not wshape or None in wshape):
+        return None
+    if node.op in ('Conv2D', 'Conv2DBackpropInput'):
+        kh, kw = wshape[:2]
+        cin, cout = (wshape[2], wshape[3]) if node.op == 'Conv2D' else (wshape[3], wshape[2])
+        w_bytes = _numel(wshape)
+        taps = kh * kw
+        if node.op == 'Conv2DBackpropInput':
+            # Each output pixel only sees the kernel taps its stride phase hits
+            strides = list(node.attr['strides'].list.i) if 'strides' in node.attr else [1, 1, 1, 1]
+            taps = max(taps // (strides[1] * strides[2]), 1)
+        cycles = n * h * _ceil(w, cfg.pp) * _ceil(cin, cfg.icp) * _ceil(cout, cfg.ocp) * taps
+    elif node.op == 'DepthwiseConv2dNative':
+        w_bytes = _numel(wshape)
+        cycles = n * h * _ceil(w, cfg.pp) * _ceil(c, cfg.icp) * wshape[0] * wshape[1]
+    elif node.op in POOL_OPS:
+        ksize = list(node.attr['ksize'].list.i)
+        cycles = n * h * _ceil(w, cfg.pp) * _ceil(c, cfg.icp) * ksize[1] * ksize[2]
+    elif node.op in UPSAMPLE_OPS:
+        # Each output pixel written once from the (on-chip) input
+        cycles = n * h * _ceil(w, cfg.pp) * _ceil(c, cfg.icp)
+    else:
+        # Elementwise and the rest of the misc engine: one pass per operand
+        cycles = n * h * _ceil(w, cfg.pp) * _ceil(c, cfg.icp) * max(len(data), 1)
+
+    # On-chip reuse: the DPU picks one loop order. Weight tiles outermost
+    # re-reads the feature map per weight tile; feature-map tiles outermost
+    # re-streams the weights per feature-map tile. Whichever fits (tiles == 1)
+    # costs nothing extra, and when neither fits the cheaper order is charged.
+    fmap_tiles = _ceil(max(in_bytes, 1), cfg.fmap_buf_kb * 1024)
+    wgt_tiles = _ceil(max(w_bytes, 1), cfg.wgt_buf_kb * 1024)
+    traffic = min(in_bytes * wgt_tiles + w_bytes, in_bytes + w_bytes * fmap_tiles) + out_bytes
+
+    compute_ms = cycles / (cfg.freq_mhz * 1e3)
+    memory_ms = traffic / (cfg.ddr_gbps * 1e6)
+    return {'cycles': int(cycles), 'bytes': int(traffic),
+            'ms': max(compute_ms, memory_ms) + cfg.layer_overhead_us / 1e3,
+            'bound': 'compute' if compute_ms >= memory_ms else 'memory',
+            'refetch': fmap_tiles > 1 and wgt_tiles > 1}
+
+
+def estimate(graph_def, cfg, cpu_ops=None):
+    """Per-frame latency breakdown and per-layer DPU costs for one graph."""
+    cpu_ops = set(cpu_ops if cpu_ops is not None else TARGET_CPU_OPS)
+    caps = target_capabilities()
+    if caps and 'resize_nearest' not in caps:
+        cpu_ops.add('ResizeNearestNeighbor')
+    nodes = node_map(graph_def)
+    consumers = consumers_map(graph_def)
+    flops, shapes = flop_profile(graph_def)
+    inputs, outputs = graph_endpoints(graph_def)
+
+    on_cpu = {n.name for n in graph_def.node if n.op in cpu_ops}
+
+    def fused(n):
+        if n.op not in FUSED_OPS or n.name in on_cpu:
+            return False
+        src = nodes[base_name(n.input[0])]
+        return (src.op in CONV_OPS or fused(src)) and len(consumers[src.name]) == 1
+
+    layers = {}
+    for n in graph_def.node:
+        if n.name in on_cpu or fused(n):
+            continue
+        cost = layer_cost(n, shapes, nodes, cfg)
+        if cost is not None:
+            layers[n.name] = dict(cost, op=n.op)
+
+    crossing = set()
+    for n in graph_def.node:
+        for inp in n.input:
+            src = base_name(inp)
+            if inp.startswith('^') or nodes[src].op in ('Const', 'Placeholder'):
+                continue
+            if (src in on_cpu) != (n.name in on_cpu):
+                crossing.add(inp if ':' in inp else inp + ':0')
+    transfer_bytes = sum(tensor_bytes(shapes, t) for t in crossing)
+
+    partitions, dpu_partitions = count_partitions(graph_def, inputs, outputs, cpu_ops)
+    dpu_ms = sum(l['ms'] for l in layers.values())
+    cpu_ms = sum(flops.get(name, 0) for name in on_cpu) / (CPU_GFLOPS * 1e6)
+    transfer_ms = transfer_bytes / (LINK_GBPS * 1e6)
+    call_ms = dpu_partitions * cfg.call_overhead_us / 1e3
+    return {
+        'dpu_ms': dpu_ms,
+        'dpu_memory_bound': sum(1 for l in layers.values() if l['bound'] == 'memory'),
+        'dpu_layers': len(layers),
+        'cpu_ms': cpu_ms,
+        'cpu_nodes': len(on_cpu),
+        'transfer_ms': transfer_ms,
+        'crossing_tensors': len(crossing),
+        'call_ms': call_ms,
+        'partitions': partitions,
+        'dpu_partitions': dpu_partitions,
+        'total_ms': dpu_ms + cpu_ms + transfer_ms + call_ms,
+        'layers': layers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate per-frame DPU latency for candidate graphs")
+    parser.add_argument("graphs", nargs="*", default=DEFAULT_GRAPHS)
+    parser.add_argument("--arch", choices=sorted(ARCHS), help="override the arch.json DPU size")
+    parser.add_argument("--layers", type=int, default=TOP_LAYERS, help="slowest DPU layers to list")
+    parser.add_argument("--json", help="write the estimates (without per-layer detail) here")
+    args = parser.parse_args()
+
+    try:
+        cfg = target_config(args.arch)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
+    print(f"Target: {cfg.name}, {cfg.pp}x{cfg.icp}x{cfg.ocp} @ {cfg.freq_mhz} MHz, "
+          f"DDR {cfg.ddr_gbps} GB/s, buffers {cfg.fmap_buf_kb}/{cfg.wgt_buf_kb} KB")
+
+    results = {}
+    for path in args.graphs:
+        print(f"\nEstimating {path}...")
+        r = estimate(load_graph(path), cfg)
+        results[path] = r
+        if args.layers:
+            print(f"  {'ms':>7} {'bound':<8} {'op':<22} layer")
+            for name, l in sorted(r['layers'].items(), key=lambda kv: -kv[1]['ms'])[:args.layers]:
+                flag = " (refetch)" if l['refetch'] else ""
+                print(f"  {l['ms']:7.3f} {l['bound']:<8} {l['op']:<22} {name}{flag}")
+
+    print("\n" + "=" * 70)
+    print("PER-FRAME ESTIMATE")
+    print("=" * 70)
+    base = None
+    for path, r in results.items():
+        delta = "" if base is None else f"  ({r['total_ms'] - base:+.2f} ms)"
+        base = r['total_ms'] if base is None else base
+        print(f"{path}: {r['total_ms']:.2f} ms ({1000 / r['total_ms']:.1f} FPS){delta}")
+        print(f"  DPU {r['dpu_ms']:.2f} ms over {r['dpu_layers']} layers "
+              f"({r['dpu_memory_bound']} memory-bound)")
+        print(f"  CPU {r['cpu_ms']:.2f} ms over {r['cpu_nodes']} nodes, transfers {r['transfer_ms']:.2f} ms "
+              f"({r['crossing_tensors']} tensors), runner calls {r['call_ms']:.2f} ms")
+        print(f"  Partitions: {r['partitions']} ({r['dpu_partitions']} DPU)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({p: {k: v for k, v in r.items() if k != 'layers'} for p, r in results.items()},
+                      f, indent=2)
+        print(f"\nSaved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,22 @@
-import tensorflow as tf
-from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
 import os
 
+from warm_start import run_job
+
 # --- CONFIG ---
 # Use the FIXED model folder you created earlier
 INPUT_DIR = "yolo12_tf_fixed"
 OUTPUT_FILE = "frozen_yolo.pb"
 
 def main():
-    print(f"Loading {INPUT_DIR}...")
-    # Load the model with the signature we added
-    loaded = tf.saved_model.load(INPUT_DIR)
-    
-    # Get the concrete function (the graph)
-    infer = loaded.signatures['serving_default']
-    
-    # Convert variables to constants (Freeze)
-    print("Freezing graph...")
-    frozen_func = convert_variables_to_constants_v2(infer)
-    frozen_func.graph.as_graph_def()
+    # Load the model with the signature we added and convert variables to
+    # constants (Freeze) - on the warm worker if one is running
+    print(f"Freezing {INPUT_DIR}...")
+    graph_bytes, inputs, outputs = run_job('freeze', model_dir=INPUT_DIR)
 
     # Save the file
     print(f"Saving to {OUTPUT_FILE}...")
-    tf.io.write_graph(frozen_func.graph, ".", OUTPUT_FILE, as_text=False)
+    with open(OUTPUT_FILE, "wb") as f:
+        f.write(graph_bytes)
     
     # --- CRITICAL: PRINT NODE NAMES ---
     # We need these names for the next command
@@ -31,11 +25,9 @@ def main():
     print("="*40)
     
     # Find input node name
-    inputs = [t.name for t in frozen_func.inputs]
     print(f"INPUT NODE NAME:  {inputs[0].split(':')[0]}")
     
     # Find output node name
-    outputs = [t.name for t in frozen_func.outputs]
     print(f"OUTPUT NODE NAME: {outputs[0].split(':')[0]}")
     print("="*40)
 
@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from graph_stats import op_histogram
+from split_runtime import load_graph_def
+
+# --- CONFIG ---
+# Pipeline stages in the order the rewrite scripts produce them.
+# With no arguments every consecutive pair that exists on disk is diffed.
+STAGES = [
+    "frozen_yolo.pb",
+    "frozen_yolo_clean.pb",
+    "frozen_yolo_stripped.pb",
+    "frozen_yolo_no_split.pb",
+    "frozen_yolo_dpu_only.pb",
+    "frozen_yolo_backbone.pb",
+]
+
+# Attributes that only carry bookkeeping and would drown the report
+IGNORED_ATTRS = {'_output_shapes', '_class'}
+
+
+def _input_name(inp, renamed=None):
+    """Canonical input string: 'node:0' -> 'node', optionally through a rename map."""
+    if inp.endswith(':0'):
+        inp = inp[:-2]
+    if renamed:
+        ctrl = '^' if inp.startswith('^') else ''
+        base, sep, idx = inp.lstrip('^').partition(':')
+        inp = ctrl + renamed.get(base, base) + sep + idx
+    return inp
+
+
+def _node_base(inp):
+    return inp.lstrip('^').split(':')[0]
+
+
+def _attr_digest(node):
+    h = hashlib.blake2b(digest_size=16)
+    for key in sorted(node.attr):
+        if key in IGNORED_ATTRS:
+            continue
+        h.update(key.encode())
+        h.update(node.attr[key].SerializeToString(deterministic=True))
+    return h.digest()
+
+
+def topology_hashes(graph_def):
+    """
+    Merkle hash per node: op + attrs + hashes of its inputs (in order).
+    Two nodes with the same hash compute the same thing from the same
+    sources, whatever they are called. Iterative so 2000-deep Identity
+    chains don't hit the recursion limit.
+    """
+    nodes = {n.name: n for n in graph_def.node}
+    hashes = {}
+    visiting = set()
+    for root in nodes:
+        if root in hashes:
+            continue
+        stack = [(root, False)]
+        while stack:
+            name, expanded = stack.pop()
+            if name in hashes:
+                continue
+            node = nodes.get(name)
+            if node is None:
+                # Input from outside the graph: identify it by name
+                hashes[name] = hashlib.blake2b(name.encode(), digest_size=16).digest()
+                continue
+            deps = [_node_base(i) for i in node.input]
+            if not expanded:
+                if name in visiting:
+                    continue  # back edge (loop); hashed with a '?' placeholder
+                visiting.add(name)
+                stack.append((name, True))
+                stack.extend((d, False) for d in deps if d not in hashes)
+                continue
+            h = hashlib.blake2b(digest_size=16)
+            h.update(node.op.encode())
+            h.update(_attr_digest(node))
+            for inp in node.input:
+                # Keep the output index / control marker, swap the name for its hash
+                _, _, idx = _input_name(inp).partition(':')
+                h.update(hashes.get(_node_base(inp), b'?'))
+                h.update(b'^' if inp.startswith('^') else idx.encode())
+            hashes[name] = h.digest()
+    return hashes
+
+
+def diff_graphs(old_def, new_def):
+    """Structural diff of two GraphDefs. Returns a JSON-serialisable dict."""
+    old = {n.name: n for n in old_def.node}
+    new = {n.name: n for n in new_def.node}
+
+    removed = [name for name in old if name not in new]
+    added = [name for name in new if name not in old]
+
+    # Fallback: pair unmatched nodes that are structurally identical
+    renamed = {}
+    if removed and added:
+        old_hash = topology_hashes(old_def)
+        new_hash = topology_hashes(new_def)
+        by_hash = {}
+        for name in added:
+            by_hash.setdefault(new_hash[name], []).append(name)
+        for name in removed:
+            candidates = by_hash.get(old_hash[name])
+            if candidates:
+                renamed[name] = candidates.pop(0)
+        matched_new = set(renamed.values())
+        removed = [n for n in removed if n not in renamed]
+        added = [n for n in added if n not in matched_new]
+
+    pairs = [(name, name) for name in old if name in new]
+    pairs.extend(renamed.items())
+
+    retyped, attr_changes, rewired = [], [], []
+    for old_name, new_name in pairs:
+        a, b = old[old_name], new[new_name]
+        if a.op != b.op:
+            retyped.append({'node': new_name, 'old_op': a.op, 'new_op': b.op})
+
+        changed = {}
+        for key in set(a.attr) | set(b.attr):
+            if key in IGNORED_ATTRS:
+                continue
+            if key not in a.attr:
+                changed[key] = 'added'
+            elif key not in b.attr:
+                changed[key] = 'removed'
+            elif a.attr[key] != b.attr[key]:
+                changed[key] = 'changed'
+        if changed:
+            attr_changes.append({'node': new_name, 'attrs': changed})
+
+        old_inputs = [_input_name(i, renamed) for i in a.input]
+        new_inputs = [_input_name(i) for i in b.input]
+        if old_inputs != new_inputs:
+            rewired.append({'node': new_name, 'old_inputs': old_inputs, 'new_inputs': new_inputs})
+
+    old_ops, new_ops = op_histogram(old_def), op_histogram(new_def)
+    op_deltas = {op: new_ops.get(op, 0) - old_ops.get(op, 0)
+                 for op in set(old_ops) | set(new_ops)
+                 if new_ops.get(op, 0) != old_ops.get(op, 0)}
+
+    return {
+        'old_nodes': len(old),
+        'new_nodes': len(new),
+        'added': [{'node': n, 'op': new[n].op} for n in added],
+        'removed': [{'node': n, 'op': old[n].op} for n in removed],
+        'renamed': [{'old': a, 'new': b} for a, b in renamed.items()],
+        'retyped': retyped,
+        'attr_changes': attr_changes,
+        'rewired': rewired,
+        'op_deltas': dict(sorted(op_deltas.items(), key=lambda x: x[1])),
+    }
+
+
+def format_diff(diff, old_label="old", new_label="new", limit=10):
+    lines = []
+    lines.append("=" * 70)
+    lines.append(f"DIFF: {old_label} -> {new_label}")
+    lines.append("=" * 70)
+    lines.append(f"Nodes: {diff['old_nodes']} -> {diff['new_nodes']} "
+                 f"({diff['new_nodes'] - diff['old_nodes']:+d})")
+
+    lines.append("\nOp count deltas:")
+    if not diff['op_deltas']:
+        lines.append("  (none)")
+    for op, delta in diff['op_deltas'].items():
+        lines.append(f"  {op}: {delta:+d}")
+
+    def section(title, items, fmt):
+        lines.append(f"\n{title} ({len(items)}):")
+        for item in items[:limit]:
+            lines.append("  " + fmt(item))
+        if len(items) > limit:
+            lines.append(f"  ... and {len(items) - limit} more")
+
+    section("Added", diff['added'], lambda d: f"[{d['op']}] {d['node']}")
+    section("Removed", diff['removed'], lambda d: f"[{d['op']}] {d['node']}")
+    section("Renamed", diff['renamed'], lambda d: f"{d['old']} -> {d['new']}")
+    section("Retyped", diff['retyped'],
+            lambda d: f"{d['node']}: {d['old_op']} -> {d['new_op']}")
+    section("Attr changes", diff['attr_changes'],
+            lambda d: f"{d['node']}: " + ", ".join(f"{k} {v}" for k, v in sorted(d['attrs'].items())))
+    section("Rewired", diff['rewired'],
+            lambda d: f"{d['node']}: {d['old_inputs']} -> {d['new_inputs']}")
+    return "\n".join(lines)
+
+
+def diff_files(old_path, new_path, json_path=None, limit=10):
+    start = time.perf_counter()
+    old_def, new_def = load_graph_def(old_path), load_graph_def(new_path)
+    loaded = time.perf_counter()
+    diff = diff_graphs(old_def, new_def)
+    done = time.perf_counter()
+
+    print(format_diff(diff, old_path, new_path, limit))
+    print(f"\n(load {1000 * (loaded - start):.0f} ms, diff {1000 * (done - loaded):.0f} ms)")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(diff, f, indent=2)
+        print(f"JSON written to {json_path}")
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structural diff between frozen graphs")
+    parser.add_argument("old", nargs='?', help="Old .pb (default: walk STAGES)")
+    parser.add_argument("new", nargs='?', help="New .pb")
+    parser.add_argument("--json", help="Write the diff as JSON to this path")
+    parser.add_argument("--limit", type=int, default=10, help="Entries shown per section")
+    args = parser.parse_args()
+
+    if args.old and args.new:
+        diff_files(args.old, args.new, args.json, args.limit)
+        return
+
+    stages = [s for s in STAGES if os.path.exists(s)]
+    if len(stages) < 2:
+        print("Need at least two pipeline stages on disk (or pass two .pb files).")
+        return
+    report = {}
+    for old_path, new_path in zip(stages, stages[1:]):
+        report[f"{old_path} -> {new_path}"] = diff_files(old_path, new_path, limit=args.limit)
+        print()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"JSON written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
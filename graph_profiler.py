@@ -0,0 +1,247 @@
+import json
+import os
+import re
+import threading
+import time
+
+import tensorflow as tf
+
+from preprocess import Preprocessor, list_images
+from split_runtime import CPU_OPS, load_graph_def, load_plan
+
+# --- CONFIG ---
+MODEL_PATH   = "yolo12_tf_fixed"      # SavedModel or frozen .pb
+PLAN_FILE    = "partition_plan.json"  # optional, for the per-partition view
+IMG_DIR      = "calib_dataset"
+NUM_RUNS     = 20
+SAMPLE_EVERY = 5                      # full trace on 1 run in N (1 = every run)
+TRACE_FILE   = "profile_trace.json"
+MAX_EVENTS   = 200000                 # cap on stored Chrome-trace events
+
+# 'model.6/m.0/m.0.0/attn/Softmax' -> 'model.6'
+BLOCK_RE = re.compile(r'model\.(\d+)')
+
+
+def block_of(name):
+    m = BLOCK_RE.search(name)
+    return f"model.{m.group(1)}" if m else "(unscoped)"
+
+
+def load_frozen(model_path):
+    """
+    GraphDef plus input/output tensor names for a frozen .pb or a SavedModel.
+    SavedModels are frozen in memory the same way freeze_graph.py does it.
+    """
+    if model_path.endswith(".pb"):
+        graph_def = load_graph_def(model_path)
+        inputs = [n.name + ":0" for n in graph_def.node if n.op == 'Placeholder']
+        consumed = {i.lstrip('^').split(':')[0] for n in graph_def.node for i in n.input}
+        outputs = [n.name + ":0" for n in graph_def.node
+                   if n.name not in consumed and n.op not in ('Const', 'NoOp', 'Placeholder')]
+        return graph_def, inputs, outputs
+
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+    infer = tf.saved_model.load(model_path).signatures['serving_default']
+    frozen = convert_variables_to_constants_v2(infer)
+    return (frozen.graph.as_graph_def(),
+            [t.name for t in frozen.inputs],
+            [t.name for t in frozen.outputs])
+
+
+class GraphProfiler:
+    """
+    Per-node wall time and memory for frozen-graph execution.
+
+    Wrap session runs with profiler.run(...): one run in `sample_every` is
+    executed with FULL_TRACE and its StepStats folded in; the rest run
+    untraced, so leaving it on for long streams costs ~1/N of the tracing
+    overhead. NumPy CPU islands can be hooked with instrument_numpy().
+    """
+
+    def __init__(self, sample_every=1, plan=None, max_events=MAX_EVENTS):
+        self.sample_every = max(1, sample_every)
+        self.max_events = max_events
+        self.nodes = {}           # name -> [op, total_us, calls, peak_bytes]
+        self.events = []
+        self.runs = 0
+        self.traced_runs = 0
+        self.wall_us = 0.0
+        self.lock = threading.Lock()
+        # TF stamps nodes with epoch µs; NumPy events are put on the same clock
+        self.epoch_offset_us = (time.time() - time.perf_counter()) * 1e6
+        self.partition_of = {}
+        if plan:
+            for p in plan['partitions']:
+                for n in load_graph_def(p['graph']).node:
+                    if n.op != 'Placeholder':
+                        self.partition_of.setdefault(n.name, p['name'])
+
+    def record(self, name, op, start_us, dur_us, peak_bytes=0, tid=0):
+        with self.lock:
+            entry = self.nodes.get(name)
+            if entry is None:
+                entry = self.nodes[name] = [op, 0.0, 0, 0]
+            entry[1] += dur_us
+            entry[2] += 1
+            entry[3] = max(entry[3], peak_bytes)
+            if len(self.events) < self.max_events:
+                self.events.append({'name': name, 'cat': op, 'ph': 'X', 'ts': start_us,
+                                    'dur': dur_us, 'pid': 0, 'tid': tid,
+                                    'args': {'op': op, 'bytes': peak_bytes}})
+
+    def _start_run(self):
+        """Count a run; True if it is one of the sampled ones."""
+        with self.lock:
+            self.runs += 1
+            return (self.runs - 1) % self.sample_every == 0
+
+    def _end_run(self, start, traced):
+        with self.lock:
+            self.wall_us += (time.perf_counter() - start) * 1e6
+            self.traced_runs += traced
+
+    def run(self, sess, fetches, feed_dict=None):
+        """sess.run with sampled FULL_TRACE."""
+        traced = self._start_run()
+        start = time.perf_counter()
+        if not traced:
+            out = sess.run(fetches, feed_dict)
+            self._end_run(start, False)
+            return out
+
+        options = tf.compat.v1.RunOptions(trace_level=tf.compat.v1.RunOptions.FULL_TRACE)
+        metadata = tf.compat.v1.RunMetadata()
+        out = sess.run(fetches, feed_dict, options=options, run_metadata=metadata)
+        self._end_run(start, True)
+        self._add_step_stats(metadata.step_stats)
+        return out
+
+    def _add_step_stats(self, step_stats):
+        for tid, dev in enumerate(step_stats.dev_stats):
+            for ns in dev.node_stats:
+                name = ns.node_name.split(':')[0]
+                if name in ('_SOURCE', '_SINK'):
+                    continue
+                # timeline_label looks like "name = Op(input, ...)"
+                label = ns.timeline_label
+                op = label.split(' = ', 1)[1].split('(')[0].strip() if ' = ' in label else name
+                peak = sum(m.peak_bytes for m in ns.memory)
+                self.record(name, op, ns.all_start_micros,
+                            ns.op_end_rel_micros - ns.op_start_rel_micros, peak, tid)
+
+    def instrument_numpy(self, numpy_graph, tid=1):
+        """Time every node of a numpy_executor.NumpyGraph, sampled like run()."""
+        original = numpy_graph.run_node
+        original_run = numpy_graph.run
+        state = {'trace': False}
+
+        def run(feeds):
+            state['trace'] = self._start_run()
+            start = time.perf_counter()
+            out = original_run(feeds)
+            self._end_run(start, state['trace'])
+            return out
+
+        def run_node(node, args, out=None):
+            if not state['trace']:
+                return original(node, args, out)
+            start = time.perf_counter()
+            out = original(node, args, out)
+            end = time.perf_counter()
+            self.record(node.name, node.op, start * 1e6 + self.epoch_offset_us, (end - start) * 1e6,
+                        sum(o.nbytes for o in out), tid)
+            return out
+
+        numpy_graph.run = run
+        numpy_graph.run_node = run_node
+        return numpy_graph
+
+    # --- aggregation ---
+
+    def _group(self, key_fn):
+        groups = {}
+        for name, (op, total, calls, peak) in self.nodes.items():
+            g = groups.setdefault(key_fn(name, op), [0.0, 0, 0])
+            g[0] += total
+            g[1] += calls
+            g[2] = max(g[2], peak)
+        runs = max(self.traced_runs, 1)
+        return sorted(((k, v[0] / runs, v[1] // runs, v[2]) for k, v in groups.items()),
+                      key=lambda x: -x[1])
+
+    def by_op(self):
+        return self._group(lambda name, op: op)
+
+    def by_block(self):
+        return self._group(lambda name, op: block_of(name))
+
+    def by_partition(self):
+        return self._group(lambda name, op: self.partition_of.get(name, "(unplanned)"))
+
+    def summary(self, top=20):
+        """Text table of per-run time by op type, block and (if a plan was given) partition."""
+        lines = []
+        node_total = sum(v[1] for v in self.nodes.values()) / max(self.traced_runs, 1)
+        wall = self.wall_us / max(self.runs, 1)
+        lines.append("=" * 70)
+        lines.append(f"PROFILE: {self.runs} runs, {self.traced_runs} traced, "
+                     f"{wall / 1000:.2f} ms/run wall, {node_total / 1000:.2f} ms/run in ops")
+        lines.append("=" * 70)
+
+        def table(title, rows, mark_cpu=False):
+            lines.append(f"\n{title}:")
+            lines.append(f"  {'':<40} {'ms/run':>9} {'%':>6} {'nodes':>6} {'peak MB':>8}")
+            for key, us, calls, peak in rows[:top]:
+                flag = " <- CPU fallback" if mark_cpu and key in CPU_OPS else ""
+                pct = 100 * us / node_total if node_total else 0.0
+                lines.append(f"  {key[:40]:<40} {us / 1000:>9.3f} {pct:>5.1f}% "
+                             f"{calls:>6} {peak / 2**20:>8.2f}{flag}")
+
+        table("By op type", self.by_op(), mark_cpu=True)
+        table("By block", self.by_block())
+        if self.partition_of:
+            table("By partition", self.by_partition())
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path=TRACE_FILE):
+        """Write events in Chrome trace format (open in chrome://tracing or Perfetto)."""
+        with open(path, "w") as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump({'runs': self.runs, 'traced_runs': self.traced_runs,
+                       'by_op': self.by_op(), 'by_block': self.by_block(),
+                       'by_partition': self.by_partition() if self.partition_of else []},
+                      f, indent=2)
+
+
+def main():
+    print(f"Loading {MODEL_PATH}...")
+    graph_def, inputs, outputs = load_frozen(MODEL_PATH)
+    print(f"Graph: {len(graph_def.node)} nodes, inputs {inputs}, outputs {outputs}")
+
+    plan = load_plan(PLAN_FILE) if os.path.exists(PLAN_FILE) else None
+    profiler = GraphProfiler(sample_every=SAMPLE_EVERY, plan=plan)
+
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+    sess = tf.compat.v1.Session(graph=graph)
+    feed = graph.get_tensor_by_name(inputs[0])
+    fetches = [graph.get_tensor_by_name(o) for o in outputs]
+
+    pre = Preprocessor()
+    files = list_images(IMG_DIR)
+    print(f"Running {NUM_RUNS} frames (full trace every {SAMPLE_EVERY})...")
+    for i in range(NUM_RUNS):
+        pre.load_file(files[i % len(files)])
+        profiler.run(sess, fetches, {feed: pre.batch})
+
+    print(profiler.summary())
+    profiler.export_chrome_trace(TRACE_FILE)
+    print(f"\nChrome trace written to {TRACE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import tensorflow as tf
+
+# Shape inference and FLOP counting for frozen graphs. Works on topology-only
+# graphs from const_store.py too: Const shapes survive, only payloads are gone.
+
+ELEMENTWISE_OPS = {
+    'Add', 'AddV2', 'BiasAdd', 'Sub', 'Mul', 'RealDiv', 'Maximum', 'Minimum',
+    'Sigmoid', 'Relu', 'Relu6', 'LeakyRelu', 'Tanh', 'Exp', 'Neg', 'Sqrt', 'Rsqrt',
+    'Square', 'Pow', 'Softmax', 'FusedBatchNorm', 'FusedBatchNormV3',
+}
+
+
+def op_histogram(graph_def):
+    ops = {}
+    for n in graph_def.node:
+        ops[n.op] = ops.get(n.op, 0) + 1
+    return ops
+
+
+def infer_shapes(graph_def):
+    """{node name: [output shape as list (None for unknown dims), ...]} via TF import."""
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+    shapes = {}
+    for op in graph.get_operations():
+        shapes[op.name] = [t.shape.as_list() if t.shape.rank is not None else None
+                           for t in op.outputs]
+    return shapes
+
+
+def _numel(shape):
+    if shape is None or any(d is None for d in shape):
+        return 0
+    return int(np.prod(shape, dtype=np.int64))
+
+
+def node_flops(node, shapes):
+    """Multiply-adds count as 2 FLOPs. Data-movement ops count as 0."""
+    out = (shapes.get(node.name) or [None])[0]
+    if out is None:
+        return 0
+
+    def in_shape(i):
+        base, _, idx = node.input[i].lstrip('^').partition(':')
+        outs = shapes.get(base) or []
+        idx = int(idx) if idx else 0
+        return outs[idx] if idx < len(outs) else None
+
+    if node.op == 'Conv2D':
+        w = in_shape(1)
+        if w is None:
+            return 0
+        kh, kw, cin, _ = w
+        return 2 * _numel(out) * kh * kw * cin
+    if node.op == 'DepthwiseConv2dNative':
+        w = in_shape(1)
+        if w is None:
+            return 0
+        return 2 * _numel(out) * w[0] * w[1]
+    if node.op in ('MatMul', 'BatchMatMul', 'BatchMatMulV2'):
+        a = in_shape(0)
+        if a is None:
+            return 0
+        # 'in' first: indexing a proto map with a missing key inserts it
+        transposed = any(key in node.attr and node.attr[key].b for key in ('adj_x', 'transpose_a'))
+        k = a[-2] if transposed else a[-1]
+        return 2 * _numel(out) * (k or 0)
+    if node.op in ('MaxPool', 'AvgPool'):
+        ksize = list(node.attr['ksize'].list.i)
+        return _numel(out) * int(np.prod(ksize[1:3]))
+    if node.op in ELEMENTWISE_OPS:
+        return _numel(out)
+    return 0
+
+
+def flop_profile(graph_def, shapes=None):
+    """{node name: FLOPs} for every node, plus the shapes used."""
+    shapes = shapes or infer_shapes(graph_def)
+    return {n.name: node_flops(n, shapes) for n in graph_def.node}, shapes
+
+
+def tensor_bytes(shapes, tensor, itemsize=4):
+    base, _, idx = tensor.partition(':')
+    outs = shapes.get(base) or []
+    idx = int(idx) if idx else 0
+    return _numel(outs[idx]) * itemsize if idx < len(outs) else 0
@@ -0,0 +1,345 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from artifact_manifest import check_manifest
+from postprocess import decode_yolo, scale_detections
+from preprocess import Preprocessor, list_images
+
+# --- CONFIG ---
+# name -> SavedModel dir (serving_default) or quantized Keras .h5
+MODELS = {
+    "yolo12": "yolo12_tf_fixed",
+}
+SOCKET_PATH    = "/tmp/yolo_infer.sock"   # used when --port isn't given
+HOST           = "127.0.0.1"
+MAX_BATCH      = 8
+MAX_DELAY_MS   = 10        # how long the first request of a batch may wait for company
+INFER_THREADS  = 2
+POST_THREADS   = 4         # one post-processing pool shared by all models
+LATENCY_WINDOW = 4096      # requests kept for the percentile metrics
+IMG_DIR        = "calib_dataset"
+
+
+class Metrics:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = {}
+        self.queue_peak = 0
+        self.requests = 0
+
+    def observe_queue(self, depth):
+        self.queue_peak = max(self.queue_peak, depth)
+
+    def observe_batch(self, size):
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+    def observe_latency(self, seconds):
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def snapshot(self, queue_depth):
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            'requests': self.requests,
+            'queue_depth': queue_depth,
+            'queue_peak': self.queue_peak,
+            'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+            'latency_ms': {f"p{p}": round(float(np.percentile(lat, p)), 3) for p in (50, 90, 99)},
+        }
+
+
+def load_model(path):
+    """(callable batch -> ndarray, static batch size or None) for a SavedModel or .h5."""
+    import tensorflow as tf
+
+    check_manifest(path)
+    if path.endswith(".h5"):
+        try:
+            from tensorflow_model_optimization.quantization.keras import vitis_quantize
+            with vitis_quantize.quantize_scope():
+                model = tf.keras.models.load_model(path, compile=False)
+        except ImportError:
+            model = tf.keras.models.load_model(path, compile=False)
+        batch = model.inputs[0].shape[0]
+        return (lambda x: np.asarray(model(x, training=False))), batch
+
+    fn = tf.saved_model.load(path).signatures["serving_default"]
+    input_name, spec = list(fn.structured_input_signature[1].items())[0]
+    output_key = sorted(fn.structured_outputs)[0]
+
+    def run(x):
+        return fn(**{input_name: tf.constant(x)})[output_key].numpy()
+    return run, spec.shape[0]
+
+
+class _Request:
+    __slots__ = ('data', 'future', 'arrived')
+
+    def __init__(self, data, future):
+        self.data = data
+        self.future = future
+        self.arrived = time.perf_counter()
+
+
+class ModelWorker:
+    """One model: a request queue, a batcher coroutine and a reusable input batch."""
+
+    def __init__(self, name, path, infer_pool, post_pool, max_batch=MAX_BATCH,
+                 max_delay_ms=MAX_DELAY_MS):
+        self.name = name
+        self.run_model, static_batch = load_model(path)
+        self.static_batch = static_batch
+        # A signature baked at batch 1 (fix_signature.py) can't batch more than that
+        self.max_batch = min(max_batch, static_batch) if static_batch else max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.infer_pool = infer_pool
+        self.post_pool = post_pool
+        self.queue = asyncio.Queue()
+        self.metrics = Metrics()
+        self.pre = Preprocessor(batch_size=static_batch or self.max_batch)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._batcher())
+
+    def _decode(self, data):
+        """Decoded BGR image, or the array checked against the input shape; raises for this request only."""
+        if isinstance(data, np.ndarray):
+            if data.shape != self.pre.batch.shape[1:]:
+                raise ValueError(f"array shape {data.shape}, expected {self.pre.batch.shape[1:]}")
+            return data.astype(np.float32, copy=False)
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Could not decode image")
+        return img
+
+    async def submit(self, data):
+        """data: encoded image bytes or a preprocessed (H, W, 3) float array."""
+        loop = asyncio.get_running_loop()
+        # Decoded before queueing, so a bad request never joins a batch
+        data = await loop.run_in_executor(self.post_pool, self._decode, data)
+        future = loop.create_future()
+        request = _Request(data, future)
+        await self.queue.put(request)
+        self.metrics.observe_queue(self.queue.qsize())
+        dets = await future
+        self.metrics.observe_latency(time.perf_counter() - request.arrived)
+        return dets
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = batch[0].arrived + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.metrics.observe_batch(len(batch))
+            try:
+                outputs, infos = await loop.run_in_executor(self.infer_pool, self._infer, batch)
+            except Exception as e:
+                for r in batch:
+                    if not r.future.done():
+                        r.future.set_exception(e)
+                continue
+            # Post-processing runs in the shared pool while the next batch forms
+            for r, out, info in zip(batch, outputs, infos):
+                if isinstance(info, Exception):
+                    if not r.future.done():
+                        r.future.set_exception(info)
+                    continue
+                fut = loop.run_in_executor(self.post_pool, _postprocess, out, info)
+                fut.add_done_callback(lambda f, r=r: _resolve(r.future, f))
+
+    def _infer(self, batch):
+        """Fills the batch from decoded requests; a slot that fails gets its exception as info."""
+        infos = []
+        for slot, r in enumerate(batch):
+            try:
+                if r.data.dtype != np.uint8:      # preprocessed array, already shape-checked
+                    self.pre.batch[slot] = r.data
+                    infos.append(None)
+                else:
+                    infos.append(self.pre.load(r.data, slot))
+            except Exception as e:
+                infos.append(e)
+        n = self.static_batch or len(batch)
+        out = self.run_model(self.pre.batch[:n])
+        return [out[i] for i in range(len(batch))], infos
+
+
+def _postprocess(output, info):
+    dets = decode_yolo(output)
+    return scale_detections(dets, info) if info is not None else dets
+
+
+def _resolve(future, done):
+    if future.done():
+        return
+    if done.exception() is not None:
+        future.set_exception(done.exception())
+    else:
+        future.set_result(done.result())
+
+
+# ----------------------------------------------------------------------------
+# Minimal HTTP/1.1 over TCP (localhost) or a Unix socket
+# ----------------------------------------------------------------------------
+
+class InferenceServer:
+    def __init__(self, models=MODELS, max_batch=MAX_BATCH, max_delay_ms=MAX_DELAY_MS):
+        self.infer_pool = ThreadPoolExecutor(max_workers=INFER_THREADS)
+        self.post_pool = ThreadPoolExecutor(max_workers=POST_THREADS)
+        self.workers = {name: ModelWorker(name, path, self.infer_pool, self.post_pool,
+                                          max_batch, max_delay_ms)
+                        for name, path in models.items()}
+
+    async def _respond(self, writer, status, body):
+        payload = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = h.decode().partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                await self.route(writer, method, path, headers, body)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, path, headers, body):
+        parts = path.strip('/').split('/')
+        if method == 'GET' and parts[0] == 'metrics':
+            await self._respond(writer, "200 OK", {
+                name: w.metrics.snapshot(w.queue.qsize()) for name, w in self.workers.items()})
+        elif method == 'GET' and parts[0] == 'health':
+            await self._respond(writer, "200 OK", {'models': list(self.workers)})
+        elif method == 'POST' and parts[0] == 'infer' and len(parts) == 2 and parts[1] in self.workers:
+            try:
+                data = body
+                if headers.get('content-type') == 'application/x-npy':
+                    data = np.load(io.BytesIO(body), allow_pickle=False)
+                dets = await self.workers[parts[1]].submit(data)
+                await self._respond(writer, "200 OK", {'detections': dets.tolist()})
+            except Exception as e:
+                await self._respond(writer, "400 Bad Request", {'error': str(e)})
+        else:
+            await self._respond(writer, "404 Not Found", {'error': f"no route {method} {path}"})
+
+    async def serve(self, socket_path=SOCKET_PATH, port=None):
+        for w in self.workers.values():
+            w.start()
+        if port:
+            server = await asyncio.start_server(self.handle, HOST, port)
+            print(f"Serving {list(self.workers)} on http://{HOST}:{port}")
+        else:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+            print(f"Serving {list(self.workers)} on unix:{socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+# ----------------------------------------------------------------------------
+# Local test client
+# ----------------------------------------------------------------------------
+
+async def _request(socket_path, port, method, path, body=b''):
+    if port:
+        reader, writer = await asyncio.open_connection(HOST, port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b'\r\n', b''):
+            break
+        if h.lower().startswith(b'content-length:'):
+            length = int(h.split(b':')[1])
+    payload = await reader.readexactly(length)
+    writer.close()
+    return json.loads(payload)
+
+
+async def bench(model, requests, concurrency, socket_path=SOCKET_PATH, port=None):
+    files = list_images(IMG_DIR)
+    images = [open(f, "rb").read() for f in files]
+    latencies = []
+    counter = iter(range(requests))
+
+    async def client():
+        for i in counter:
+            start = time.perf_counter()
+            await _request(socket_path, port, "POST", f"/infer/{model}", images[i % len(images)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    print("=" * 70)
+    print(f"{requests} requests, {concurrency} clients: {requests / elapsed:.1f} req/s")
+    print(f"Client latency ms: p50 {np.percentile(lat, 50):.1f}, "
+          f"p90 {np.percentile(lat, 90):.1f}, p99 {np.percentile(lat, 99):.1f}")
+    print("=" * 70)
+    print(json.dumps(await _request(socket_path, port, "GET", "/metrics"), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local batched YOLO inference service")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    s.add_argument("--max-delay-ms", type=float, default=MAX_DELAY_MS)
+    b = sub.add_parser("bench")
+    b.add_argument("--model", default=next(iter(MODELS)))
+    b.add_argument("--requests", type=int, default=200)
+    b.add_argument("--concurrency", type=int, default=8)
+    for p in (s, b):
+        p.add_argument("--socket", default=SOCKET_PATH)
+        p.add_argument("--port", type=int, help="localhost TCP port instead of the Unix socket")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        server = InferenceServer(MODELS, args.max_batch, args.max_delay_ms)
+        asyncio.run(server.serve(args.socket, args.port))
+    else:
+        asyncio.run(bench(args.model, args.requests, args.concurrency, args.socket, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,4 @@
-import os
-import cv2
-import numpy as np
+from preprocess import Preprocessor, list_images
 
 # --- CONFIG ---
 CALIB_DIR = "calib_dataset"
@@ -11,25 +9,19 @@ INPUT_WIDTH  = 640
 # Example: input_node_name = "images" 
 input_node_name = "images"  
 
+# Shared with test_inference.py / quantize_yolo.py so calibration sees exactly
+# the same letterboxed RGB 0-1 NHWC input as evaluation and the runtime.
+_files = list_images(CALIB_DIR)
+_pre = Preprocessor(batch_size=1, height=INPUT_HEIGHT, width=INPUT_WIDTH)
+
 def calib_input(iter):
-    images = []
-    files = os.listdir(CALIB_DIR)
-    
     # Load batch of size 1 based on 'iter' index
     # We loop if we run out of images
-    idx = iter % len(files)
-    file_path = os.path.join(CALIB_DIR, files[idx])
-    
-    # Read Image
-    img = cv2.imread(file_path)
-    img = cv2.resize(img, (INPUT_WIDTH, INPUT_HEIGHT))
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Normalize (0-1)
-    img = img.astype(np.float32) / 255.0
+    idx = iter % len(_files)
     
-    # Add Batch Dimension (1, 640, 640, 3)
-    img = np.expand_dims(img, 0)
+    # Read + letterbox + RGB + normalize straight into the (1, 640, 640, 3) buffer.
+    # vai_q feeds it before asking for the next iter, so the buffer is reused.
+    _pre.load_file(_files[idx])
     
     # Return dictionary mapping Node Name -> Data
-    return {input_node_name: img}
\ No newline at end of file
+    return {input_node_name: _pre.batch}
@@ -0,0 +1,190 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from numpy_executor import ALIAS_OPS, NumpyGraph, _split_input
+from rewrite_utils import graph_endpoints, sample_feeds
+
+# Static memory plan for host execution: every intermediate activation gets a
+# fixed offset in one arena. Lifetimes come from the topological order (a
+# tensor lives from the step that produces it to its last consumer), and
+# tensors whose lifetimes overlap never share bytes. Offsets are assigned
+# greedily, largest tensor first, into the lowest gap free over its lifetime.
+
+# --- CONFIG ---
+INPUT_GRAPH = "frozen_yolo_clean.pb"
+ALIGNMENT   = 64        # bytes; keeps every buffer cache-line and SIMD aligned
+CHECK_FEEDS = 1
+
+NO_BUFFER_OPS = {'Const', 'Placeholder', 'NoOp'}
+
+
+def tensor_specs(graph_def):
+    """{node name: [(shape list or None, numpy dtype), ...]} from a TF import."""
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+    return {op.name: [(t.shape.as_list() if t.shape.rank is not None else None,
+                       t.dtype.as_numpy_dtype) for t in op.outputs]
+            for op in graph.get_operations()}
+
+
+def _aligned(nbytes, alignment=ALIGNMENT):
+    return -(-nbytes // alignment) * alignment
+
+
+def lifetimes(graph_def, outputs, specs):
+    """
+    Returns (order, tensors, unplanned). tensors maps (node, idx) to
+    {'first', 'last', 'shape', 'dtype', 'bytes'}, where first/last are step
+    indices into `order`. Outputs of ALIAS_OPS get no entry: they extend the
+    lifetime of the buffer they view. Tensors without a static shape go in
+    `unplanned` and are allocated normally at run time.
+    """
+    nodes = {n.name: n for n in graph_def.node}
+    order = NumpyGraph._topo_order(nodes, [_split_input(o)[0] for o in outputs])
+    tensors, root, unplanned = {}, {}, []
+
+    def resolve(inp):
+        key = _split_input(inp)
+        return root.get(key, key)
+
+    for step, n in enumerate(order):
+        if n.op in NO_BUFFER_OPS:
+            continue
+        data = [i for i in n.input if not i.startswith('^')]
+        for inp in data:
+            key = resolve(inp)
+            if key in tensors:
+                tensors[key]['last'] = max(tensors[key]['last'], step)
+        if n.op in ALIAS_OPS and data:
+            root[(n.name, 0)] = resolve(data[0])
+            continue
+        for idx, (shape, dtype) in enumerate(specs.get(n.name, [])):
+            if shape is None or None in shape:
+                unplanned.append(f"{n.name}:{idx}")
+                continue
+            nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            tensors[(n.name, idx)] = {'first': step, 'last': step, 'shape': shape,
+                                      'dtype': np.dtype(dtype).name, 'bytes': nbytes}
+
+    end = len(order)
+    for o in outputs:
+        key = resolve(o)
+        if key in tensors:
+            tensors[key]['last'] = end
+    return order, tensors, unplanned
+
+
+def assign_offsets(tensors, alignment=ALIGNMENT):
+    """Greedy by size: each tensor takes the lowest offset clear of every overlapping placed tensor."""
+    placed = []
+    for key in sorted(tensors, key=lambda k: (-tensors[k]['bytes'], tensors[k]['first'])):
+        t = tensors[key]
+        size = _aligned(t['bytes'], alignment)
+        busy = sorted((p['offset'], p['size']) for p in placed
+                      if p['first'] <= t['last'] and t['first'] <= p['last'])
+        offset = 0
+        for o, s in busy:
+            if o - offset >= size:
+                break
+            offset = max(offset, o + s)
+        t['offset'] = offset
+        placed.append({'offset': offset, 'size': size, 'first': t['first'], 'last': t['last']})
+    return max((p['offset'] + p['size'] for p in placed), default=0)
+
+
+def live_peak(tensors, steps):
+    """Largest sum of live tensor bytes at any step: the bound no static plan can beat."""
+    delta = np.zeros(steps + 2, np.int64)
+    for t in tensors.values():
+        delta[t['first']] += t['bytes']
+        delta[t['last'] + 1] -= t['bytes']
+    return int(np.cumsum(delta).max(initial=0))
+
+
+def plan_arena(graph_def, outputs, alignment=ALIGNMENT):
+    """Arena plan for NumpyGraph(arena_plan=...), plus the numbers behind it."""
+    specs = tensor_specs(graph_def)
+    order, tensors, unplanned = lifetimes(graph_def, outputs, specs)
+    size = assign_offsets(tensors, alignment)
+    return {
+        'size': size,
+        'alignment': alignment,
+        'tensors': {f"{name}:{idx}": {'offset': t['offset'], 'shape': t['shape'], 'dtype': t['dtype']}
+                    for (name, idx), t in tensors.items()},
+        'unplanned': unplanned,
+        'no_reuse_bytes': sum(t['bytes'] for t in tensors.values()),
+        'live_peak_bytes': live_peak(tensors, len(order)),
+    }
+
+
+def measure_peak(graph_def, outputs, feeds, arena_plan=None):
+    """(traced peak bytes, seconds) for one NumpyGraph run; includes the arena itself."""
+    tracemalloc.start()
+    graph = NumpyGraph(graph_def, outputs, arena_plan=arena_plan)
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    out = graph.run(feeds)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    arena = graph.arena.nbytes if graph.arena is not None else 0
+    return peak + arena, elapsed, out
+
+
+def _mb(nbytes):
+    return f"{nbytes / 2 ** 20:8.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a static activation arena for NumPy execution")
+    parser.add_argument("graph", nargs='?', default=INPUT_GRAPH, help="frozen graph or CPU partition .pb")
+    parser.add_argument("--out", help="plan JSON (default: <graph>.arena.json)")
+    parser.add_argument("--measure", action="store_true",
+                        help="run NumpyGraph with and without the arena and compare traced peaks")
+    args = parser.parse_args()
+
+    graph_def = load_graph(args.graph)
+    _, outputs = graph_endpoints(graph_def)
+    start = time.perf_counter()
+    plan = plan_arena(graph_def, outputs)
+    print(f"Planned {len(plan['tensors'])} tensors in {time.perf_counter() - start:.2f}s")
+
+    print("\n" + "=" * 70)
+    print("ACTIVATION MEMORY")
+    print("=" * 70)
+    print(f"  No reuse (every intermediate kept):  {_mb(plan['no_reuse_bytes'])}")
+    print(f"  Live-set peak (lower bound):         {_mb(plan['live_peak_bytes'])}")
+    print(f"  Arena:                               {_mb(plan['size'])}  "
+          f"({plan['size'] / max(plan['live_peak_bytes'], 1):.3f}x the bound)")
+    if plan['unplanned']:
+        print(f"  {len(plan['unplanned'])} tensors without static shapes stay on the heap, "
+              f"e.g. {plan['unplanned'][:3]}")
+
+    out_path = args.out or args.graph + ".arena.json"
+    with open(out_path, "w") as f:
+        json.dump(plan, f)
+    print(f"\nSaved plan to {out_path}")
+
+    if args.measure:
+        print("\n" + "=" * 70)
+        print("NUMPY EXECUTOR, TRACED PEAK")
+        print("=" * 70)
+        feeds = {name.split(':')[0]: arr for name, arr in sample_feeds(graph_def, CHECK_FEEDS)[0].items()}
+        heap_peak, heap_s, ref = measure_peak(graph_def, outputs, feeds)
+        arena_peak, arena_s, got = measure_peak(graph_def, outputs, feeds, plan)
+        print(f"  Heap (free after last use): {_mb(heap_peak)}  {heap_s * 1000:.0f} ms")
+        print(f"  Arena:                      {_mb(arena_peak)}  {arena_s * 1000:.0f} ms")
+        worst = max(float(np.abs(ref[o] - got[o]).max(initial=0.0)) for o in outputs)
+        print(f"  Max abs output difference: {worst:.3g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+from calib_stats import STATS_FILE, CalibStats, accumulate, fix_pos_for, fix_positions, graph_digest
+from const_store import load_graph
+from graph_stats import flop_profile, tensor_bytes
+from preprocess import list_images
+from rewrite_utils import (base_name, consumers_map, const_value, graph_endpoints, make_const, make_node,
+                           node_map, replace_nodes, run_graph, sample_feeds)
+from split_runtime import CPU_OPS
+
+# --- CONFIG ---
+INPUT_GRAPH  = "frozen_yolo_clean.pb"
+CALIB_DIR    = "calib_dataset"
+OUTPUT_FILE  = "skip_nodes_mixed.txt"   # same one-line, comma-separated format as skip_nodes.txt
+EVAL_IMAGES  = 4
+WORKERS      = 4
+TARGET_SQNR  = 30.0      # dB, all outputs of the quantized graph vs float
+BIT_WIDTH    = 8
+STRATEGY     = "mse"     # activation fix positions, see calib_stats.py
+
+# Layers a quantizer gets inserted after
+LAYER_OPS = {
+    'Conv2D', 'DepthwiseConv2dNative', 'BiasAdd', 'Add', 'AddV2', 'Sub', 'Mul',
+    'Sigmoid', 'MaxPool', 'AvgPool', 'ConcatV2', 'ResizeNearestNeighbor',
+}
+WEIGHT_OPS = {'Conv2D', 'DepthwiseConv2dNative'}
+
+# Rough Ultra96 numbers for the cost of moving a layer off the DPU
+DPU_GOPS   = 300.0      # effective B2304 throughput
+CPU_GFLOPS = 4.0        # 4x A53 NEON, float
+LINK_GBPS  = 2.0        # DDR round trip for a tensor crossing DPU <-> CPU
+
+
+def fake_quant(x, pos, bit_width=BIT_WIDTH):
+    step = 2.0 ** -pos
+    lo, hi = -(2 ** (bit_width - 1)), 2 ** (bit_width - 1) - 1
+    # Round half up, like the DPU and the rest of this repo (np.round is half-to-even)
+    return (np.clip(np.floor(x / step + 0.5), lo, hi) * step).astype(x.dtype)
+
+
+def quantize_layers(graph_def, layers, act_pos, bit_width=BIT_WIDTH):
+    """
+    Copy of graph_def with each layer's weights and output quantized to
+    `bit_width` fixed point. The layer is renamed '<name>/float' and a
+    FakeQuantWithMinMaxArgs takes over its name, so consumers see the
+    quantized tensor. min/max sit on the 2^-pos grid, so TF doesn't nudge them.
+    """
+    nodes = node_map(graph_def)
+    replacements = {}
+    for name in layers:
+        n = nodes[name]
+        layer = tf.compat.v1.NodeDef()
+        layer.CopyFrom(n)
+        layer.name = name + "/float"
+        new = []
+        if n.op in WEIGHT_OPS:
+            w = const_value(nodes, n.input[1])
+            if w is not None and w.dtype == np.float32:
+                wq = make_const(name + "/wquant", fake_quant(w, fix_pos_for(np.abs(w).max(), bit_width),
+                                                             bit_width))
+                layer.input[1] = wq.name
+                new.append(wq)
+        step = 2.0 ** -act_pos[name + ":0"]
+        fq = make_node('FakeQuantWithMinMaxArgs', name, [layer.name],
+                       min=tf.compat.v1.AttrValue(f=-(2 ** (bit_width - 1)) * step),
+                       max=tf.compat.v1.AttrValue(f=(2 ** (bit_width - 1) - 1) * step),
+                       num_bits=tf.compat.v1.AttrValue(i=bit_width),
+                       narrow_range=tf.compat.v1.AttrValue(b=False))
+        replacements[name] = new + [layer, fq]
+    return replace_nodes(graph_def, replacements)
+
+
+def sqnr_db(refs, outs):
+    """Signal-to-quantization-noise over every output and feed, in dB."""
+    signal = noise = 0.0
+    for ref, out in zip(refs, outs):
+        for a, b in zip(ref, out):
+            a, b = np.asarray(a, np.float64), np.asarray(b, np.float64)
+            signal += float((a * a).sum())
+            noise += float(((a - b) ** 2).sum())
+    return float('inf') if noise == 0 else 10 * np.log10(signal / noise)
+
+
+# ----------------------------------------------------------------------------
+# Per-layer sensitivity, in worker processes
+# ----------------------------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(graph_path, act_pos, feeds, fetches, refs):
+    _worker.update(graph_def=load_graph(graph_path), act_pos=act_pos, feeds=feeds,
+                   fetches=fetches, refs=refs)
+
+
+def _sensitivity_worker(layer):
+    """SQNR with only `layer` quantized."""
+    w = _worker
+    start = time.perf_counter()
+    q = quantize_layers(w['graph_def'], [layer], w['act_pos'])
+    sqnr = sqnr_db(w['refs'], run_graph(q, w['feeds'], w['fetches']))
+    return layer, sqnr, time.perf_counter() - start
+
+
+def layer_sensitivity(graph_path, layers, act_pos, feeds, fetches, refs, workers=WORKERS):
+    """{layer: single-layer SQNR in dB}; lower means more sensitive."""
+    # spawn, not fork: the parent has already run TF sessions and TF isn't fork-safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(graph_path, act_pos, feeds, fetches, refs)) as pool:
+        results = {}
+        for k, (layer, sqnr, secs) in enumerate(pool.map(_sensitivity_worker, layers), 1):
+            results[layer] = sqnr
+            if k % 25 == 0 or k == len(layers):
+                print(f"  {k}/{len(layers)} layers ({secs:.1f}s last)")
+    return results
+
+
+# ----------------------------------------------------------------------------
+# Search
+# ----------------------------------------------------------------------------
+
+def search_float_set(graph_def, layers, sensitivity, act_pos, feeds, fetches, refs,
+                     target=TARGET_SQNR):
+    """
+    Smallest k such that keeping the k most sensitive layers in float meets
+    `target`, by binary search over k (assumes SQNR grows as layers leave the
+    quantized set). Returns (float layers, SQNR, evaluations).
+    """
+    ranked = sorted(layers, key=lambda n: sensitivity[n])
+
+    def evaluate(k):
+        q = quantize_layers(graph_def, ranked[k:], act_pos)
+        return sqnr_db(refs, run_graph(q, feeds, fetches))
+
+    history = {}
+    lo, hi = 0, len(ranked)
+    history[lo] = evaluate(lo)
+    if history[lo] >= target:
+        return [], history[lo], history
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        history[mid] = evaluate(mid)
+        print(f"  {mid} layers in float: {history[mid]:.2f} dB")
+        if history[mid] >= target:
+            hi = mid
+        else:
+            lo = mid
+    if hi not in history:
+        # Never probed: the search assumed the all-float end meets the target
+        history[hi] = evaluate(hi)
+    return ranked[:hi], history[hi], history
+
+
+def latency_cost(graph_def, float_layers, flops, shapes):
+    """Predicted extra ms per frame for running `float_layers` on the CPU instead of the DPU."""
+    nodes = node_map(graph_def)
+    consumers = consumers_map(graph_def)
+    moved = set(float_layers)
+    compute = sum(flops.get(n, 0) for n in moved)
+    # Tensors crossing the DPU/CPU boundary in either direction
+    crossing = set()
+    for name in moved:
+        for inp in nodes[name].input:
+            src = base_name(inp)
+            if not inp.startswith('^') and src not in moved and nodes[src].op != 'Const':
+                crossing.add(inp)
+        if any(c.name not in moved for c, _ in consumers[name]):
+            crossing.add(name)
+    transfer = sum(tensor_bytes(shapes, t) for t in crossing)
+    return {
+        'cpu_ms': compute / (CPU_GFLOPS * 1e6),
+        'dpu_saved_ms': compute / (DPU_GOPS * 1e6),
+        'transfer_ms': transfer / (LINK_GBPS * 1e6),
+        'crossing_tensors': len(crossing),
+        'total_ms': (compute / (CPU_GFLOPS * 1e6) - compute / (DPU_GOPS * 1e6)
+                     + transfer / (LINK_GBPS * 1e6)),
+    }
+
+
+def activation_positions(graph_def, stats_path=STATS_FILE, images=EVAL_IMAGES):
+    """Fix positions from calib_stats.npz, collecting it first if missing or stale."""
+    stats = CalibStats.load(stats_path) if os.path.exists(stats_path) else None
+    if stats is not None and stats.digest != graph_digest(graph_def):
+        stats = None
+    stats = accumulate(graph_def, list_images(CALIB_DIR, limit=images), stats, stats_path)
+    return fix_positions(stats, STRATEGY, BIT_WIDTH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick layers to keep in float for a target SQNR")
+    parser.add_argument("graph", nargs='?', default=INPUT_GRAPH)
+    parser.add_argument("--target", type=float, default=TARGET_SQNR, help="dB")
+    parser.add_argument("--images", type=int, default=EVAL_IMAGES)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--out", default=OUTPUT_FILE)
+    args = parser.parse_args()
+
+    print(f"Loading {args.graph}...")
+    graph_def = load_graph(args.graph)
+    _, fetches = graph_endpoints(graph_def)
+    act_pos = activation_positions(graph_def)
+
+    # Ops the DPU can't run at all are skipped regardless of accuracy
+    forced = [n.name for n in graph_def.node if n.op in CPU_OPS]
+    layers = [n.name for n in graph_def.node
+              if n.op in LAYER_OPS and n.name + ":0" in act_pos and n.name not in forced]
+    print(f"{len(layers)} quantizable layers, {len(forced)} already forced to CPU")
+
+    feeds = sample_feeds(graph_def, args.images)
+    refs = run_graph(graph_def, feeds, fetches)
+
+    print(f"\nSingle-layer sensitivity on {args.workers} workers...")
+    start = time.perf_counter()
+    sensitivity = layer_sensitivity(args.graph, layers, act_pos, feeds, fetches, refs, args.workers)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+    print("\n" + "=" * 70)
+    print("MOST SENSITIVE LAYERS (SQNR with only this layer quantized)")
+    print("=" * 70)
+    nodes = node_map(graph_def)
+    for name in sorted(sensitivity, key=sensitivity.get)[:15]:
+        print(f"  {sensitivity[name]:7.2f} dB  [{nodes[name].op}] {name}")
+
+    print(f"\nSearching for the smallest float set reaching {args.target} dB...")
+    float_layers, sqnr, history = search_float_set(graph_def, layers, sensitivity, act_pos,
+                                                   feeds, fetches, refs, args.target)
+    if sqnr < args.target:
+        print("WARNING: Target not reachable even with every layer in float.")
+
+    flops, shapes = flop_profile(graph_def)
+    cost = latency_cost(graph_def, float_layers, flops, shapes)
+    skip = forced + float_layers
+    with open(args.out, "w") as f:
+        f.write(",".join(skip))
+
+    print("\n" + "=" * 70)
+    print("RESULT")
+    print("=" * 70)
+    print(f"  Fully quantized: {history[0]:.2f} dB")
+    print(f"  Float layers: {len(float_layers)} -> {sqnr:.2f} dB (target {args.target})")
+    print(f"  Skip nodes: {len(skip)} ({len(forced)} forced + {len(float_layers)} chosen) -> {args.out}")
+    print(f"  Predicted latency cost: +{cost['total_ms']:.2f} ms/frame "
+          f"(CPU {cost['cpu_ms']:.2f}, DPU saved {cost['dpu_saved_ms']:.2f}, "
+          f"transfer {cost['transfer_ms']:.2f} over {cost['crossing_tensors']} tensors)")
+    print('\nvai_q_tensorflow quantize ... --skip_nodes "$(cat ' + args.out + ')"')
+
+
+if __name__ == "__main__":
+    main()
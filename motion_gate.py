@@ -0,0 +1,188 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from postprocess import batched_nms, match_rate
+from video_tracker import VIDEO, make_detector
+
+# Change gate for fixed cameras: a downsampled grey frame is compared block
+# by block against the last frame the model actually saw. Unchanged frames
+# reuse the cached detections; changed ones run the model on the whole frame,
+# or ('crop' mode) only on the changed region, keeping cached boxes elsewhere.
+
+# --- CONFIG ---
+MODEL_PATH   = "yolo12_tf_fixed"
+GATE_SIZE    = (160, 96)     # w, h of the grey thumbnail; multiples of BLOCK
+BLOCK        = 8             # thumbnail pixels per block side
+BLOCK_THRES  = 12.0          # mean abs diff (0-255) that marks a block as changed
+MIN_BLOCKS   = 1             # changed blocks needed to run the model
+CROP_MARGIN  = 1             # blocks added around the changed region
+CROP_MAX     = 0.5           # crop mode falls back to the full frame above this area fraction
+CROP_NMS_IOU = 0.3           # merge of cached + crop boxes; a box cut at the crop edge has IoU ~0.5
+FALSE_SKIP_RECALL = 0.9      # a skip is false if the cache finds fewer of the fresh detections
+
+
+class MotionGate:
+    def __init__(self, size=GATE_SIZE, block=BLOCK, thres=BLOCK_THRES, min_blocks=MIN_BLOCKS):
+        self.size, self.block, self.thres, self.min_blocks = size, block, thres, min_blocks
+        w, h = size
+        self._grey = np.empty((h, w), np.uint8)
+        self._small = np.empty((h, w, 3), np.uint8)
+        self.ref = None
+
+    def _thumb(self, frame):
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._grey)
+        return self._grey
+
+    def changed_blocks(self, frame):
+        """(by, bx) bool map of blocks that differ from the reference, or None without one."""
+        grey = self._thumb(frame)
+        if self.ref is None:
+            return None
+        b = self.block
+        h, w = grey.shape
+        diff = cv2.absdiff(grey, self.ref).reshape(h // b, b, w // b, b)
+        return diff.mean(axis=(1, 3)) > self.thres
+
+    def accept(self, block_box=None):
+        """
+        The model ran on the last frame passed to changed_blocks(): it becomes
+        the reference, only inside block_box (x0, y0, x1, y1 in blocks) when
+        the model saw just that crop, so drift elsewhere keeps accumulating.
+        """
+        if self.ref is None:
+            self.ref = self._grey.copy()
+        elif block_box is None:
+            np.copyto(self.ref, self._grey)
+        else:
+            b = self.block
+            x0, y0, x1, y1 = block_box
+            rows, cols = slice(y0 * b, y1 * b), slice(x0 * b, x1 * b)
+            self.ref[rows, cols] = self._grey[rows, cols]
+
+    def block_box(self, blocks, margin=CROP_MARGIN):
+        """Bounding box (x0, y0, x1, y1) in blocks of the changed blocks, plus a margin."""
+        ys, xs = np.nonzero(blocks)
+        by, bx = blocks.shape
+        y0, y1 = max(ys.min() - margin, 0), min(ys.max() + 1 + margin, by)
+        x0, x1 = max(xs.min() - margin, 0), min(xs.max() + 1 + margin, bx)
+        return int(x0), int(y0), int(x1), int(y1)
+
+    def region(self, blocks, frame_shape, margin=CROP_MARGIN):
+        """Bounding box (x0, y0, x1, y1) in frame pixels of the changed blocks, plus a margin."""
+        x0, y0, x1, y1 = self.block_box(blocks, margin)
+        by, bx = blocks.shape
+        fh, fw = frame_shape[:2]
+        return (int(x0 * fw / bx), int(y0 * fh / by), int(np.ceil(x1 * fw / bx)), int(np.ceil(y1 * fh / by)))
+
+
+class GatedDetector:
+    """Runs `detect` only when the gate sees a change; 'full' or 'crop' mode."""
+
+    def __init__(self, detect, mode="full", gate=None):
+        self.detect = detect
+        self.mode = mode
+        self.gate = gate or MotionGate()
+        self.cache = np.zeros((0, 6), np.float32)
+        self.stats = {'frames': 0, 'full': 0, 'crop': 0, 'skipped': 0, 'crop_area': 0.0,
+                      'gate_s': 0.0, 'model_s': 0.0}
+
+    def __call__(self, frame):
+        s = self.stats
+        s['frames'] += 1
+        t0 = time.perf_counter()
+        blocks = self.gate.changed_blocks(frame)
+        s['gate_s'] += time.perf_counter() - t0
+
+        if blocks is not None and blocks.sum() < self.gate.min_blocks:
+            s['skipped'] += 1
+            return self.cache, False
+
+        t0 = time.perf_counter()
+        region = self.gate.region(blocks, frame.shape) if self.mode == "crop" and blocks is not None else None
+        area = 1.0
+        if region is not None:
+            x0, y0, x1, y1 = region
+            area = (x1 - x0) * (y1 - y0) / (frame.shape[0] * frame.shape[1])
+        if region is None or area > CROP_MAX:
+            self.cache = self.detect(frame)
+            s['full'] += 1
+            self.gate.accept()
+        else:
+            dets = self.detect(frame[y0:y1, x0:x1])
+            dets[:, 0:4:2] += x0
+            dets[:, 1:4:2] += y0
+            # Cached boxes centred inside the region are replaced by the fresh ones. Objects
+            # straddling the border can show up twice (cached, plus cut off at the crop
+            # edge): class-aware NMS over the union keeps one box per object.
+            cx = (self.cache[:, 0] + self.cache[:, 2]) / 2
+            cy = (self.cache[:, 1] + self.cache[:, 3]) / 2
+            inside = (cx >= x0) & (cx < x1) & (cy >= y0) & (cy < y1)
+            merged = np.concatenate([self.cache[~inside], dets])
+            keep = batched_nms(merged[:, :4], merged[:, 4], merged[:, 5].astype(np.int64), CROP_NMS_IOU)
+            self.cache = merged[keep]
+            s['crop'] += 1
+            s['crop_area'] += area
+            self.gate.accept(self.gate.block_box(blocks))
+        s['model_s'] += time.perf_counter() - t0
+        return self.cache, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skip inference on frames that haven't changed")
+    parser.add_argument("video", nargs='?', default=VIDEO)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--mode", choices=["full", "crop"], default="full")
+    parser.add_argument("--frames", type=int)
+    parser.add_argument("--eval", action="store_true",
+                        help="also run the model on skipped frames to measure false skips")
+    parser.add_argument("--thres", type=float, default=BLOCK_THRES)
+    args = parser.parse_args()
+
+    detect = make_detector(args.model)
+    gated = GatedDetector(detect, args.mode, MotionGate(thres=args.thres))
+    cap = cv2.VideoCapture(int(args.video) if args.video.isdigit() else args.video)
+    if not cap.isOpened():
+        print(f"ERROR: Could not open {args.video}")
+        return
+
+    false_skips = checked = 0
+    n = 0
+    ok, frame = cap.read()
+    while ok and (args.frames is None or n < args.frames):
+        dets, ran = gated(frame)
+        if args.eval and not ran:
+            checked += 1
+            if match_rate(detect(frame), dets) < FALSE_SKIP_RECALL:
+                false_skips += 1
+        n += 1
+        ok, frame = cap.read()
+    cap.release()
+
+    s = gated.stats
+    if not s['frames']:
+        print("No frames.")
+        return
+    runs = s['full'] + s['crop']
+    per_run = s['model_s'] / runs if runs else 0.0
+    saved = s['skipped'] * per_run
+    print("\n" + "=" * 70)
+    print(f"MOTION GATE ({args.mode}): {s['frames']} frames")
+    print("=" * 70)
+    print(f"  Skip rate: {s['skipped'] / s['frames']:.1%} ({s['skipped']} skipped, "
+          f"{s['full']} full, {s['crop']} crop)")
+    if s['crop']:
+        print(f"  Mean crop area: {s['crop_area'] / s['crop']:.1%} of the frame")
+    if checked:
+        print(f"  False-skip rate: {false_skips / checked:.1%} of skipped frames "
+              f"(cache recall < {FALSE_SKIP_RECALL:.0%})")
+    print(f"  Gate: {s['gate_s'] / s['frames'] * 1e6:.0f} us/frame")
+    print(f"  Model: {runs} runs, {per_run * 1000:.1f} ms each; "
+          f"saved ~{saved:.1f} s ({saved / (saved + s['model_s'] + s['gate_s']):.1%} of the compute)")
+
+
+if __name__ == "__main__":
+    main()
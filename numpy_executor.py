@@ -0,0 +1,386 @@
+import numpy as np
+import tensorflow as tf
+
+# Runs a frozen GraphDef with plain NumPy kernels. Meant for the small CPU
+# islands the DPU can't take (attention, DFL head) on a board where a full
+# TF session is too heavy, and as a reference when checking graph rewrites.
+
+
+def _attr(node, key, default=None):
+    if key not in node.attr:
+        return default
+    a = node.attr[key]
+    which = a.WhichOneof('value')
+    if which == 'list':
+        if a.list.i:
+            return list(a.list.i)
+        if a.list.f:
+            return list(a.list.f)
+        if a.list.s:
+            return [s.decode() for s in a.list.s]
+        return []
+    if which == 's':
+        return a.s.decode()
+    if which == 'tensor':
+        return tf.make_ndarray(a.tensor)
+    return getattr(a, which)
+
+
+def _split_input(inp):
+    """'node:1' -> ('node', 1), 'node' -> ('node', 0)."""
+    name, _, idx = inp.partition(':')
+    return name, int(idx) if idx else 0
+
+
+def _pad_amounts(node, x_hw, k_hw, strides, dilations):
+    padding = _attr(node, 'padding')
+    if padding == 'VALID':
+        return [(0, 0), (0, 0)]
+    if padding == 'EXPLICIT':
+        p = _attr(node, 'explicit_paddings')
+        return [(p[2], p[3]), (p[4], p[5])]
+    pads = []
+    for size, k, s, d in zip(x_hw, k_hw, strides, dilations):
+        eff = (k - 1) * d + 1
+        out = -(-size // s)
+        total = max((out - 1) * s + eff - size, 0)
+        pads.append((total // 2, total - total // 2))
+    return pads
+
+
+def _windows(x, kh, kw, strides, dilations, pads, pad_value=0.0):
+    """NHWC -> (N, OH, OW, C, kh, kw) strided view (no copy after padding)."""
+    if any(p for pair in pads for p in pair):
+        x = np.pad(x, [(0, 0), pads[0], pads[1], (0, 0)], constant_values=pad_value)
+    dh, dw = dilations
+    win = np.lib.stride_tricks.sliding_window_view(
+        x, ((kh - 1) * dh + 1, (kw - 1) * dw + 1), axis=(1, 2))
+    return win[:, ::strides[0], ::strides[1], :, ::dh, ::dw]
+
+
+def _conv2d(node, x, w, out=None):
+    strides = _attr(node, 'strides', [1, 1, 1, 1])[1:3]
+    dilations = _attr(node, 'dilations', [1, 1, 1, 1])[1:3]
+    kh, kw = w.shape[:2]
+    pads = _pad_amounts(node, x.shape[1:3], (kh, kw), strides, dilations)
+    win = _windows(x, kh, kw, strides, dilations, pads)
+    return np.einsum('nhwcij,ijco->nhwo', win, w, optimize=True, out=out)
+
+
+def _depthwise(node, x, w):
+    strides = _attr(node, 'strides', [1, 1, 1, 1])[1:3]
+    dilations = _attr(node, 'dilations', [1, 1, 1, 1])[1:3]
+    kh, kw, c, m = w.shape
+    pads = _pad_amounts(node, x.shape[1:3], (kh, kw), strides, dilations)
+    win = _windows(x, kh, kw, strides, dilations, pads)
+    out = np.einsum('nhwcij,ijcm->nhwcm', win, w, optimize=True)
+    return out.reshape(out.shape[:3] + (c * m,))
+
+
+def _pool(node, x, reduce):
+    ksize = _attr(node, 'ksize')[1:3]
+    strides = _attr(node, 'strides')[1:3]
+    pads = _pad_amounts(node, x.shape[1:3], ksize, strides, (1, 1))
+    pad_value = -np.inf if reduce is np.max else 0.0
+    win = _windows(x, ksize[0], ksize[1], strides, (1, 1), pads, pad_value)
+    if reduce is np.max:
+        return win.max(axis=(4, 5))
+    # TF's AvgPool excludes padding from the divisor
+    ones = np.ones((1,) + x.shape[1:3] + (1,), x.dtype)
+    count = _windows(ones, ksize[0], ksize[1], strides, (1, 1), pads).sum(axis=(4, 5))
+    return win.sum(axis=(4, 5)) / count
+
+
+def _resize_nearest(node, x, size):
+    out_h, out_w = [int(v) for v in size]
+    in_h, in_w = x.shape[1:3]
+    align = _attr(node, 'align_corners', False)
+    half = _attr(node, 'half_pixel_centers', False)
+
+    def index(out_size, in_size):
+        i = np.arange(out_size, dtype=np.float64)
+        if align and out_size > 1:
+            src = np.round(i * (in_size - 1) / (out_size - 1))
+        elif half:
+            src = np.floor((i + 0.5) * in_size / out_size)
+        else:
+            src = np.floor(i * in_size / out_size)
+        return np.minimum(src.astype(np.int64), in_size - 1)
+
+    return x[:, index(out_h, in_h)][:, :, index(out_w, in_w)]
+
+
+def _strided_slice(node, x, begin, end, strides):
+    begin_mask = _attr(node, 'begin_mask', 0)
+    end_mask = _attr(node, 'end_mask', 0)
+    ellipsis_mask = _attr(node, 'ellipsis_mask', 0)
+    new_axis_mask = _attr(node, 'new_axis_mask', 0)
+    shrink_mask = _attr(node, 'shrink_axis_mask', 0)
+    index = []
+    for i, (b, e, s) in enumerate(zip(begin, end, strides)):
+        bit = 1 << i
+        if ellipsis_mask & bit:
+            index.append(Ellipsis)
+        elif new_axis_mask & bit:
+            index.append(None)
+        elif shrink_mask & bit:
+            index.append(int(b))
+        else:
+            index.append(slice(None if begin_mask & bit else int(b),
+                               None if end_mask & bit else int(e), int(s)))
+    return x[tuple(index)]
+
+
+def _split_sizes(sizes, total):
+    sizes = [int(s) for s in sizes]
+    if -1 in sizes:
+        sizes[sizes.index(-1)] = total - (sum(sizes) + 1)
+    return np.cumsum(sizes)[:-1]
+
+
+def _batch_norm(node, x, scale, offset, mean, var):
+    eps = _attr(node, 'epsilon', 1e-3)
+    inv = scale / np.sqrt(var + eps)
+    return x * inv + (offset - mean * inv)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _reduce(fn):
+    def kernel(node, x, axis):
+        keep = _attr(node, 'keep_dims', False)
+        return fn(x, axis=tuple(np.atleast_1d(axis).tolist()), keepdims=keep)
+    return kernel
+
+
+def _matmul(node, a, b):
+    if _attr(node, 'transpose_a', False):
+        a = a.T
+    if _attr(node, 'transpose_b', False):
+        b = b.T
+    return a @ b
+
+
+def _batch_matmul(node, a, b):
+    if _attr(node, 'adj_x', False):
+        a = np.swapaxes(a, -1, -2)
+    if _attr(node, 'adj_y', False):
+        b = np.swapaxes(b, -1, -2)
+    return a @ b
+
+
+# op -> kernel(node, *inputs) returning one array or a list of arrays
+KERNELS = {
+    'Identity':              lambda n, x: x,
+    'StopGradient':          lambda n, x: x,
+    'IdentityN':             lambda n, *xs: list(xs),
+    'Conv2D':                _conv2d,
+    'DepthwiseConv2dNative': _depthwise,
+    'BiasAdd':               lambda n, x, b: x + b,
+    'Add':                   lambda n, a, b: a + b,
+    'AddV2':                 lambda n, a, b: a + b,
+    'AddN':                  lambda n, *xs: sum(xs[1:], xs[0]),
+    'Sub':                   lambda n, a, b: a - b,
+    'Mul':                   lambda n, a, b: a * b,
+    'RealDiv':               lambda n, a, b: a / b,
+    'Maximum':               lambda n, a, b: np.maximum(a, b),
+    'Minimum':               lambda n, a, b: np.minimum(a, b),
+    'Neg':                   lambda n, x: -x,
+    'Exp':                   lambda n, x: np.exp(x),
+    'Sqrt':                  lambda n, x: np.sqrt(x),
+    'Rsqrt':                 lambda n, x: 1.0 / np.sqrt(x),
+    'Square':                lambda n, x: x * x,
+    'Pow':                   lambda n, a, b: np.power(a, b),
+    'Sigmoid':               lambda n, x: 1.0 / (1.0 + np.exp(-x)),
+    'Tanh':                  lambda n, x: np.tanh(x),
+    'Relu':                  lambda n, x: np.maximum(x, 0),
+    'Relu6':                 lambda n, x: np.clip(x, 0, 6),
+    'LeakyRelu':             lambda n, x: np.where(x > 0, x, x * _attr(n, 'alpha', 0.2)),
+    'Softmax':               lambda n, x: _softmax(x),
+    'MatMul':                _matmul,
+    'BatchMatMul':           _batch_matmul,
+    'BatchMatMulV2':         _batch_matmul,
+    'Reshape':               lambda n, x, s: x.reshape([int(v) for v in s]),
+    'Transpose':             lambda n, x, p: np.transpose(x, [int(v) for v in p]),
+    'ConcatV2':              lambda n, *xs: np.concatenate(xs[:-1], axis=int(xs[-1])),
+    'Split':                 lambda n, axis, x: np.split(x, _attr(n, 'num_split'), axis=int(axis)),
+    'SplitV':                lambda n, x, s, axis: np.split(
+                                 x, _split_sizes(s, x.shape[int(axis)]), axis=int(axis)),
+    'Pad':                   lambda n, x, p: np.pad(x, p.tolist()),
+    'PadV2':                 lambda n, x, p, v: np.pad(x, p.tolist(), constant_values=v),
+    'MaxPool':               lambda n, x: _pool(n, x, np.max),
+    'AvgPool':               lambda n, x: _pool(n, x, np.mean),
+    'ResizeNearestNeighbor': _resize_nearest,
+    'StridedSlice':          _strided_slice,
+    'Slice':                 lambda n, x, b, s: x[tuple(
+                                 slice(int(bi), None if int(si) == -1 else int(bi) + int(si))
+                                 for bi, si in zip(b, s))],
+    'Squeeze':               lambda n, x: np.squeeze(x, axis=tuple(_attr(n, 'squeeze_dims', [])) or None),
+    'ExpandDims':            lambda n, x, axis: np.expand_dims(x, int(axis)),
+    'Cast':                  lambda n, x: x.astype(tf.as_dtype(_attr(n, 'DstT')).as_numpy_dtype),
+    'Shape':                 lambda n, x: np.array(x.shape, np.int32),
+    'Pack':                  lambda n, *xs: np.stack(xs, axis=_attr(n, 'axis', 0)),
+    'Unpack':                lambda n, x: list(np.moveaxis(x, _attr(n, 'axis', 0), 0)),
+    'Tile':                  lambda n, x, m: np.tile(x, [int(v) for v in m]),
+    'Mean':                  _reduce(np.mean),
+    'Sum':                   _reduce(np.sum),
+    'Max':                   _reduce(np.max),
+    'FusedBatchNorm':        lambda n, x, *p: [_batch_norm(n, x, *p[:4])],
+    'FusedBatchNormV3':      lambda n, x, *p: [_batch_norm(n, x, *p[:4])],
+}
+
+
+def _sigmoid_out(node, out, x):
+    np.negative(x, out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+
+# Ops whose result is a view of their first input: no buffer of their own in an arena
+ALIAS_OPS = {'Identity', 'StopGradient', 'Reshape', 'Squeeze', 'ExpandDims'}
+
+# op -> kernel(node, out, *inputs) writing into a preallocated arena buffer.
+# Ops not listed here run through KERNELS and are copied into their buffer.
+OUT_KERNELS = {
+    'Conv2D':   lambda n, out, x, w: _conv2d(n, x, w, out=out),
+    'BiasAdd':  lambda n, out, x, b: np.add(x, b, out=out),
+    'Add':      lambda n, out, a, b: np.add(a, b, out=out),
+    'AddV2':    lambda n, out, a, b: np.add(a, b, out=out),
+    'Sub':      lambda n, out, a, b: np.subtract(a, b, out=out),
+    'Mul':      lambda n, out, a, b: np.multiply(a, b, out=out),
+    'RealDiv':  lambda n, out, a, b: np.divide(a, b, out=out),
+    'Maximum':  lambda n, out, a, b: np.maximum(a, b, out=out),
+    'Minimum':  lambda n, out, a, b: np.minimum(a, b, out=out),
+    'Relu':     lambda n, out, x: np.maximum(x, 0, out=out),
+    'Relu6':    lambda n, out, x: np.clip(x, 0, 6, out=out),
+    'Sigmoid':  _sigmoid_out,
+    'ConcatV2': lambda n, out, *xs: np.concatenate(xs[:-1], axis=int(xs[-1]), out=out),
+}
+
+
+class NumpyGraph:
+    """
+    Executes the part of a GraphDef needed for `outputs`.
+
+    Each intermediate is dropped as soon as its last consumer has run, so peak
+    memory is the live set rather than the whole graph. With an `arena_plan`
+    from memory_planner.py, intermediates instead live at fixed offsets in one
+    buffer allocated up front.
+    """
+
+    def __init__(self, graph_def, outputs, inputs=None, arena_plan=None):
+        self.outputs = list(outputs)
+        nodes = {n.name: n for n in graph_def.node}
+        self.order = self._topo_order(nodes, [_split_input(o)[0] for o in self.outputs])
+        self.inputs = inputs or [n.name for n in self.order if n.op == 'Placeholder']
+
+        missing = sorted({n.op for n in self.order
+                          if n.op not in KERNELS and n.op not in ('Const', 'Placeholder', 'NoOp')})
+        if missing:
+            raise NotImplementedError(f"No NumPy kernel for ops: {missing}")
+
+        self.consts = {n.name: [tf.make_ndarray(n.attr['value'].tensor)]
+                       for n in self.order if n.op == 'Const'}
+
+        # Number of consumers per node, to free values after their last use
+        self.uses = {}
+        for n in self.order:
+            for inp in n.input:
+                if not inp.startswith('^'):
+                    base = _split_input(inp)[0]
+                    self.uses[base] = self.uses.get(base, 0) + 1
+        for o in self.outputs:
+            base = _split_input(o)[0]
+            self.uses[base] = self.uses.get(base, 0) + 1
+
+        self.arena, self.views = None, {}
+        if arena_plan is not None:
+            self.arena = np.empty(arena_plan['size'], np.uint8)
+            for tensor, t in arena_plan['tensors'].items():
+                dtype = np.dtype(t['dtype'])
+                nbytes = int(np.prod(t['shape'], dtype=np.int64)) * dtype.itemsize
+                view = self.arena[t['offset']:t['offset'] + nbytes].view(dtype).reshape(t['shape'])
+                self.views[_split_input(tensor)] = view
+
+    @staticmethod
+    def _topo_order(nodes, roots):
+        order, done, visiting = [], set(), set()
+        stack = [(r, False) for r in roots]
+        while stack:
+            name, expanded = stack.pop()
+            if name in done:
+                continue
+            if expanded:
+                done.add(name)
+                order.append(nodes[name])
+                continue
+            if name in visiting:
+                continue
+            visiting.add(name)
+            stack.append((name, True))
+            for inp in reversed(nodes[name].input):
+                base = _split_input(inp.lstrip('^'))[0]
+                if base not in done:
+                    stack.append((base, False))
+        return order
+
+    def run_node(self, node, args, out=None):
+        """Outputs of one node; with `out`, an OUT_KERNELS op writes its result into it."""
+        if out is not None:
+            OUT_KERNELS[node.op](node, out, *args)
+            return [out]
+        result = KERNELS[node.op](node, *args)
+        return result if isinstance(result, list) else [result]
+
+    def run(self, feeds):
+        """feeds: {input name: ndarray}. Returns {output name: ndarray}."""
+        values, remaining = {}, dict(self.uses)
+        for node in self.order:
+            if node.op == 'NoOp':
+                continue
+            if node.op == 'Placeholder':
+                values[node.name] = [np.asarray(feeds[node.name])]
+                continue
+            if node.op == 'Const':
+                values[node.name] = self.consts[node.name]
+                continue
+
+            args = []
+            for inp in node.input:
+                if inp.startswith('^'):
+                    continue
+                base, idx = _split_input(inp)
+                args.append(values[base][idx])
+                remaining[base] -= 1
+                if remaining[base] == 0:
+                    del values[base]
+            if self.views and node.op not in ALIAS_OPS:
+                values[node.name] = self._run_in_arena(node, args)
+            else:
+                values[node.name] = self.run_node(node, args)
+
+        results = {}
+        for o in self.outputs:
+            base, idx = _split_input(o)
+            # Arena buffers are overwritten by the next run
+            results[o] = values[base][idx].copy() if self.arena is not None else values[base][idx]
+        return results
+
+    def _run_in_arena(self, node, args):
+        out = self.views.get((node.name, 0))
+        if out is not None and node.op in OUT_KERNELS:
+            return self.run_node(node, args, out)
+        result = self.run_node(node, args)
+        for i, r in enumerate(result):
+            view = self.views.get((node.name, i))
+            if view is None:
+                continue
+            if view.shape != np.shape(r):
+                raise ValueError(f"Arena plan has {node.name}:{i} as {view.shape}, got {np.shape(r)}")
+            np.copyto(view, r)
+            result[i] = view
+        return result
@@ -0,0 +1,345 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, shape_inference
+
+# Clean the ONNX graph before onnx2tf sees it. Every Identity, Shape->Gather->
+# Concat shape computation and back-to-back Transpose/Reshape left here turns
+# into several TF nodes (and NHWC<->NCHW transpose pairs) after conversion,
+# so removing them at this level keeps the TF graph small from the start.
+
+# --- CONFIG ---
+INPUT_ONNX  = "yolo12n_op12_static_1_640.onnx"
+OUTPUT_ONNX = "yolo12n_op12_static_1_640_opt.onnx"
+
+LAYOUT_OPS = {'Reshape', 'Transpose', 'Squeeze', 'Unsqueeze', 'Flatten'}
+# Never folded even with constant inputs
+NO_FOLD_OPS = {'RandomNormal', 'RandomUniform', 'RandomNormalLike', 'RandomUniformLike',
+               'Multinomial', 'If', 'Loop', 'Scan'}
+
+
+def op_histogram(model):
+    ops = {}
+    for n in model.graph.node:
+        ops[n.op_type] = ops.get(n.op_type, 0) + 1
+    return ops
+
+
+def _consumers(graph):
+    consumers = {}
+    for n in graph.node:
+        for inp in n.input:
+            consumers.setdefault(inp, []).append(n)
+    return consumers
+
+
+def _static_shapes(model):
+    """{tensor: [dims]} for tensors whose shape inference gave a fully static shape."""
+    shapes = {}
+    g = model.graph
+    for v in list(g.value_info) + list(g.input) + list(g.output):
+        dims = v.type.tensor_type.shape.dim
+        if v.type.tensor_type.HasField('shape') and all(d.HasField('dim_value') for d in dims):
+            shapes[v.name] = [d.dim_value for d in dims]
+    for init in g.initializer:
+        shapes[init.name] = list(init.dims)
+    return shapes
+
+
+def _set_nodes(graph, nodes):
+    """Replace graph.node with `nodes` (copied first: clearing the field detaches the originals)."""
+    copies = []
+    for n in nodes:
+        c = onnx.NodeProto()
+        c.CopyFrom(n)
+        copies.append(c)
+    del graph.node[:]
+    graph.node.extend(copies)
+
+
+def _toposort(graph):
+    producers = {o: n for n in graph.node for o in n.output}
+    order, done = [], set()
+    for root in graph.node:
+        stack = [(root, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if id(n) in done:
+                continue
+            if expanded:
+                done.add(id(n))
+                order.append(n)
+                continue
+            stack.append((n, True))
+            stack.extend((producers[i], False) for i in n.input
+                         if i in producers and id(producers[i]) not in done)
+    _set_nodes(graph, order)
+
+
+def _bypass(graph, node, src):
+    """Point every consumer of node's output at `src` and drop the node. False if it's a graph output."""
+    out = node.output[0]
+    if out in {o.name for o in graph.output}:
+        return False
+    for n in graph.node:
+        for i, inp in enumerate(n.input):
+            if inp == out:
+                n.input[i] = src
+    graph.node.remove(node)
+    return True
+
+
+# ----------------------------------------------------------------------------
+# Passes (each returns how many nodes it changed)
+# ----------------------------------------------------------------------------
+
+def remove_identities(model):
+    g = model.graph
+    removed = 0
+    for n in [n for n in g.node if n.op_type in ('Identity', 'Dropout') and len(n.output) == 1]:
+        removed += _bypass(g, n, n.input[0])
+    return removed
+
+
+def _evaluate(model, outputs):
+    """Values of constant-only tensors: onnx.reference if available, else onnxruntime."""
+    try:
+        from onnx.reference import ReferenceEvaluator
+        return dict(zip(outputs, ReferenceEvaluator(model).run(outputs, {})))
+    except ImportError:
+        import onnxruntime as ort
+        sess = ort.InferenceSession(model.SerializeToString(), providers=["CPUExecutionProvider"])
+        return dict(zip(outputs, sess.run(outputs, {})))
+
+
+def fold_constants(model):
+    """
+    Nodes whose inputs are all constant (initializers, Constant outputs, or
+    Shape of a statically shaped tensor) become initializers.
+    """
+    g = model.graph
+    shapes = _static_shapes(model)
+    const = {init.name for init in g.initializer}
+    folded, shape_values = [], {}
+    for n in g.node:
+        if n.op_type == 'Shape' and n.input[0] in shapes:
+            shape_values[n.output[0]] = np.array(shapes[n.input[0]], np.int64)
+            const.add(n.output[0])
+        elif n.op_type not in NO_FOLD_OPS and all(i in const or i == '' for i in n.input):
+            folded.append(n)
+            const.update(n.output)
+    if not folded and not shape_values:
+        return 0
+
+    folded_outputs = {o for n in folded for o in n.output}
+    folded_ids = {id(n) for n in folded}
+    live = {o.name for o in g.output}
+    for n in g.node:
+        if id(n) not in folded_ids:
+            live.update(n.input)
+    wanted = sorted(folded_outputs & live)
+
+    values = dict(shape_values)
+    if wanted:
+        sub = helper.make_graph(
+            folded, "fold", [],
+            [helper.make_tensor_value_info(o, onnx.TensorProto.UNDEFINED, None) for o in wanted],
+            initializer=list(g.initializer) + [numpy_helper.from_array(v, k) for k, v in shape_values.items()])
+        sub_model = helper.make_model(sub, opset_imports=model.opset_import, ir_version=model.ir_version)
+        values.update(_evaluate(sub_model, wanted))
+
+    drop = folded_ids | {id(n) for n in g.node if n.op_type == 'Shape' and n.output[0] in shape_values}
+    _set_nodes(g, [n for n in g.node if id(n) not in drop])
+    for name, value in values.items():
+        if name in live:
+            g.initializer.append(numpy_helper.from_array(np.asarray(value), name))
+    return len(drop)
+
+
+def collapse_layout(model):
+    """Transpose(Transpose) -> one Transpose, Reshape(Reshape) -> one Reshape, no-op layout ops removed."""
+    g = model.graph
+    shapes = _static_shapes(model)
+    inits = {i.name: i for i in g.initializer}
+    producers = {o: n for n in g.node for o in n.output}
+    consumers = _consumers(g)
+    changed = 0
+    for n in list(g.node):
+        inner = producers.get(n.input[0])
+        single = inner is not None and len(consumers.get(inner.output[0], [])) == 1
+        if n.op_type == 'Transpose':
+            perm = list(next((a.ints for a in n.attribute if a.name == 'perm'), []))
+            inner_perm = (next((list(a.ints) for a in inner.attribute if a.name == 'perm'), None)
+                          if single and inner.op_type == 'Transpose' else None)
+            if inner_perm and perm:
+                perm = [inner_perm[p] for p in perm]
+                n.input[0] = inner.input[0]
+                del n.attribute[:]
+                n.attribute.extend([helper.make_attribute('perm', perm)])
+                changed += 1
+            if perm and perm == list(range(len(perm))):
+                changed += _bypass(g, n, n.input[0])
+        elif n.op_type == 'Reshape':
+            target = inits.get(n.input[1])
+            # A 0 in the target shape copies that dim from the input, so the input must stay
+            copies_dims = target is None or 0 in numpy_helper.to_array(target)
+            if single and not copies_dims and inner.op_type in ('Reshape', 'Flatten', 'Squeeze', 'Unsqueeze'):
+                n.input[0] = inner.input[0]
+                changed += 1
+            if n.input[0] in shapes and shapes.get(n.output[0]) == shapes[n.input[0]]:
+                changed += _bypass(g, n, n.input[0])
+    return changed
+
+
+def canonicalize_attention(model):
+    """
+    Softmax(MatMul(q, k) * s) -> Softmax(MatMul(q * s, k)): the scale moves
+    from the (T, T) scores to the (T, d) query, so the pattern becomes the
+    plain MatMul -> Softmax -> MatMul block the TF passes recognise, and the
+    Mul touches T/d times fewer elements. Returns blocks rewritten.
+    """
+    g = model.graph
+    producers = {o: n for n in g.node for o in n.output}
+    consumers = _consumers(g)
+    inits = {i.name: i for i in g.initializer}
+    shapes = _static_shapes(model)
+    blocks = 0
+    for softmax in [n for n in g.node if n.op_type == 'Softmax']:
+        scale = producers.get(softmax.input[0])
+        if scale is None or scale.op_type not in ('Mul', 'Div'):
+            continue
+        scores_in = [i for i in scale.input if i not in inits]
+        const_in = [i for i in scale.input if i in inits]
+        if len(scores_in) != 1 or len(const_in) != 1 or scale.input[1] != const_in[0]:
+            continue
+        value = numpy_helper.to_array(inits[const_in[0]])
+        if value.size != 1:
+            continue
+        if len(consumers.get(scale.output[0], [])) != 1:
+            continue
+        matmul = producers.get(scores_in[0])
+        if matmul is None or matmul.op_type != 'MatMul' or len(consumers[matmul.output[0]]) != 1:
+            continue
+        q = matmul.input[0]
+        q_shape, s_shape = shapes.get(q), shapes.get(matmul.output[0])
+        if q_shape is None or s_shape is None or np.prod(q_shape) >= np.prod(s_shape):
+            continue
+        # Mul/Div now scales q; the MatMul feeds the Softmax directly
+        scale.input[0] = q
+        scaled_q = scale.output[0] + "_q"
+        scale.output[0] = scaled_q
+        matmul.input[0] = scaled_q
+        softmax.input[0] = matmul.output[0]
+        for n in (scale, matmul, softmax):
+            n.doc_string = f"attention_block_{blocks}"
+        blocks += 1
+    if blocks:
+        _toposort(g)   # the scale node now has to run before its MatMul
+    return blocks
+
+
+def prune(model):
+    """Drop nodes and initializers nothing (transitively) feeding an output uses."""
+    g = model.graph
+    needed = {o.name for o in g.output}
+    kept = []
+    for n in reversed(list(g.node)):
+        if any(o in needed for o in n.output):
+            kept.append(n)
+            needed.update(n.input)
+    removed = len(g.node) - len(kept)
+    _set_nodes(g, reversed(kept))
+    inits = [i for i in g.initializer if i.name in needed]
+    del g.initializer[:]
+    g.initializer.extend(inits)
+    return removed
+
+
+def optimize(model, max_rounds=10):
+    """All passes to a fixpoint. Returns (model, {pass: nodes changed})."""
+    log = {'identity': 0, 'fold': 0, 'layout': 0, 'attention': 0, 'prune': 0}
+    for _ in range(max_rounds):
+        model = shape_inference.infer_shapes(model)
+        counts = {
+            'identity': remove_identities(model),
+            'fold': fold_constants(model),
+            'layout': collapse_layout(model),
+            'prune': prune(model),
+        }
+        for k, v in counts.items():
+            log[k] += v
+        if not any(counts.values()):
+            break
+    model = shape_inference.infer_shapes(model)
+    log['attention'] = canonicalize_attention(model)
+    onnx.checker.check_model(model)
+    return model, log
+
+
+# ----------------------------------------------------------------------------
+# Conversion comparison
+# ----------------------------------------------------------------------------
+
+def convert_timed(onnx_path, output_dir):
+    """onnx2tf conversion as coco_calib.py runs it. Returns (seconds, TF op count)."""
+    from onnx2tf import convert
+    from artifact_manifest import describe
+
+    start = time.perf_counter()
+    convert(input_onnx_file_path=onnx_path, output_folder_path=output_dir,
+            output_signature_defs=True, disable_group_convolution=True)
+    seconds = time.perf_counter() - start
+    return seconds, describe(output_dir, 'saved_model')['nodes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simplify the ONNX model before onnx2tf")
+    parser.add_argument("input", nargs='?', default=INPUT_ONNX)
+    parser.add_argument("output", nargs='?', default=OUTPUT_ONNX)
+    parser.add_argument("--compare", action="store_true",
+                        help="convert both models with onnx2tf and report time / TF node counts")
+    args = parser.parse_args()
+
+    print(f"Loading {args.input}...")
+    model = onnx.load(args.input)
+    before = op_histogram(model)
+
+    start = time.perf_counter()
+    optimized, log = optimize(model)
+    elapsed = time.perf_counter() - start
+    after = op_histogram(optimized)
+    onnx.save(optimized, args.output)
+
+    print("\n" + "=" * 70)
+    print(f"ONNX: {sum(before.values())} -> {sum(after.values())} nodes in {elapsed:.1f}s")
+    print("=" * 70)
+    for key, count in log.items():
+        print(f"  {key}: {count}")
+    for op in sorted(set(before) | set(after), key=lambda o: -before.get(o, 0)):
+        if before.get(op, 0) != after.get(op, 0):
+            print(f"  {op}: {before.get(op, 0)} -> {after.get(op, 0)}")
+    print(f"\nSaved to {args.output}")
+
+    if not args.compare:
+        return
+    print("\n" + "=" * 70)
+    print("onnx2tf CONVERSION")
+    print("=" * 70)
+    tmp = tempfile.mkdtemp()
+    try:
+        t0, n0 = convert_timed(args.input, os.path.join(tmp, "orig"))
+        t1, n1 = convert_timed(args.output, os.path.join(tmp, "opt"))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"  original:  {t0:6.1f}s, {n0} TF ops")
+    print(f"  optimized: {t1:6.1f}s, {n1} TF ops")
+    print(f"  delta:     {t1 - t0:+6.1f}s, {n1 - n0:+d} TF ops")
+
+
+if __name__ == "__main__":
+    main()
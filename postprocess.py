@@ -0,0 +1,92 @@
+import numpy as np
+
+from preprocess import unletterbox_boxes
+
+# --- CONFIG ---
+CONF_THRES = 0.25
+IOU_THRES  = 0.45
+MAX_DET    = 300
+
+# Detections everywhere are (K, 6) float32 arrays: x1, y1, x2, y2, score, class
+
+
+def xywh_to_xyxy(boxes):
+    out = np.empty_like(boxes)
+    half_w, half_h = boxes[:, 2] / 2, boxes[:, 3] / 2
+    out[:, 0] = boxes[:, 0] - half_w
+    out[:, 1] = boxes[:, 1] - half_h
+    out[:, 2] = boxes[:, 0] + half_w
+    out[:, 3] = boxes[:, 1] + half_h
+    return out
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes -> (N, M)."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def nms(boxes, scores, iou_thres=IOU_THRES, max_det=MAX_DET):
+    """Greedy NMS; each step suppresses against all remaining boxes at once. Returns kept indices."""
+    order = np.argsort(-scores)
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        iou = box_iou(boxes[i:i + 1], boxes[order[1:]])[0]
+        order = order[1:][iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, classes, iou_thres=IOU_THRES, max_det=MAX_DET):
+    """Per-class NMS in one pass: boxes of different classes are shifted apart so they never overlap."""
+    if len(boxes) == 0:
+        return np.zeros(0, np.int64)
+    shift = classes[:, None] * (boxes.max() + 1)
+    return nms(boxes + shift, scores, iou_thres, max_det)
+
+
+def decode_yolo(pred, conf_thres=CONF_THRES, iou_thres=IOU_THRES, max_det=MAX_DET):
+    """
+    Raw YOLOv8/11/12 head output for one image, (4 + nc, anchors) or
+    (anchors, 4 + nc), boxes as cx, cy, w, h in input pixels -> detections.
+    """
+    pred = np.asarray(pred, np.float32)
+    if pred.ndim == 3:
+        pred = pred[0]
+    if pred.shape[0] < pred.shape[1]:
+        pred = pred.T
+    cls_scores = pred[:, 4:]
+    classes = cls_scores.argmax(axis=1)
+    scores = cls_scores[np.arange(len(pred)), classes]
+    mask = scores > conf_thres
+    if not mask.any():
+        return np.zeros((0, 6), np.float32)
+    boxes = xywh_to_xyxy(pred[mask, :4])
+    scores, classes = scores[mask], classes[mask]
+    keep = batched_nms(boxes, scores, classes, iou_thres, max_det)
+    return np.concatenate([boxes[keep], scores[keep, None], classes[keep, None].astype(np.float32)],
+                          axis=1)
+
+
+def scale_detections(dets, info):
+    """Detections from network input coords to source-frame coords (Letterbox info)."""
+    unletterbox_boxes(dets[:, :4], info)
+    return dets
+
+
+def match_rate(ref, dets, iou_thres=0.5):
+    """Fraction of `ref` detections that have a same-class box in `dets` with IoU >= iou_thres."""
+    if len(ref) == 0:
+        return 1.0
+    if len(dets) == 0:
+        return 0.0
+    iou = box_iou(ref[:, :4], dets[:, :4])
+    iou[ref[:, 5][:, None] != dets[:, 5][None, :]] = 0.0
+    return float((iou.max(axis=1) >= iou_thres).mean())
@@ -0,0 +1,152 @@
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# --- CONFIG ---
+INPUT_HEIGHT   = 640
+INPUT_WIDTH    = 640
+PAD_VALUE      = 114            # Ultralytics letterbox grey
+IMAGE_EXTS     = ('.jpg', '.jpeg', '.png')
+QUANT_TEMP_DIR = "quant_output/temp"
+
+# How a source frame was mapped into the network input.
+# Network coords -> source coords: x_src = (x_net - pad_x) / scale_x
+Letterbox = namedtuple("Letterbox", ["scale_x", "scale_y", "pad_x", "pad_y", "src_w", "src_h"])
+
+
+def list_images(img_dir, limit=None):
+    """Sorted image files in img_dir (sorted so every tool sees the same order)."""
+    files = sorted(f for f in os.listdir(img_dir) if f.lower().endswith(IMAGE_EXTS))
+    if limit is not None:
+        files = files[:limit]
+    return [os.path.join(img_dir, f) for f in files]
+
+
+def read_fix_pos(node_name="images", temp_dir=QUANT_TEMP_DIR):
+    """
+    Read the fix position vai_q_tensorflow chose for an activation.
+    The quantizer leaves one '<node>/aquant <bit_width> <pos>' file per node in temp/.
+    """
+    path = os.path.join(temp_dir, node_name.replace('/', '_') + "_aquant")
+    with open(path) as f:
+        _, bit_width, pos = f.read().split()
+    return int(pos)
+
+
+def letterbox_params(src_w, src_h, dst_w=INPUT_WIDTH, dst_h=INPUT_HEIGHT, letterbox=True):
+    """Scale and padding that fit a src_w x src_h frame into the network input."""
+    if letterbox:
+        scale = min(dst_w / src_w, dst_h / src_h)
+        new_w, new_h = round(src_w * scale), round(src_h * scale)
+        return Letterbox(new_w / src_w, new_h / src_h,
+                         (dst_w - new_w) // 2, (dst_h - new_h) // 2, src_w, src_h)
+    return Letterbox(dst_w / src_w, dst_h / src_h, 0, 0, src_w, src_h)
+
+
+def unletterbox_boxes(boxes, info):
+    """Map [..., 4] xyxy boxes from network coords back to source-frame coords (in place)."""
+    boxes[..., 0::2] -= info.pad_x
+    boxes[..., 1::2] -= info.pad_y
+    boxes[..., 0::2] /= info.scale_x
+    boxes[..., 1::2] /= info.scale_y
+    np.clip(boxes[..., 0::2], 0, info.src_w, out=boxes[..., 0::2])
+    np.clip(boxes[..., 1::2], 0, info.src_h, out=boxes[..., 1::2])
+    return boxes
+
+
+class Preprocessor:
+    """
+    Shared image -> network-input path for calibration, evaluation and runtime.
+
+    Writes straight into a preallocated NHWC batch:
+      1. one cv2.warpAffine does resize + letterbox padding into a uint8 canvas
+      2. an in-place cvtColor does BGR->RGB on the canvas
+      3. one cv2.LUT through a 256-entry table does /255 and (for int8) the
+         quantizer's fix-position scaling, into the batch slot
+    No per-frame arrays are allocated after construction. An int8 input
+    without an explicit fix_pos reads it from vai_q's temp/images_aquant.
+    """
+
+    def __init__(self, batch_size=1, height=INPUT_HEIGHT, width=INPUT_WIDTH,
+                 dtype=np.float32, fix_pos=None, letterbox=True, pad_value=PAD_VALUE,
+                 bgr_to_rgb=True):
+        self.height = height
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.letterbox = letterbox
+        self.pad_value = pad_value
+        self.bgr_to_rgb = bgr_to_rgb
+
+        self.batch = np.empty((batch_size, height, width, 3), self.dtype)
+        self.info = [None] * batch_size
+        self._canvas = np.empty((height, width, 3), np.uint8)
+        self._matrix = np.zeros((2, 3), np.float32)
+        self._lut = self._build_lut(fix_pos)
+
+    def _build_lut(self, fix_pos):
+        values = np.arange(256, dtype=np.float32) / 255.0
+        if self.dtype == np.int8:
+            if fix_pos is None:
+                try:
+                    fix_pos = read_fix_pos()
+                except OSError as e:
+                    raise ValueError("int8 input needs the quantizer's input fix position") from e
+            values = np.clip(np.floor(values * (2 ** fix_pos) + 0.5), -128, 127)
+        elif self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported input dtype: {self.dtype}")
+        return values.astype(self.dtype)
+
+    def load(self, img, slot=0):
+        """Preprocess one BGR uint8 frame into batch[slot]. Returns its Letterbox info."""
+        src_h, src_w = img.shape[:2]
+        info = letterbox_params(src_w, src_h, self.width, self.height, self.letterbox)
+
+        # Half-pixel-centre mapping so the stretch case matches cv2.resize.
+        m = self._matrix
+        m[0, 0] = info.scale_x
+        m[1, 1] = info.scale_y
+        m[0, 2] = 0.5 * info.scale_x - 0.5 + info.pad_x
+        m[1, 2] = 0.5 * info.scale_y - 0.5 + info.pad_y
+        cv2.warpAffine(img, m, (self.width, self.height), dst=self._canvas,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT,
+                       borderValue=(self.pad_value,) * 3)
+
+        if self.bgr_to_rgb:
+            cv2.cvtColor(self._canvas, cv2.COLOR_BGR2RGB, dst=self._canvas)
+        # cv2.LUT indexes with the uint8 pixels directly (np.take would widen them to intp first)
+        cv2.LUT(self._canvas, self._lut, dst=self.batch[slot])
+
+        self.info[slot] = info
+        return info
+
+    def load_file(self, path, slot=0):
+        img = cv2.imread(path)
+        if img is None:
+            raise IOError(f"Could not read image: {path}")
+        return self.load(img, slot)
+
+    def load_files(self, paths):
+        """Fill the first len(paths) slots and return that view of the batch."""
+        if len(paths) > len(self.batch):
+            raise ValueError(f"{len(paths)} images for a batch of {len(self.batch)}")
+        for slot, path in enumerate(paths):
+            self.load_file(path, slot)
+        return self.batch[:len(paths)]
+
+
+if __name__ == "__main__":
+    import time
+
+    paths = list_images("calib_dataset")
+    pre = Preprocessor()
+    start = time.perf_counter()
+    for p in paths:
+        pre.load_file(p)
+    elapsed = time.perf_counter() - start
+    print(f"Preprocessed {len(paths)} images in {elapsed * 1000:.1f} ms "
+          f"({elapsed * 1000 / max(len(paths), 1):.2f} ms/image)")
+    print(f"Batch: {pre.batch.shape} {pre.batch.dtype}, "
+          f"range [{pre.batch.min():.3f}, {pre.batch.max():.3f}]")
+    print(f"Last letterbox: {pre.info[0]}")
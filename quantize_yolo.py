@@ -1,6 +1,8 @@
 import os
-import tensorflow as tf
-from tensorflow_model_optimization.quantization.keras import vitis_quantize
+
+from artifact_manifest import check_manifest
+from preprocess import Preprocessor, list_images
+from warm_start import run_job
 
 # --- CONFIG ---
 # Points to the FIXED model
@@ -11,24 +13,19 @@ INPUT_SHAPE     = (640, 640)
 
 def load_data():
     # Load 30 images for calibration
-    files = [f for f in os.listdir(CALIB_DIR) if f.endswith(('.jpg','.png'))][:30]
+    files = list_images(CALIB_DIR, limit=30)
     print(f"Calibrating with {len(files)} images...")
     
-    for f in files:
-        path = os.path.join(CALIB_DIR, f)
-        img = tf.io.read_file(path)
-        img = tf.image.decode_image(img, channels=3, expand_animations=False)
-        img = tf.image.resize(img, INPUT_SHAPE)
-        img = tf.cast(img, tf.float32) / 255.0
-        img = tf.expand_dims(img, 0)
-        yield [img]
+    # Same preprocessing as input_fn.py and test_inference.py
+    pre = Preprocessor(batch_size=1, height=INPUT_SHAPE[0], width=INPUT_SHAPE[1])
+    for path in files:
+        pre.load_file(path)
+        # The quantizer may prefetch, so hand it its own copy of the buffer
+        yield [pre.batch.copy()]
+
+def quantize(model, output_path):
+    from tensorflow_model_optimization.quantization.keras import vitis_quantize
 
-def main():
-    # 1. Load
-    print("Loading fixed model...")
-    model = tf.keras.models.load_model(INPUT_MODEL_DIR)
-    
-    # 2. Quantize
     print("Starting Vitis Quantizer...")
     quantizer = vitis_quantize.VitisQuantizer(model)
     quantized_model = quantizer.quantize_model(
@@ -37,9 +34,16 @@ def main():
         calib_steps=30
     )
     
-    # 3. Save
-    print(f"Saving to {OUTPUT_DIR}...")
-    quantized_model.save(os.path.join(OUTPUT_DIR, "quantized.h5"))
+    print(f"Saving to {output_path}...")
+    quantized_model.save(output_path)
+
+def main():
+    # Load + quantize; the warm worker keeps the loaded Keras model between runs
+    # Fail now, not 30 calibration steps in, if the model doesn't fit this setup
+    check_manifest(INPUT_MODEL_DIR, inputs=["images"])
+    print(f"Quantizing {INPUT_MODEL_DIR}...")
+    run_job('quantize', model_dir=INPUT_MODEL_DIR,
+            output_path=os.path.join(OUTPUT_DIR, "quantized.h5"))
     print("Quantization Complete.")
 
 if __name__ == "__main__":
@@ -1,112 +1,303 @@
+import numpy as np
 import tensorflow as tf
 
+from graph_stats import infer_shapes, op_histogram
+from rewrite_utils import (base_name, compare_graphs, const_value, consumers_map,
+                           list_attr, make_const, make_node, node_map, print_comparison,
+                           prune, sample_feeds, save_graph_def, type_attr, unique_name)
+
 INPUT_GRAPH = "frozen_yolo_stripped.pb"
 OUTPUT_GRAPH = "frozen_yolo_no_split.pb"
 
-# Ops that crash Vitis AI 2.5
-CRASH_OPS = {
-    'BatchMatMulV2', 'BatchMatMul', 'Softmax',  # Attention ops
-    'Split', 'SplitV',  # Split ops - CRASH!
-    'ConcatV2',  # Concat ops - CRASH!
-}
+OUTPUT_NODES = [
+    "PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_871/convolution",
+    "PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_872/convolution",
+    "PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_873/convolution",
+    "PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_874/convolution",
+    "PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_875/convolution",
+]
+
+# Ops that crash the Vitis AI 2.5 quantizer and get lowered here.
+# They used to be swapped for Identity, which silently changed the network's
+# output. Now channel Split/Concat feeding convolutions are folded into the
+# conv weights, which computes exactly the same thing (zero weights
+# contribute exact zeros). A Concat with a non-conv consumer stays a Concat:
+# routing it through 1x1 convs would turn a free op into real MACs.
+CRASH_OPS = {'Split', 'SplitV', 'ConcatV2'}
+
+# Worst-case difference allowed vs the original graph (float summation order
+# changes when conv weights are split/merged)
+ATOL = 1e-3
+RTOL = 1e-3
+CHECK_FEEDS = 2
+
+
+def _same_attr(a, b, key):
+    # 'in' first: indexing a proto map with a missing key inserts it
+    if (key in a.attr) != (key in b.attr):
+        return False
+    return key not in a.attr or a.attr[key] == b.attr[key]
+
+
+class _Lowering:
+    """In-place rewriter over a copy of the GraphDef."""
+
+    def __init__(self, graph_def):
+        self.graph = tf.compat.v1.GraphDef()
+        self.graph.CopyFrom(graph_def)
+        self.nodes = node_map(self.graph)
+        self.shapes = infer_shapes(self.graph)
+        self.counts = {'concat_into_conv': 0, 'concat_kept': 0,
+                       'split_into_conv': 0, 'split_to_select': 0, 'merged_convs': 0}
+
+    def add(self, node):
+        node.name = unique_name(self.nodes, node.name)
+        new = self.graph.node.add()
+        new.CopyFrom(node)
+        self.nodes[new.name] = new
+        return new.name
+
+    def shape(self, inp):
+        base, _, idx = inp.partition(':')
+        outs = self.shapes.get(base) or []
+        shape = outs[int(idx) if idx else 0] if outs else None
+        return shape if shape is not None and None not in shape else None
+
+    def channel_axis(self, axis_inp, rank):
+        axis = const_value(self.nodes, axis_inp)
+        if axis is None:
+            return False
+        return int(axis) in (rank - 1, -1)
+
+    def conv_like(self, template, name, x, filt):
+        """Conv2D with template's stride/padding/dilation on x with a new filter."""
+        f = self.add(make_const(name + "/filter", filt.astype(np.float32)))
+        node = make_node('Conv2D', name, [x, f])
+        for key in ('T', 'strides', 'padding', 'dilations', 'data_format', 'explicit_paddings'):
+            if key in template.attr:
+                node.attr[key].CopyFrom(template.attr[key])
+        return node
+
+    def pointwise(self, name, x, matrix):
+        """1x1 stride-1 Conv2D with a 0/1 channel-routing matrix."""
+        f = self.add(make_const(name + "/filter", matrix.reshape((1, 1) + matrix.shape)))
+        return make_node('Conv2D', name, [x, f], T=type_attr(tf.float32),
+                         strides=list_attr([1, 1, 1, 1]), dilations=list_attr([1, 1, 1, 1]),
+                         padding=tf.compat.v1.AttrValue(s=b'VALID'),
+                         data_format=tf.compat.v1.AttrValue(s=b'NHWC'))
+
+    def sum_into(self, target, terms):
+        """Turn node `target` (kept by name) into terms[0] + terms[1] + ..."""
+        acc = terms[0]
+        for i, term in enumerate(terms[1:-1]):
+            acc = self.add(make_node('AddV2', f"{target.name}/sum_{i}", [acc, term],
+                                     T=type_attr(tf.float32)))
+        target.op = 'AddV2'
+        target.ClearField('attr')
+        target.attr['T'].CopyFrom(type_attr(tf.float32))
+        del target.input[:]
+        target.input.extend([acc, terms[-1]])
+
+    def conv_filter(self, conv):
+        if conv.op != 'Conv2D':
+            return None
+        if 'data_format' in conv.attr and conv.attr['data_format'].s not in (b'', b'NHWC'):
+            return None
+        return const_value(self.nodes, conv.input[1])
+
+    # --- Concat ---
+
+    def lower_concats(self):
+        consumers = consumers_map(self.graph)
+        for n in list(self.graph.node):
+            if n.op != 'ConcatV2':
+                continue
+            k = n.attr['N'].i
+            operands = list(n.input[:k])
+            shapes = [self.shape(o) for o in operands]
+            if any(s is None for s in shapes) or not self.channel_axis(n.input[k], len(shapes[0])):
+                continue
+            sizes = [s[-1] for s in shapes]
+            offsets = np.cumsum([0] + sizes)
+
+            users = consumers[n.name]
+            if not users or any(i != 0 or self.conv_filter(u) is None for u, i in users):
+                # Something other than a conv's data input reads it: keep the (free) concat
+                self.counts['concat_kept'] += 1
+                continue
+            # conv(concat(a, b), W) == conv(a, W[..., :Ca, :]) + conv(b, W[..., Ca:, :]), per conv
+            for conv, _ in users:
+                w = self.conv_filter(conv)
+                template = tf.compat.v1.NodeDef()
+                template.CopyFrom(conv)
+                parts = []
+                for i, (op, lo, hi) in enumerate(zip(operands, offsets[:-1], offsets[1:])):
+                    parts.append(self.add(self.conv_like(template, f"{conv.name}/part_{i}", op,
+                                                         w[:, :, lo:hi, :])))
+                self.sum_into(conv, parts)
+                self.counts['concat_into_conv'] += 1
+        self.shapes = infer_shapes(self.graph)
+
+    # --- Split ---
+
+    def lower_splits(self):
+        consumers = consumers_map(self.graph)
+        for n in list(self.graph.node):
+            if n.op == 'Split':
+                axis_inp, x = n.input[0], n.input[1]
+            elif n.op == 'SplitV':
+                x, axis_inp = n.input[0], n.input[2]
+            else:
+                continue
+            x_shape = self.shape(x)
+            if x_shape is None or not self.channel_axis(axis_inp, len(x_shape)):
+                continue
+            total = x_shape[-1]
+            if n.op == 'Split':
+                sizes = [total // n.attr['num_split'].i] * n.attr['num_split'].i
+            else:
+                sizes = [int(s) for s in const_value(self.nodes, n.input[1])]
+                if -1 in sizes:
+                    sizes[sizes.index(-1)] = total - (sum(sizes) + 1)
+            offsets = np.cumsum([0] + sizes)
+
+            selects = {}
+            for user, idx in consumers[n.name]:
+                _, _, j = user.input[idx].partition(':')
+                j = int(j) if j else 0
+                lo, hi = int(offsets[j]), int(offsets[j + 1])
+                w = self.conv_filter(user) if idx == 0 else None
+                if w is not None:
+                    # conv(x[..., lo:hi], W) == conv(x, W zero-padded to all channels)
+                    padded = np.zeros(w.shape[:2] + (total, w.shape[3]), np.float32)
+                    padded[:, :, lo:hi, :] = w
+                    f = self.add(make_const(user.name + "/padded_filter", padded))
+                    user.input[0], user.input[1] = x, f
+                    self.counts['split_into_conv'] += 1
+                    continue
+                if j not in selects:
+                    route = np.zeros((total, hi - lo), np.float32)
+                    route[np.arange(lo, hi), np.arange(hi - lo)] = 1.0
+                    selects[j] = self.add(self.pointwise(f"{n.name}/select_{j}", x, route))
+                    self.counts['split_to_select'] += 1
+                user.input[idx] = selects[j]
+        self.shapes = infer_shapes(self.graph)
+
+    # --- Cleanup ---
+
+    def merge_parallel_convs(self):
+        """conv(x, W1) + conv(x, W2) -> conv(x, W1 + W2) when both convs feed only the add."""
+        merged = True
+        while merged:
+            merged = False
+            consumers = consumers_map(self.graph)
+            for n in list(self.graph.node):
+                if n.op not in ('Add', 'AddV2') or n.name not in self.nodes:
+                    continue
+                a, b = (self.nodes.get(base_name(i)) for i in n.input)
+                if a is None or b is None or a is b:
+                    continue
+                wa, wb = self.conv_filter(a), self.conv_filter(b)
+                if wa is None or wb is None or wa.shape != wb.shape or a.input[0] != b.input[0]:
+                    continue
+                if any(not _same_attr(a, b, k) for k in ('strides', 'padding', 'dilations',
+                                                         'explicit_paddings', 'data_format')):
+                    continue
+                if len(consumers[a.name]) != 1 or len(consumers[b.name]) != 1:
+                    continue
+                template = tf.compat.v1.NodeDef()
+                template.CopyFrom(a)
+                conv = self.conv_like(template, n.name, a.input[0], wa + wb)
+                n.CopyFrom(conv)
+                self.counts['merged_convs'] += 1
+                merged = True
+
+    def run(self, outputs):
+        self.lower_concats()
+        self.lower_splits()
+        self.merge_parallel_convs()
+        return prune(self.graph, outputs)
+
+
+def lower_split_concat(graph_def, outputs):
+    """Channel Split/Concat -> convolutions. Returns (graph_def, counts per rewrite)."""
+    lowering = _Lowering(graph_def)
+    return lowering.run(outputs), lowering.counts
+
 
 def remove_crash_ops():
     print(f"Loading {INPUT_GRAPH}...")
     graph_def = tf.compat.v1.GraphDef()
     with tf.io.gfile.GFile(INPUT_GRAPH, "rb") as f:
         graph_def.ParseFromString(f.read())
-    
+
     print(f"Original: {len(graph_def.node)} nodes")
-    
+
     # Count crash ops
     crash_counts = {}
     for n in graph_def.node:
         if n.op in CRASH_OPS:
             crash_counts[n.op] = crash_counts.get(n.op, 0) + 1
-    
+
     print(f"\nCrash-inducing ops found:")
     for op, count in crash_counts.items():
         print(f"  {op}: {count}")
-    
-    # Build node map
-    node_map = {n.name: n for n in graph_def.node}
-    
-    # Replace crash ops with Identity
-    new_graph_def = tf.compat.v1.GraphDef()
-    converted = 0
-    
-    for node in graph_def.node:
-        new_node = new_graph_def.node.add()
-        
-        if node.op in CRASH_OPS:
-            new_node.name = node.name
-            new_node.op = "Identity"
-            
-            # For Split/SplitV/ConcatV2, take the first data input (skip axis input)
-            if node.op in ['Split', 'SplitV']:
-                # Split: input 0 is axis (scalar), input 1 is data
-                # SplitV: input 0 is data, input 1 is size_splits, input 2 is axis
-                if node.op == 'Split' and len(node.input) >= 2:
-                    new_node.input.append(node.input[1])  # data input
-                elif node.op == 'SplitV' and len(node.input) >= 1:
-                    new_node.input.append(node.input[0])  # data input
-                else:
-                    new_node.input.append(node.input[0])
-            elif node.op == 'ConcatV2':
-                # ConcatV2: last input is axis, others are tensors to concat
-                # Just pass through first tensor
-                if node.input:
-                    new_node.input.append(node.input[0])
-            else:
-                # BatchMatMulV2, Softmax, etc.
-                if node.input:
-                    new_node.input.append(node.input[0])
-            
-            new_node.attr['T'].type = tf.float32.as_datatype_enum
-            converted += 1
-        else:
-            new_node.CopyFrom(node)
-    
-    print(f"\nConverted {converted} ops to Identity")
-    
+
+    print("\n" + "=" * 70)
+    print("Lowering Split/Concat into convolutions...")
+    print("=" * 70)
+    new_graph_def, counts = lower_split_concat(graph_def, OUTPUT_NODES)
+    for key, count in counts.items():
+        print(f"  {key}: {count}")
+
     # Verify
     remaining = {}
     for n in new_graph_def.node:
         if n.op in CRASH_OPS:
             remaining[n.op] = remaining.get(n.op, 0) + 1
-    
+
     if remaining:
-        print(f"WARNING: Still have crash ops: {remaining}")
+        print(f"WARNING: Still have crash ops (non-channel axis, dynamic shape, or a Concat "
+              f"not feeding convs - kept on purpose): {remaining}")
     else:
         print("✓ All crash ops removed!")
-    
+
+    print("\n" + "=" * 70)
+    print("Checking outputs against the original graph...")
+    print("=" * 70)
+    feeds = sample_feeds(graph_def, CHECK_FEEDS)
+    fetches = [o + ":0" for o in OUTPUT_NODES]
+    results = compare_graphs(graph_def, new_graph_def, fetches, feeds, atol=ATOL, rtol=RTOL)
+    if not print_comparison(results):
+        print("\nERROR: Lowered graph is not equivalent - not saving.")
+        return
+
     # Count new ops
-    ops = {}
-    for n in new_graph_def.node:
-        ops[n.op] = ops.get(n.op, 0) + 1
-    
-    print(f"\nNew graph ops:")
+    ops = op_histogram(new_graph_def)
+    print(f"\nNew graph ops ({len(new_graph_def.node)} nodes):")
     for op, count in sorted(ops.items(), key=lambda x: -x[1])[:10]:
         print(f"  {op}: {count}")
-    
+
     # Save
-    with tf.io.gfile.GFile(OUTPUT_GRAPH, "wb") as f:
-        f.write(new_graph_def.SerializeToString())
-    
+    save_graph_def(new_graph_def, OUTPUT_GRAPH)
+
     print(f"\nSaved to {OUTPUT_GRAPH}")
     print("\n" + "=" * 70)
     print("NEXT: Try quantization")
     print("=" * 70)
+    print("Attention MatMul/Softmax are left in place - skip them (generate_skip_list)")
+    print("or move them to the CPU (split_runtime.py) instead of deleting them.")
     print(f'''
 vai_q_tensorflow quantize \\
   --input_frozen_graph {OUTPUT_GRAPH} \\
   --input_nodes images \\
   --input_shapes 1,640,640,3 \\
-  --output_nodes PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_871/convolution,PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_872/convolution,PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_873/convolution,PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_874/convolution,PartitionedCall/PartitionedCall/model_41/tf.nn.convolution_875/convolution \\
+  --output_nodes {",".join(OUTPUT_NODES)} \\
   --input_fn input_fn.calib_input \\
   --output_dir quant_output \\
-  --calib_iter 5
+  --calib_iter 5 \\
+  --skip_nodes "$(cat skip_nodes.txt)"
 ''')
 
 if __name__ == "__main__":
-    remove_crash_ops()
\ No newline at end of file
+    remove_crash_ops()
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from graph_stats import infer_shapes
+from rewrite_utils import (base_name, compare_graphs, const_value, graph_endpoints, list_attr,
+                           make_const, make_node, node_map, print_comparison, prune, replace_nodes,
+                           sample_feeds, save_graph_def, type_attr)
+from split_runtime import CPU_OPS, count_partitions
+
+# 2x nearest-neighbour upsampling as ops the DPU runs natively:
+#   transposed_conv - Conv2DBackpropInput, 2x2 kernel, stride 2, per-channel
+#                     identity weights: each output pixel gets exactly one input
+#   depth_to_space  - concat 4 copies on channels, DepthToSpace(2)
+# Both copy values without arithmetic that could round, so the result must
+# match the original op bit for bit; the pass refuses to save otherwise.
+
+# --- CONFIG ---
+INPUT_GRAPH  = "frozen_yolo_no_split.pb"
+OUTPUT_GRAPH = "frozen_yolo_no_resize.pb"
+ARCH_JSON    = "arch.json"
+CHECK_FEEDS  = 2
+
+# What each known DPU configuration runs for upsampling. DPUCZDX8G supports
+# nearest upsampling, so it is assumed native; lowerings are listed as the
+# fallback. An arch.json "capabilities" list takes precedence, e.g. drop
+# 'resize_nearest' there if the compiler leaves the resizes on the CPU.
+TARGET_CAPABILITIES = {
+    "0x101000016010405": {'resize_nearest', 'transposed_conv', 'depth_to_space'},   # Ultra96-V2 B2304
+}
+# First supported lowering wins; 'resize_nearest' means the op runs as-is
+PREFERENCE = ('resize_nearest', 'transposed_conv', 'depth_to_space')
+
+
+def target_capabilities(arch_json=ARCH_JSON):
+    if not os.path.exists(arch_json):
+        return set()
+    with open(arch_json) as f:
+        arch = json.load(f)
+    if 'capabilities' in arch:
+        return set(arch['capabilities'])
+    return TARGET_CAPABILITIES.get(arch.get('fingerprint'), set())
+
+
+def choose_lowering(capabilities):
+    return next((mode for mode in PREFERENCE if mode in capabilities), None)
+
+
+def find_upsample_2x(graph_def, shapes):
+    """[(resize node, input shape NHWC)] for every static, exact 2x ResizeNearestNeighbor."""
+    nodes = node_map(graph_def)
+    found = []
+    for n in graph_def.node:
+        if n.op != 'ResizeNearestNeighbor':
+            continue
+        if 'align_corners' in n.attr and n.attr['align_corners'].b:
+            continue   # align_corners picks different source pixels
+        src = (shapes.get(base_name(n.input[0])) or [None])[0]
+        size = const_value(nodes, n.input[1])
+        if src is None or None in src or len(src) != 4 or size is None:
+            continue
+        if list(size) == [2 * src[1], 2 * src[2]]:
+            found.append((n, src))
+    return found
+
+
+def _transposed_conv(node, shape):
+    """Conv2DBackpropInput with w[i, j, c, c] = 1: output (2h+i, 2w+j, c) = input (h, w, c)."""
+    n, h, w, c = shape
+    dtype = node.attr['T']
+    np_dtype = tf.as_dtype(dtype.type).as_numpy_dtype
+    kernel = np.zeros((2, 2, c, c), np_dtype)
+    kernel[:, :, np.arange(c), np.arange(c)] = 1
+    sizes = make_const(node.name + "/up/output_shape", np.array([n, 2 * h, 2 * w, c], np.int32))
+    weights = make_const(node.name + "/up/kernel", kernel)
+    conv = make_node('Conv2DBackpropInput', node.name, [sizes.name, weights.name, node.input[0]],
+                     T=dtype, strides=list_attr([1, 2, 2, 1]),
+                     padding=tf.compat.v1.AttrValue(s=b"VALID"),
+                     data_format=tf.compat.v1.AttrValue(s=b"NHWC"),
+                     dilations=list_attr([1, 1, 1, 1]),
+                     use_cudnn_on_gpu=tf.compat.v1.AttrValue(b=True))
+    return [sizes, weights, conv]
+
+
+def _depth_to_space(node, shape):
+    """Channel block k of the concat is the same x, so every 2x2 output cell repeats the input pixel."""
+    dtype = node.attr['T']
+    axis = make_const(node.name + "/up/axis", np.array(3, np.int32))
+    concat = make_node('ConcatV2', node.name + "/up/replicate", [node.input[0]] * 4 + [axis.name],
+                       T=dtype, N=tf.compat.v1.AttrValue(i=4), Tidx=type_attr(tf.int32))
+    d2s = make_node('DepthToSpace', node.name, [concat.name], T=dtype,
+                    block_size=tf.compat.v1.AttrValue(i=2),
+                    data_format=tf.compat.v1.AttrValue(s=b"NHWC"))
+    return [axis, concat, d2s]
+
+
+LOWERINGS = {'transposed_conv': _transposed_conv, 'depth_to_space': _depth_to_space}
+
+
+def lower_upsampling(graph_def, mode, outputs, shapes=None):
+    """Returns (graph_def, names of the lowered resizes). Lowered nodes keep their names."""
+    shapes = shapes or infer_shapes(graph_def)
+    replacements = {n.name: LOWERINGS[mode](n, shape) for n, shape in find_upsample_2x(graph_def, shapes)}
+    return prune(replace_nodes(graph_def, replacements), outputs), sorted(replacements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lower 2x nearest upsampling to DPU-native ops")
+    parser.add_argument("input", nargs='?', default=INPUT_GRAPH)
+    parser.add_argument("output", nargs='?', default=OUTPUT_GRAPH)
+    parser.add_argument("--packed", action="store_true",
+                        help="write only the const-store topology, not the full .pb")
+    parser.add_argument("--mode", choices=sorted(LOWERINGS), help="override the arch.json choice")
+    args = parser.parse_args()
+
+    caps = target_capabilities()
+    mode = args.mode or choose_lowering(caps)
+    print(f"Target capabilities: {sorted(caps) or 'unknown'}")
+    if mode is None:
+        print("ERROR: Target supports neither resize nor a lowering for it - nothing to do.")
+        print(f"       Add a 'capabilities' list to {ARCH_JSON} or pass --mode.")
+        return
+    if mode == 'resize_nearest':
+        print("Target runs ResizeNearestNeighbor natively - nothing to do.")
+        return
+    if args.mode and args.mode not in caps:
+        print(f"WARNING: {args.mode} is not in the target's capabilities.")
+
+    print(f"Loading {args.input}...")
+    graph_def = load_graph(args.input)
+    inputs, outputs = graph_endpoints(graph_def)
+    shapes = infer_shapes(graph_def)
+    total = sum(1 for n in graph_def.node if n.op == 'ResizeNearestNeighbor')
+
+    lowered_def, lowered = lower_upsampling(graph_def, mode, outputs, shapes)
+    print(f"Lowered {len(lowered)}/{total} ResizeNearestNeighbor as {mode}")
+    if total > len(lowered):
+        print("  (the rest are not static exact 2x, or use align_corners)")
+    if not lowered:
+        return
+
+    print("\n" + "=" * 70)
+    print("BIT-EXACT CHECK (each upsample output and the graph outputs)")
+    print("=" * 70)
+    feeds = sample_feeds(graph_def, CHECK_FEEDS)
+    fetches = [name + ":0" for name in lowered] + outputs
+    results = compare_graphs(graph_def, lowered_def, fetches, feeds, atol=0.0, rtol=0.0)
+    if not print_comparison(results):
+        print("\nERROR: Lowered upsampling is not bit-exact - not saving.")
+        return
+
+    # The partition effect on a target that would otherwise run the resize on the CPU
+    cpu_ops = CPU_OPS | {'ResizeNearestNeighbor'}
+    before = count_partitions(graph_def, inputs, outputs, cpu_ops)
+    after = count_partitions(lowered_def, inputs, outputs, cpu_ops)
+    print(f"\nPartitions (resize on CPU): {before[0]} ({before[1]} DPU) -> {after[0]} ({after[1]} DPU)")
+
+    save_graph_def(lowered_def, args.output, full=not args.packed)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
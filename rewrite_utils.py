@@ -0,0 +1,190 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework import graph_util, tensor_util
+
+from const_store import STORE_DIR, save_graph, topo_path
+from preprocess import Preprocessor, list_images
+
+# Shared plumbing for the graph-rewrite passes: node builders, pruning and
+# the output-equivalence check every pass runs before it saves anything.
+
+CALIB_DIR = "calib_dataset"
+
+
+def base_name(inp):
+    """'^node', 'node:1' -> 'node'."""
+    return inp.lstrip('^').split(':')[0]
+
+
+def node_map(graph_def):
+    return {n.name: n for n in graph_def.node}
+
+
+def consumers_map(graph_def):
+    """{node name: [(consumer NodeDef, input index), ...]} for data inputs."""
+    consumers = {n.name: [] for n in graph_def.node}
+    for n in graph_def.node:
+        for i, inp in enumerate(n.input):
+            if not inp.startswith('^') and base_name(inp) in consumers:
+                consumers[base_name(inp)].append((n, i))
+    return consumers
+
+
+def graph_endpoints(graph_def):
+    """Placeholder inputs and sink outputs, as tensor names."""
+    consumed = {base_name(i) for n in graph_def.node for i in n.input}
+    inputs = [n.name + ":0" for n in graph_def.node if n.op == 'Placeholder']
+    outputs = [n.name + ":0" for n in graph_def.node
+               if n.name not in consumed and n.op not in ('Const', 'NoOp', 'Placeholder')]
+    return inputs, outputs
+
+
+def const_value(nodes, inp):
+    """Value of `inp` if it is a Const (possibly behind Identity nodes), else None."""
+    name = base_name(inp)
+    while name in nodes and nodes[name].op == 'Identity':
+        name = base_name(nodes[name].input[0])
+    node = nodes.get(name)
+    if node is None or node.op != 'Const':
+        return None
+    return tf.make_ndarray(node.attr['value'].tensor)
+
+
+def unique_name(nodes, name):
+    """`name`, or `name_1`, `name_2`... if a node already has it."""
+    candidate, i = name, 0
+    while candidate in nodes:
+        i += 1
+        candidate = f"{name}_{i}"
+    return candidate
+
+
+def type_attr(dtype):
+    return tf.compat.v1.AttrValue(type=tf.as_dtype(dtype).as_datatype_enum)
+
+
+def make_const(name, value, dtype=None):
+    value = np.asarray(value, dtype=dtype)
+    node = tf.compat.v1.NodeDef(name=name, op='Const')
+    node.attr['dtype'].CopyFrom(type_attr(value.dtype))
+    node.attr['value'].tensor.CopyFrom(tensor_util.make_tensor_proto(value))
+    return node
+
+
+def make_node(op, name, inputs, **attrs):
+    """NodeDef with AttrValue attrs, e.g. make_node('Conv2D', n, [x, w], T=type_attr(f32))."""
+    node = tf.compat.v1.NodeDef(name=name, op=op)
+    node.input.extend(inputs)
+    for key, value in attrs.items():
+        node.attr[key].CopyFrom(value)
+    return node
+
+
+def list_attr(values):
+    return tf.compat.v1.AttrValue(list=tf.compat.v1.AttrValue.ListValue(i=list(values)))
+
+
+def replace_nodes(graph_def, replacements):
+    """
+    New GraphDef with each node named in `replacements` swapped for its list
+    of new nodes. The new node that keeps the old name takes over its consumers.
+    """
+    out = tf.compat.v1.GraphDef()
+    out.versions.CopyFrom(graph_def.versions)
+    out.library.CopyFrom(graph_def.library)
+    for n in graph_def.node:
+        if n.name in replacements:
+            out.node.extend(replacements[n.name])
+        else:
+            out.node.add().CopyFrom(n)
+    return out
+
+
+def prune(graph_def, outputs):
+    """Drop everything the outputs no longer depend on."""
+    return graph_util.extract_sub_graph(graph_def, [base_name(o) for o in outputs])
+
+
+def save_graph_def(graph_def, path, full=True, store_dir=STORE_DIR):
+    """
+    Topology (<path>.topo.pb) into the shared const store, so only Consts this
+    stage changed take new space, plus the plain .pb that vai_q_tensorflow
+    reads unless full=False (const_store.py --unpack rebuilds it).
+    store_dir=None writes just the plain .pb.
+    """
+    if store_dir is not None:
+        save_graph(graph_def, topo_path(path), store_dir)
+    if full or store_dir is None:
+        with tf.io.gfile.GFile(path, "wb") as f:
+            f.write(graph_def.SerializeToString())
+
+
+def _import(graph_def):
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+    return graph
+
+
+def sample_feeds(graph_def, count=4, img_dir=CALIB_DIR):
+    """Feed dicts for the graph's placeholders: calib images for NHWC RGB inputs, noise otherwise."""
+    graph = _import(graph_def)
+    inputs, _ = graph_endpoints(graph_def)
+    files = list_images(img_dir)
+    rng = np.random.default_rng(0)
+    feeds = []
+    for i in range(count):
+        feed = {}
+        for name in inputs:
+            t = graph.get_tensor_by_name(name)
+            shape = [d if d is not None else 1 for d in t.shape.as_list()]
+            if len(shape) == 4 and shape[-1] == 3 and files:
+                pre = Preprocessor(batch_size=shape[0], height=shape[1], width=shape[2])
+                pre.load_file(files[i % len(files)])
+                feed[name] = pre.batch.copy()
+            else:
+                feed[name] = rng.standard_normal(shape).astype(t.dtype.as_numpy_dtype)
+        feeds.append(feed)
+    return feeds
+
+
+def run_graph(graph_def, feeds, fetches):
+    """Run fetches for each feed dict. Returns a list (per feed) of lists of arrays."""
+    graph = _import(graph_def)
+    with tf.compat.v1.Session(graph=graph) as sess:
+        tensors = [graph.get_tensor_by_name(f) for f in fetches]
+        return [sess.run(tensors, {graph.get_tensor_by_name(k): v for k, v in feed.items()})
+                for feed in feeds]
+
+
+def compare_graphs(old_def, new_def, fetches, feeds, atol=1e-4, rtol=1e-3):
+    """
+    Run both graphs on the same feeds and compare every fetched tensor.
+    Returns [{'tensor', 'max_abs', 'max_rel', 'ok'}] (worst case over feeds).
+    """
+    old_out = run_graph(old_def, feeds, fetches)
+    new_out = run_graph(new_def, feeds, fetches)
+    results = []
+    for i, name in enumerate(fetches):
+        max_abs = max_rel = 0.0
+        ok = True
+        for a, b in zip(old_out, new_out):
+            a, b = np.asarray(a[i], np.float64), np.asarray(b[i], np.float64)
+            if a.shape != b.shape:
+                ok, max_abs, max_rel = False, float('inf'), float('inf')
+                break
+            diff = np.abs(a - b)
+            max_abs = max(max_abs, float(diff.max(initial=0.0)))
+            max_rel = max(max_rel, float((diff / (np.abs(a) + 1e-12)).max(initial=0.0)))
+            ok = ok and bool(np.allclose(b, a, atol=atol, rtol=rtol))
+        results.append({'tensor': name, 'max_abs': max_abs, 'max_rel': max_rel, 'ok': ok})
+    return results
+
+
+def print_comparison(results, limit=10):
+    failed = [r for r in results if not r['ok']]
+    print(f"Equivalence check: {len(results) - len(failed)}/{len(results)} tensors match")
+    for r in (failed or results)[:limit]:
+        status = "OK  " if r['ok'] else "FAIL"
+        print(f"  [{status}] {r['tensor']}  max abs {r['max_abs']:.3g}, max rel {r['max_rel']:.3g}")
+    return not failed
@@ -0,0 +1,205 @@
+import argparse
+import json
+
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from mixed_precision import sqnr_db
+from postprocess import decode_yolo, match_rate
+from rewrite_utils import (base_name, graph_endpoints, make_const, make_node, node_map, prune,
+                           replace_nodes, run_graph, sample_feeds, save_graph_def)
+from split_runtime import CPU_OPS, count_partitions
+
+# SiLU is exported as x * sigmoid(x). The DPU has no Sigmoid, so every SiLU
+# sends its tensor to the CPU and back. hard-swish (x * relu6(x + 3) / 6) and
+# LeakyReLU both run on the DPU; this pass swaps them in and measures what
+# that costs in accuracy and what it saves in partitions.
+
+# --- CONFIG ---
+INPUT_GRAPH  = "frozen_yolo_clean.pb"
+OUTPUT_GRAPH = "frozen_yolo_dpu_act.pb"
+EVAL_IMAGES  = 8
+DEFAULT_ACT  = "hswish"
+LEAKY_ALPHA  = 26.0 / 256    # the slope the DPU actually implements for LeakyReLU(0.1)
+
+ACTIVATIONS = ("hswish", "leaky", "keep")
+
+# Partition count is measured with Sigmoid on the CPU, as on our DPU
+TARGET_CPU_OPS = CPU_OPS | {'Sigmoid'}
+
+
+def _tensor(inp):
+    return inp if ':' in inp else inp + ':0'
+
+
+def find_silu(graph_def):
+    """[(mul name, sigmoid name, x tensor)] for every Mul(x, Sigmoid(x)) in either order."""
+    nodes = node_map(graph_def)
+    found = []
+    for n in graph_def.node:
+        if n.op != 'Mul' or len(n.input) < 2:
+            continue
+        for a, b in ((0, 1), (1, 0)):
+            sig = nodes.get(base_name(n.input[b]))
+            if sig is not None and sig.op == 'Sigmoid' and _tensor(sig.input[0]) == _tensor(n.input[a]):
+                found.append((n.name, sig.name, n.input[a]))
+                break
+    return found
+
+
+def _hswish(name, x, dtype):
+    """x * relu6(x + 3) / 6, the form the Vitis AI quantizer maps to hard-swish."""
+    t = tf.compat.v1.AttrValue(type=dtype)
+    np_dtype = tf.as_dtype(dtype).as_numpy_dtype
+    three = make_const(name + "/hswish/three", np.array(3.0, np_dtype))
+    sixth = make_const(name + "/hswish/sixth", np.array(1.0 / 6.0, np_dtype))
+    add = make_node('AddV2', name + "/hswish/add", [x, three.name], T=t)
+    relu6 = make_node('Relu6', name + "/hswish/relu6", [add.name], T=t)
+    gate = make_node('Mul', name + "/hswish/gate", [relu6.name, sixth.name], T=t)
+    out = make_node('Mul', name, [x, gate.name], T=t)
+    return [three, sixth, add, relu6, gate, out]
+
+
+def _leaky(name, x, dtype):
+    return [make_node('LeakyRelu', name, [x], T=tf.compat.v1.AttrValue(type=dtype),
+                      alpha=tf.compat.v1.AttrValue(f=LEAKY_ALPHA))]
+
+
+def substitute(graph_def, policy, outputs):
+    """
+    Copy of graph_def with each SiLU in `policy` ({mul name: activation})
+    replaced. The new activation keeps the Mul's name; Sigmoids that nothing
+    else reads are pruned.
+    """
+    nodes = node_map(graph_def)
+    replacements = {}
+    for mul, _, x in find_silu(graph_def):
+        act = policy.get(mul, "keep")
+        dtype = nodes[mul].attr['T'].type
+        if act == "hswish":
+            replacements[mul] = _hswish(mul, x, dtype)
+        elif act == "leaky":
+            replacements[mul] = _leaky(mul, x, dtype)
+    return prune(replace_nodes(graph_def, replacements), outputs)
+
+
+def build_policy(silus, default, overrides=None):
+    policy = {mul: default for mul, _, _ in silus}
+    for key, act in (overrides or {}).items():
+        if act not in ACTIVATIONS:
+            raise ValueError(f"Unknown activation {act!r} for {key}, expected one of {ACTIVATIONS}")
+        # A key matches a layer name exactly or as a prefix (e.g. a whole block)
+        for mul in policy:
+            if mul == key or mul.startswith(key.rstrip('/') + '/'):
+                policy[mul] = act
+    return policy
+
+
+# ----------------------------------------------------------------------------
+# Evaluation
+# ----------------------------------------------------------------------------
+
+def layer_errors(ref_acts, new_acts, names):
+    """Per-layer max abs error and error relative to the reference std, worst over feeds."""
+    errors = {}
+    for i, name in enumerate(names):
+        max_abs = rel = 0.0
+        for ref, new in zip(ref_acts, new_acts):
+            a, b = np.asarray(ref[i], np.float64), np.asarray(new[i], np.float64)
+            diff = np.abs(a - b).max(initial=0.0)
+            max_abs = max(max_abs, float(diff))
+            rel = max(rel, float(np.sqrt(((a - b) ** 2).mean()) / (a.std() + 1e-12)))
+        errors[name] = (max_abs, rel)
+    return errors
+
+
+def detection_agreement(ref_outs, new_outs):
+    """Mean fraction of reference detections (first output) kept after the rewrite."""
+    return float(np.mean([match_rate(decode_yolo(r[0]), decode_yolo(o[0]))
+                          for r, o in zip(ref_outs, new_outs)]))
+
+
+def single_layer_sqnr(graph_def, silus, act, feeds, outputs, refs):
+    """{mul name: output SQNR with only this SiLU replaced by `act`}."""
+    results = {}
+    for k, (mul, _, _) in enumerate(silus, 1):
+        g = substitute(graph_def, {mul: act}, outputs)
+        results[mul] = sqnr_db(refs, run_graph(g, feeds, outputs))
+        if k % 20 == 0 or k == len(silus):
+            print(f"  {k}/{len(silus)} layers")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replace SiLU with a DPU-native activation")
+    parser.add_argument("input", nargs='?', default=INPUT_GRAPH)
+    parser.add_argument("output", nargs='?', default=OUTPUT_GRAPH)
+    parser.add_argument("--packed", action="store_true",
+                        help="write only the const-store topology, not the full .pb")
+    parser.add_argument("--act", choices=ACTIVATIONS, default=DEFAULT_ACT, help="global policy")
+    parser.add_argument("--policy", help="JSON {layer name or prefix: hswish|leaky|keep}")
+    parser.add_argument("--min-sqnr", type=float,
+                        help="per-layer policy: keep SiLU where swapping it alone drops below this (dB)")
+    parser.add_argument("--images", type=int, default=EVAL_IMAGES)
+    args = parser.parse_args()
+
+    print(f"Loading {args.input}...")
+    graph_def = load_graph(args.input)
+    inputs, outputs = graph_endpoints(graph_def)
+    silus = find_silu(graph_def)
+    print(f"{len(silus)} SiLU (x * sigmoid(x)) patterns")
+    if not silus:
+        return
+
+    overrides = None
+    if args.policy:
+        with open(args.policy) as f:
+            overrides = json.load(f)
+    policy = build_policy(silus, args.act, overrides)
+
+    feeds = sample_feeds(graph_def, args.images)
+    acts = [mul + ":0" for mul, _, _ in silus]
+    ref = run_graph(graph_def, feeds, outputs + acts)
+    ref_outs = [r[:len(outputs)] for r in ref]
+
+    if args.min_sqnr is not None and args.act != "keep":
+        print(f"\nSingle-layer {args.act} sensitivity on {len(feeds)} images...")
+        sensitivity = single_layer_sqnr(graph_def, silus, args.act, feeds, outputs, ref_outs)
+        for mul, sqnr in sensitivity.items():
+            if sqnr < args.min_sqnr and policy[mul] != "keep":
+                policy[mul] = "keep"
+                print(f"  keep SiLU: {mul} ({sqnr:.1f} dB)")
+
+    new_def = substitute(graph_def, policy, outputs)
+    new = run_graph(new_def, feeds, outputs + acts)
+    new_outs = [r[:len(outputs)] for r in new]
+    errors = layer_errors([r[len(outputs):] for r in ref], [r[len(outputs):] for r in new], acts)
+
+    print("\n" + "=" * 70)
+    print("LAYER-BY-LAYER (activation output, original vs substituted)")
+    print("=" * 70)
+    for mul, (max_abs, rel) in sorted(errors.items(), key=lambda e: -e[1][1])[:20]:
+        print(f"  {rel:8.4f} rel  {max_abs:9.4f} abs  [{policy[mul[:-2]]}] {mul[:-2]}")
+
+    before = count_partitions(graph_def, inputs, outputs, TARGET_CPU_OPS)
+    after = count_partitions(new_def, inputs, outputs, TARGET_CPU_OPS)
+    counts = {act: sum(1 for a in policy.values() if a == act) for act in ACTIVATIONS}
+
+    print("\n" + "=" * 70)
+    print("RESULT")
+    print("=" * 70)
+    print("  Policy: " + ", ".join(f"{act} {n}" for act, n in counts.items()))
+    print(f"  Output SQNR vs SiLU: {sqnr_db(ref_outs, new_outs):.2f} dB")
+    print(f"  Detections kept (IoU >= 0.5, same class): {detection_agreement(ref_outs, new_outs):.1%}")
+    print(f"  Partitions (Sigmoid on CPU): {before[0]} ({before[1]} DPU) -> "
+          f"{after[0]} ({after[1]} DPU)")
+
+    save_graph_def(new_def, args.output, full=not args.packed)
+    with open(args.output + ".policy.json", "w") as f:
+        json.dump(policy, f, indent=2)
+    print(f"\nSaved to {args.output} (policy in {args.output}.policy.json)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+from numpy_executor import NumpyGraph
+from preprocess import Preprocessor, list_images, read_fix_pos
+from tflite_runner import TFLiteRunner
+
+# --- CONFIG ---
+FROZEN_GRAPH = "frozen_yolo_clean.pb"
+PLAN_FILE    = "partition_plan.json"
+PLAN_DIR     = "partitions"
+INPUT_NODES  = ["images"]
+OUTPUT_NODES = ["Identity"]
+IMG_DIR      = "calib_dataset"
+TFLITE_DIR   = "tflite"
+CPU_THREADS  = 4       # TFLite interpreter threads: the four A53 cores
+
+# Ops the DPU can't run; everything else is assumed DPU-capable.
+# Same list deep_analysis.py flags as unsupported for Vitis AI 2.5.
+CPU_OPS = {
+    'BatchMatMulV2', 'BatchMatMul', 'MatMul',
+    'Softmax', 'LogSoftmax',
+    'GatherV2', 'Gather', 'ScatterNd',
+    'Where', 'Select', 'SelectV2',
+    'Range', 'Fill',
+    'StridedSlice', 'Pack', 'Unpack', 'Tile', 'Cast',
+}
+
+
+def load_graph_def(path):
+    graph_def = tf.compat.v1.GraphDef()
+    with tf.io.gfile.GFile(path, "rb") as f:
+        graph_def.ParseFromString(f.read())
+    return graph_def
+
+
+def _tensor(inp):
+    """Canonical tensor name: 'node' -> 'node:0'."""
+    return inp if ':' in inp else inp + ':0'
+
+
+def _placeholder_name(tensor):
+    node, idx = tensor.split(':')
+    return node if idx == '0' else f"{node}__{idx}"
+
+
+# ----------------------------------------------------------------------------
+# Planning: cut a frozen graph into DPU partitions and CPU islands
+# ----------------------------------------------------------------------------
+
+def plan_partitions(graph_def, inputs=INPUT_NODES, outputs=OUTPUT_NODES,
+                    cpu_ops=CPU_OPS, plan_dir=PLAN_DIR):
+    """
+    Assign every node to the DPU or CPU and group them into partitions.
+
+    stage(node) = max over inputs of stage(input) + (1 if the device changes).
+    Nodes sharing (stage, device) can never depend on another group in both
+    directions, so grouping by it is always acyclic. Each group is then split
+    into connected components: components of the same stage are independent
+    and can run concurrently.
+    """
+    nodes = {n.name: n for n in graph_def.node}
+    order = NumpyGraph._topo_order(nodes, [o.split(':')[0] for o in outputs])
+
+    # Const and Identity-of-Const are copied into every partition that reads them
+    const_like = set()
+    for n in order:
+        data_in = [i.split(':')[0] for i in n.input if not i.startswith('^')]
+        if n.op == 'Const' or (n.op == 'Identity' and all(i in const_like for i in data_in)):
+            const_like.add(n.name)
+
+    device, stage = {}, {}
+    for n in order:
+        if n.name in const_like or n.op == 'Placeholder':
+            continue
+        dev = 'cpu' if n.op in cpu_ops else 'dpu'
+        s = 0
+        for inp in n.input:
+            base = inp.lstrip('^').split(':')[0]
+            if base in stage:
+                s = max(s, stage[base] + (device[base] != dev))
+        device[n.name], stage[n.name] = dev, s
+
+    # Union-find over edges inside the same (stage, device) group
+    parent = {name: name for name in stage}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for name in stage:
+        for inp in nodes[name].input:
+            base = inp.lstrip('^').split(':')[0]
+            if base in stage and (stage[base], device[base]) == (stage[name], device[name]):
+                parent[find(base)] = find(name)
+
+    groups = {}
+    for name in (n.name for n in order if n.name in stage):
+        groups.setdefault(find(name), []).append(name)
+
+    owner = {}
+    members = sorted(groups.values(), key=lambda g: (stage[g[0]], device[g[0]]))
+    for idx, names in enumerate(members):
+        for name in names:
+            owner[name] = idx
+
+    graph_outputs = {_tensor(o) for o in outputs}
+    consumed_by = {}
+    for name in stage:
+        for inp in nodes[name].input:
+            if inp.startswith('^'):
+                continue
+            base = inp.split(':')[0]
+            if base in owner and owner[base] != owner[name]:
+                consumed_by.setdefault(_tensor(inp), set()).add(owner[name])
+
+    os.makedirs(plan_dir, exist_ok=True)
+    with tf.Graph().as_default() as g:
+        tf.compat.v1.import_graph_def(graph_def, name='')
+
+    partitions = []
+    for idx, names in enumerate(members):
+        dev = device[names[0]]
+        pname = f"p{idx:02d}_{dev}"
+        sub, part_inputs = _extract_partition(nodes, names, owner, idx, const_like, g)
+        part_outputs = sorted({t for t, users in consumed_by.items()
+                               if owner.get(t.split(':')[0]) == idx}
+                              | {t for t in graph_outputs if owner.get(t.split(':')[0]) == idx})
+        path = os.path.join(plan_dir, pname + ".pb")
+        with tf.io.gfile.GFile(path, "wb") as f:
+            f.write(sub.SerializeToString())
+        partitions.append({
+            'name': pname,
+            'device': dev,
+            'stage': stage[names[0]],
+            'graph': path,
+            'inputs': part_inputs,
+            'outputs': part_outputs,
+            'nodes': len(names),
+        })
+
+    return {
+        'inputs': [_tensor(i) for i in inputs],
+        'outputs': sorted(graph_outputs),
+        'partitions': partitions,
+    }
+
+
+def _extract_partition(nodes, names, owner, idx, const_like, graph):
+    """Standalone GraphDef for one partition, with Placeholders at its boundary."""
+    sub = tf.compat.v1.GraphDef()
+    part_inputs, copied = {}, set()
+
+    def copy_const(name):
+        if name in copied:
+            return
+        copied.add(name)
+        for inp in nodes[name].input:
+            copy_const(inp.lstrip('^').split(':')[0])
+        sub.node.add().CopyFrom(nodes[name])
+
+    for name in names:
+        node = nodes[name]
+        new_inputs = []
+        for inp in node.input:
+            if inp.startswith('^'):
+                continue  # control deps don't cross partitions
+            base = inp.split(':')[0]
+            if base in const_like:
+                copy_const(base)
+                new_inputs.append(inp)
+            elif owner.get(base) == idx:
+                new_inputs.append(inp)
+            else:
+                tensor = _tensor(inp)
+                ph = _placeholder_name(tensor)
+                if tensor not in part_inputs:
+                    part_inputs[tensor] = ph
+                    t = graph.get_tensor_by_name(tensor)
+                    p = sub.node.add()
+                    p.name, p.op = ph, 'Placeholder'
+                    p.attr['dtype'].type = t.dtype.as_datatype_enum
+                    p.attr['shape'].shape.CopyFrom(t.shape.as_proto())
+                new_inputs.append(ph)
+        new_node = sub.node.add()
+        new_node.CopyFrom(node)
+        del new_node.input[:]
+        new_node.input.extend(new_inputs)
+    return sub, part_inputs
+
+
+def count_partitions(graph_def, inputs=INPUT_NODES, outputs=OUTPUT_NODES, cpu_ops=CPU_OPS):
+    """(partitions, DPU partitions) the planner would produce, without keeping the plan."""
+    with tempfile.TemporaryDirectory() as plan_dir:
+        plan = plan_partitions(graph_def, [i.split(':')[0] for i in inputs], outputs, cpu_ops, plan_dir)
+    parts = plan['partitions']
+    return len(parts), sum(p['device'] == 'dpu' for p in parts)
+
+
+def save_plan(plan, path=PLAN_FILE):
+    with open(path, "w") as f:
+        json.dump(plan, f, indent=2)
+
+
+def load_plan(path=PLAN_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+# ----------------------------------------------------------------------------
+# Backends: one instance per partition
+# ----------------------------------------------------------------------------
+
+class Backend:
+    """Runs one partition: run({tensor: ndarray}) -> {tensor: ndarray}."""
+
+    def __init__(self, partition):
+        self.partition = partition
+        self.inputs = partition['inputs']      # tensor -> name inside the partition
+        self.outputs = partition['outputs']
+
+    def run(self, feeds):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class TFGraphBackend(Backend):
+    """Partition .pb in a tf.compat.v1.Session. Stands in for the DPU off-board."""
+
+    def __init__(self, partition):
+        super().__init__(partition)
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.compat.v1.import_graph_def(load_graph_def(partition['graph']), name='')
+        self.sess = tf.compat.v1.Session(graph=self.graph)
+        self.feed_tensors = {t: self.graph.get_tensor_by_name(ph + ':0')
+                             for t, ph in self.inputs.items()}
+        self.fetch_tensors = [self.graph.get_tensor_by_name(t) for t in self.outputs]
+
+    def run(self, feeds):
+        values = self.sess.run(self.fetch_tensors,
+                               {self.feed_tensors[t]: feeds[t] for t in self.inputs})
+        return dict(zip(self.outputs, values))
+
+    def close(self):
+        self.sess.close()
+
+
+class NumpyBackend(Backend):
+    """Partition .pb on the NumPy executor (no TF session on the board)."""
+
+    def __init__(self, partition):
+        super().__init__(partition)
+        self.graph = NumpyGraph(load_graph_def(partition['graph']), self.outputs,
+                                inputs=list(self.inputs.values()))
+
+    def run(self, feeds):
+        return self.graph.run({ph: feeds[t] for t, ph in self.inputs.items()})
+
+
+class TFLiteBackend(Backend):
+    """Partition exported by tflite_export.py, on the TFLite interpreter (XNNPACK on the A53s)."""
+
+    def __init__(self, partition, mode="int8", tflite_dir=TFLITE_DIR):
+        super().__init__(partition)
+        self.runner = TFLiteRunner(os.path.join(tflite_dir, f"{partition['name']}_{mode}.tflite"),
+                                   self.inputs, self.outputs, CPU_THREADS)
+
+    def run(self, feeds):
+        return self.runner.run(feeds)
+
+
+class SimulatedDpuBackend(TFGraphBackend):
+    """
+    TF execution with the DPU's int8 boundary: inputs and outputs are rounded
+    to the fix positions vai_q chose (read from quant_output/temp when present,
+    otherwise derived from the tensor's range), plus an optional fixed latency.
+    """
+
+    def __init__(self, partition, temp_dir="quant_output/temp", latency_ms=0.0):
+        super().__init__(partition)
+        self.latency = latency_ms / 1000.0
+        self.fix_pos = {}
+        for t in list(self.inputs) + self.outputs:
+            try:
+                self.fix_pos[t] = read_fix_pos(t.split(':')[0], temp_dir)
+            except (OSError, ValueError):
+                pass
+
+    def _fake_quant(self, tensor, x):
+        pos = self.fix_pos.get(tensor)
+        if pos is None:
+            peak = float(np.abs(x).max()) or 1.0
+            pos = int(np.floor(np.log2(127.0 / peak)))
+        scale = 2.0 ** pos
+        return np.clip(np.floor(x * scale + 0.5), -128, 127) / scale
+
+    def run(self, feeds):
+        start = time.perf_counter()
+        feeds = {t: self._fake_quant(t, feeds[t]) for t in self.inputs}
+        out = {t: self._fake_quant(t, v).astype(np.float32)
+               for t, v in super().run(feeds).items()}
+        spare = self.latency - (time.perf_counter() - start)
+        if spare > 0:
+            time.sleep(spare)
+        return out
+
+
+class VartBackend(Backend):
+    """On-board DPU via VART. Needs partition['xmodel'] from vai_c_tensorflow."""
+
+    def __init__(self, partition):
+        super().__init__(partition)
+        import vart
+        import xir
+
+        graph = xir.Graph.deserialize(partition['xmodel'])
+        subgraphs = [s for s in graph.get_root_subgraph().toposort_child_subgraph()
+                     if s.has_attr("device") and s.get_attr("device").upper() == "DPU"]
+        if len(subgraphs) != 1:
+            raise RuntimeError(f"{partition['xmodel']}: expected 1 DPU subgraph, got {len(subgraphs)}")
+        self.runner = vart.Runner.create_runner(subgraphs[0], "run")
+        in_t = self.runner.get_input_tensors()
+        out_t = self.runner.get_output_tensors()
+
+        self.in_order = self._match(list(self.inputs), in_t)
+        self.out_order = self._match(self.outputs, out_t)
+        self.in_scale = [2.0 ** t.get_attr("fix_point") for t in in_t]
+        self.out_scale = [2.0 ** -t.get_attr("fix_point") for t in out_t]
+        self.in_bufs = [np.empty(tuple(t.dims), np.int8) for t in in_t]
+        self.out_bufs = [np.empty(tuple(t.dims), np.int8) for t in out_t]
+
+    @staticmethod
+    def _match(names, xir_tensors):
+        """Plan tensor for each runner tensor: by node name, else by position."""
+        order = []
+        for i, t in enumerate(xir_tensors):
+            hit = [n for n in names if n.split(':')[0] in t.name]
+            order.append(hit[0] if len(hit) == 1 else names[i])
+        return order
+
+    def run(self, feeds):
+        for buf, tensor, scale in zip(self.in_bufs, self.in_order, self.in_scale):
+            np.clip(np.floor(feeds[tensor] * scale + 0.5), -128, 127, out=buf, casting='unsafe')
+        job = self.runner.execute_async(self.in_bufs, self.out_bufs)
+        self.runner.wait(job)
+        return {t: buf * scale for buf, t, scale in zip(self.out_bufs, self.out_order, self.out_scale)}
+
+
+# ----------------------------------------------------------------------------
+# Orchestrator
+# ----------------------------------------------------------------------------
+
+class _Frame:
+    def __init__(self, feeds, pending):
+        self.tensors = dict(feeds)
+        self.pending = dict(pending)
+        self.remaining = len(pending)
+        self.lock = threading.Lock()
+        self.future = Future()
+
+
+class SplitRuntime:
+    """
+    Runs a partition plan. Tensors move between partitions as references in a
+    per-frame dict (no copies). A partition starts as soon as all its inputs
+    exist, so independent partitions run concurrently, and up to
+    `max_inflight` frames are in flight so the DPU works on frame N+1 while
+    the ARM cores finish frame N. Each partition handles one frame at a time.
+    """
+
+    def __init__(self, plan, dpu_backend=TFGraphBackend, cpu_backend=NumpyBackend,
+                 workers=4, max_inflight=2):
+        self.plan = plan
+        self.partitions = {p['name']: p for p in plan['partitions']}
+        self.backends = {}
+        for p in plan['partitions']:
+            factory = dpu_backend if p['device'] == 'dpu' else cpu_backend
+            self.backends[p['name']] = factory(p)
+        self.part_locks = {name: threading.Lock() for name in self.partitions}
+        self.times = {name: 0.0 for name in self.partitions}
+        self.runs = {name: 0 for name in self.partitions}
+
+        producer = {t: p['name'] for p in plan['partitions'] for t in p['outputs']}
+        self.deps, self.consumers = {}, {name: [] for name in self.partitions}
+        for p in plan['partitions']:
+            deps = {producer[t] for t in p['inputs'] if t in producer}
+            self.deps[p['name']] = len(deps)
+            for d in deps:
+                self.consumers[d].append(p['name'])
+
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.inflight = threading.Semaphore(max_inflight)
+
+    def submit(self, feeds):
+        """Start one frame. feeds: {input tensor: ndarray}. Returns a Future of outputs."""
+        self.inflight.acquire()
+        frame = _Frame({_tensor(k): v for k, v in feeds.items()}, self.deps)
+        frame.future.add_done_callback(lambda _: self.inflight.release())
+        for name, n in self.deps.items():
+            if n == 0:
+                self.pool.submit(self._run_partition, frame, name)
+        return frame.future
+
+    def _run_partition(self, frame, name):
+        if frame.future.done():
+            return  # an earlier partition of this frame failed
+        try:
+            p = self.partitions[name]
+            feeds = {t: frame.tensors[t] for t in p['inputs']}
+            with self.part_locks[name]:
+                start = time.perf_counter()
+                out = self.backends[name].run(feeds)
+                self.times[name] += time.perf_counter() - start
+                self.runs[name] += 1
+        except Exception as e:
+            # Parallel partitions of one frame can both fail: the first error wins
+            with frame.lock:
+                if not frame.future.done():
+                    frame.future.set_exception(e)
+                    return
+            print(f"WARNING: partition {name} also failed on an already failed frame: {e!r}")
+            return
+
+        ready = []
+        with frame.lock:
+            frame.tensors.update(out)
+            frame.remaining -= 1
+            for c in self.consumers[name]:
+                frame.pending[c] -= 1
+                if frame.pending[c] == 0:
+                    ready.append(c)
+            finished = frame.remaining == 0
+        for c in ready:
+            self.pool.submit(self._run_partition, frame, c)
+        if finished:
+            frame.future.set_result({t: frame.tensors[t] for t in self.plan['outputs']})
+
+    def run(self, feeds):
+        return self.submit(feeds).result()
+
+    def run_stream(self, frames):
+        """Pipeline an iterable of feed dicts; yields outputs in frame order."""
+        queue = []
+        for feeds in frames:
+            queue.append(self.submit(feeds))
+            while queue and queue[0].done():
+                yield queue.pop(0).result()
+        for fut in queue:
+            yield fut.result()
+
+    def report(self):
+        print(f"{'partition':<12} {'device':<6} {'runs':>5} {'avg ms':>9}")
+        for name, p in self.partitions.items():
+            runs = self.runs[name]
+            avg = 1000 * self.times[name] / runs if runs else 0.0
+            print(f"{name:<12} {p['device']:<6} {runs:>5} {avg:>9.2f}")
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for b in self.backends.values():
+            b.close()
+
+
+def main():
+    if os.path.exists(PLAN_FILE):
+        print(f"Loading partition plan {PLAN_FILE}...")
+        plan = load_plan(PLAN_FILE)
+    else:
+        print(f"Planning partitions for {FROZEN_GRAPH}...")
+        plan = plan_partitions(load_graph_def(FROZEN_GRAPH))
+        plan['source'] = FROZEN_GRAPH
+        save_plan(plan)
+        print(f"Saved plan to {PLAN_FILE}")
+
+    dpu = [p for p in plan['partitions'] if p['device'] == 'dpu']
+    cpu = [p for p in plan['partitions'] if p['device'] == 'cpu']
+    print(f"{len(dpu)} DPU partitions, {len(cpu)} CPU islands")
+
+    runtime = SplitRuntime(plan, dpu_backend=SimulatedDpuBackend)
+    pre = Preprocessor()
+    files = list_images(IMG_DIR, limit=20)
+    input_tensor = plan['inputs'][0]
+
+    def frames():
+        for path in files:
+            pre.load_file(path)
+            # The runtime holds the frame until it finishes; give it its own copy
+            yield {input_tensor: pre.batch.copy()}
+
+    start = time.perf_counter()
+    results = list(runtime.run_stream(frames()))
+    elapsed = time.perf_counter() - start
+
+    print("\n" + "=" * 70)
+    print(f"Ran {len(results)} frames in {elapsed:.2f}s ({len(results) / elapsed:.2f} FPS)")
+    print("=" * 70)
+    for key, value in results[-1].items():
+        print(f"Output '{key}': Shape {value.shape}")
+    print()
+    runtime.report()
+    runtime.close()
+
+
+if __name__ == "__main__":
+    main()
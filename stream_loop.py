@@ -0,0 +1,219 @@
+import argparse
+import gc
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from postprocess import decode_yolo
+from preprocess import Preprocessor, list_images
+
+# Steady-state streaming loop: the network input batches live in a fixed ring
+# allocated up front and the graph runs through one Session callable, so no
+# per-frame feed or fetch resolution happens. The Session still returns a
+# fresh output array each frame (TF owns that buffer); it is used directly.
+# Reports Python allocated-block deltas (which do not see NumPy/TF data
+# buffers) and GC pauses next to the latency percentiles so jitter can be
+# traced to its cause.
+
+# --- CONFIG ---
+FROZEN_GRAPH = "frozen_yolo.pb"
+INPUT_TENSOR = "images:0"
+OUTPUT_TENSOR = "Identity:0"
+IMG_DIR      = "calib_dataset"
+RING_SLOTS   = 3          # frames in flight between capture and post-processing
+WARMUP       = 10
+WINDOW_S     = 60.0       # p99 reported per window to show drift over long runs
+
+
+class TensorRing:
+    """
+    RING_SLOTS preallocated input batches. A producer fills free slots, the
+    consumer runs inference on the slot and hands it back.
+    """
+
+    def __init__(self, slots, input_shape, dtype=np.float32):
+        _, h, w, _ = input_shape
+        self.pre = [Preprocessor(batch_size=input_shape[0], height=h, width=w, dtype=dtype)
+                    for _ in range(slots)]
+        self.info = [None] * slots
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        for i in range(slots):
+            self.free.put(i)
+
+    def input(self, slot):
+        return self.pre[slot].batch
+
+
+class GcMonitor:
+    """Counts collections and their pause times through gc.callbacks."""
+
+    def __init__(self):
+        self.pauses = []
+        self._start = None
+        gc.callbacks.append(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses.append((info['generation'], time.perf_counter() - self._start))
+            self._start = None
+
+    def close(self):
+        gc.callbacks.remove(self._callback)
+
+
+def _frame_source(source, limit):
+    """Camera index / video file, or the calibration images decoded once and looped."""
+    if source is None:
+        frames = [cv2.imread(f) for f in list_images(IMG_DIR, limit=limit or 16)]
+        i = 0
+        while True:
+            yield frames[i % len(frames)]
+            i += 1
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    # Reuse one capture buffer too
+    ok, frame = cap.read()
+    while ok:
+        yield frame
+        ok, frame = cap.read(frame)
+    cap.release()
+
+
+def _producer(ring, frames, stop):
+    for frame in frames:
+        if stop.is_set():
+            break
+        slot = ring.free.get()
+        ring.info[slot] = ring.pre[slot].load(frame, 0)
+        ring.ready.put((slot, time.perf_counter()))
+    ring.ready.put((None, None))
+
+
+def run_stream(graph_path=FROZEN_GRAPH, source=None, frames=None, seconds=None,
+               slots=RING_SLOTS, gc_mode="freeze", postprocess=True):
+    graph_def = load_graph(graph_path)
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.compat.v1.import_graph_def(graph_def, name='')
+    x = graph.get_tensor_by_name(INPUT_TENSOR)
+    y = graph.get_tensor_by_name(OUTPUT_TENSOR)
+    in_shape = x.shape.as_list()
+    if None in in_shape:
+        raise ValueError(f"Ring needs a static input shape, got {in_shape}")
+    if x.dtype != tf.float32:
+        raise ValueError(f"Graph input is {x.dtype.name}, the ring feeds float32 NHWC")
+
+    ring = TensorRing(slots, in_shape)
+    sess = tf.compat.v1.Session(graph=graph)
+    # One callable: no per-run fetch/feed resolution; the feed is the slot buffer itself
+    infer = sess.make_callable(y, feed_list=[x])
+
+    stop = threading.Event()
+    producer = threading.Thread(target=_producer,
+                                args=(ring, _frame_source(source, frames), stop), daemon=True)
+    producer.start()
+
+    latencies, blocks, windows = [], [], []
+    monitor = None
+    window_start, window_lat = None, []
+    n = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            slot, queued = ring.ready.get()
+            if slot is None:
+                break
+            before = sys.getallocatedblocks()
+            out = infer(ring.input(slot))
+            if postprocess:
+                decode_yolo(out)
+            done = time.perf_counter()
+            ring.free.put(slot)
+            n += 1
+
+            if n == WARMUP:
+                # Everything allocated so far is long-lived: take it out of the GC's view
+                if gc_mode == "freeze":
+                    gc.collect()
+                    gc.freeze()
+                elif gc_mode == "manual":
+                    gc.collect()
+                    gc.disable()
+                monitor = GcMonitor()
+                start = window_start = time.perf_counter()
+            elif n > WARMUP:
+                # Queue-to-result latency, for both the overall and the windowed percentiles
+                latencies.append(done - queued)
+                blocks.append(sys.getallocatedblocks() - before)
+                window_lat.append(done - queued)
+                if done - window_start >= WINDOW_S:
+                    windows.append(np.percentile(window_lat, 99) * 1000)
+                    window_start, window_lat = done, []
+                if gc_mode == "manual" and n % 1000 == 0:
+                    gc.collect(0)
+
+            if (frames and n >= frames + WARMUP) or (seconds and n > WARMUP
+                                                    and done - start >= seconds):
+                break
+    finally:
+        stop.set()
+        if monitor is not None:
+            monitor.close()
+        if gc_mode == "manual":
+            gc.enable()
+        sess.close()
+
+    elapsed = time.perf_counter() - start
+    report = {'frames': len(latencies), 'fps': len(latencies) / elapsed if elapsed else 0.0,
+              'windows_p99_ms': windows}
+    if latencies:
+        lat = np.array(latencies) * 1000
+        report.update({f"p{p}_ms": float(np.percentile(lat, p)) for p in (50, 90, 99)})
+        report['max_ms'] = float(lat.max())
+        report['blocks_per_frame'] = float(np.mean(blocks))
+        report['blocks_max'] = int(np.max(blocks))
+    pauses = monitor.pauses if monitor else []
+    report['gc_collections'] = len(pauses)
+    report['gc_pause_total_ms'] = sum(p for _, p in pauses) * 1000
+    report['gc_pause_max_ms'] = max((p for _, p in pauses), default=0.0) * 1000
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preallocated-input streaming inference loop")
+    parser.add_argument("--graph", default=FROZEN_GRAPH)
+    parser.add_argument("--source", help="camera index or video file (default: calib images)")
+    parser.add_argument("--frames", type=int)
+    parser.add_argument("--seconds", type=float)
+    parser.add_argument("--slots", type=int, default=RING_SLOTS)
+    parser.add_argument("--gc", choices=["default", "freeze", "manual"], default="freeze")
+    parser.add_argument("--no-post", action="store_true", help="skip decode/NMS")
+    args = parser.parse_args()
+    if not args.frames and not args.seconds and args.source is None:
+        args.frames = 500
+
+    r = run_stream(args.graph, args.source, args.frames, args.seconds, args.slots, args.gc,
+                   not args.no_post)
+    print("=" * 70)
+    print(f"{r['frames']} frames, {r['fps']:.1f} FPS (ring of {args.slots}, gc={args.gc})")
+    print("=" * 70)
+    if r['frames']:
+        print(f"Latency ms: p50 {r['p50_ms']:.2f}, p90 {r['p90_ms']:.2f}, "
+              f"p99 {r['p99_ms']:.2f}, max {r['max_ms']:.2f}")
+        print(f"Python blocks per frame (NumPy/TF buffers not counted): mean {r['blocks_per_frame']:.1f}, max {r['blocks_max']}")
+    print(f"GC: {r['gc_collections']} collections, {r['gc_pause_total_ms']:.2f} ms total, "
+          f"max pause {r['gc_pause_max_ms']:.2f} ms")
+    if r['windows_p99_ms']:
+        print("p99 per window (ms): " + ", ".join(f"{v:.2f}" for v in r['windows_p99_ms']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework import graph_util
+
+from attention_rewrite import rewrite_attention
+from const_store import load_graph, save_graph
+from cut_explorer import enumerate_cuts
+from dpu_latency import estimate, target_config
+from graph_diff import diff_graphs
+from graph_stats import flop_profile
+from memory_planner import plan_arena
+from numpy_executor import NumpyGraph
+from remove_split_concat import lower_split_concat
+from resize_lowering import LOWERINGS, lower_upsampling
+from rewrite_utils import compare_graphs, run_graph, save_graph_def
+from silu_substitute import build_policy, find_silu, substitute
+from split_runtime import plan_partitions
+from transpose_sinking import sink_transposes
+
+# Parameterized YOLO-style micro-graphs (replacing the hand-written test_*.pb
+# builders in find_culprit.py / debug_quantize.py) and a regression runner
+# that pushes every graph pass and analyser through them with time budgets.
+
+# --- CONFIG ---
+CORPUS_DIR       = "synthetic_corpus"
+BASELINE_FILE    = os.path.join(CORPUS_DIR, "baseline.json")
+WORKERS          = 4
+REGRESSION_RATIO = 1.5     # slower than baseline by more than this -> regression
+INPUT_NAME       = "images"
+OUTPUT_NAME      = "output"
+
+# size: input H = W; width: stem channels; depth: downsampling stages;
+# c2f: bottlenecks per C2f; attn / upsample / dfl: include that block
+GraphSpec = namedtuple("GraphSpec", ["name", "size", "width", "depth", "c2f", "attn",
+                                     "upsample", "dfl", "seed"])
+
+CORPUS = [
+    GraphSpec("conv_only",       64,  8, 2, 0, False, False, False, 0),
+    GraphSpec("c2f_small",       64,  8, 2, 1, False, False, False, 1),
+    GraphSpec("c2f_deep",        128, 16, 3, 3, False, False, False, 2),
+    GraphSpec("attn_small",      64,  16, 2, 1, True,  False, False, 3),
+    GraphSpec("neck",            128, 8, 3, 1, False, True,  False, 4),
+    GraphSpec("dfl_head",        64,  8, 2, 1, False, False, True,  5),
+    GraphSpec("yolo_mini",       128, 16, 3, 2, True,  True,  True,  6),
+    GraphSpec("yolo_640",        640, 16, 4, 1, True,  True,  True,  7),
+]
+
+# check -> (base seconds, seconds per 1000 nodes)
+BUDGETS = {
+    'flop_profile':        (1.0, 2.0),
+    'topology_hash':       (1.0, 2.0),
+    'numpy_executor':      (5.0, 10.0),
+    'attention_rewrite':   (5.0, 10.0),
+    'split_concat':        (5.0, 10.0),
+    'partition_plan':      (2.0, 5.0),
+    'cut_enumeration':     (2.0, 10.0),
+    'const_store':         (2.0, 5.0),
+    'transpose_sinking':   (5.0, 10.0),
+    'silu_substitute':     (5.0, 10.0),
+    'resize_lowering':     (5.0, 10.0),
+    'memory_planner':      (5.0, 10.0),
+    'dpu_latency':         (2.0, 5.0),
+}
+
+
+# ----------------------------------------------------------------------------
+# Blocks
+# ----------------------------------------------------------------------------
+
+class _Builder:
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def weight(self, shape, fan_in):
+        return tf.constant(self.rng.standard_normal(shape).astype(np.float32) / np.sqrt(fan_in))
+
+    def conv(self, x, cout, k=1, stride=1):
+        cin = x.shape[-1]
+        y = tf.nn.conv2d(x, self.weight((k, k, cin, cout), k * k * cin),
+                         strides=[1, stride, stride, 1], padding='SAME')
+        return tf.nn.bias_add(y, self.weight((cout,), 1) * 0.1)
+
+    def conv_silu(self, x, cout, k=3, stride=1):
+        y = self.conv(x, cout, k, stride)
+        return y * tf.sigmoid(y)
+
+    def c2f(self, x, n):
+        """Ultralytics C2f: 1x1 conv, channel split, n bottlenecks, concat, 1x1 conv."""
+        c = x.shape[-1]
+        a, b = tf.split(self.conv_silu(x, c, 1), 2, axis=3)
+        outs = [a, b]
+        for _ in range(n):
+            outs.append(outs[-1] + self.conv_silu(self.conv_silu(outs[-1], c // 2), c // 2))
+        return self.conv_silu(tf.concat(outs, axis=3), c, 1)
+
+    def area_attn(self, x, areas=2, heads=2):
+        """YOLO12 area attention: rows split into areas, multi-head attention inside each."""
+        _, h, w, c = x.shape.as_list()
+        areas = areas if h % areas == 0 else 1
+        d = c // heads
+        q, k, v = tf.split(self.conv(x, 3 * c), 3, axis=3)
+
+        def heads_first(t):
+            return tf.transpose(tf.reshape(t, [areas, h * w // areas, heads, d]), [0, 2, 1, 3])
+
+        q, k, v = heads_first(q), heads_first(k), heads_first(v)
+        attn = tf.nn.softmax(tf.matmul(q, k, transpose_b=True) * (d ** -0.5))
+        out = tf.reshape(tf.transpose(tf.matmul(attn, v), [0, 2, 1, 3]), [1, h, w, c])
+        return x + self.conv(out, c)
+
+    def upsample_concat(self, x, skip):
+        _, h, w, _ = x.shape.as_list()
+        up = tf.compat.v1.image.resize_nearest_neighbor(x, [2 * h, 2 * w])
+        return tf.concat([up, skip], axis=3)
+
+    def dfl_head(self, x, reg_max=16, nc=4):
+        """Box distribution (softmax over reg_max bins, expectation) + class sigmoid -> (1, 4+nc, N)."""
+        _, h, w, _ = x.shape.as_list()
+        n = h * w
+        box = tf.nn.softmax(tf.reshape(self.conv(x, 4 * reg_max), [n * 4, reg_max]))
+        box = tf.reshape(tf.matmul(box, tf.constant(np.arange(reg_max, dtype=np.float32)[:, None])),
+                         [1, n, 4])
+        cls = tf.sigmoid(tf.reshape(self.conv(x, nc), [1, n, nc]))
+        return tf.transpose(tf.concat([box, cls], axis=2), [0, 2, 1])
+
+
+def build_graph(spec):
+    """Frozen GraphDef for one spec (weights are Consts, so nothing to freeze)."""
+    b = _Builder(spec.seed)
+    graph = tf.Graph()
+    with graph.as_default():
+        x = tf.compat.v1.placeholder(tf.float32, [1, spec.size, spec.size, 3], name=INPUT_NAME)
+        y = b.conv_silu(x, spec.width, 3, 2)
+        features = []
+        for i in range(spec.depth):
+            y = b.conv_silu(y, spec.width * 2 ** (i + 1), 3, 2)
+            if spec.c2f:
+                y = b.c2f(y, spec.c2f)
+            features.append(y)
+        if spec.attn:
+            y = b.area_attn(y)
+        if spec.upsample and len(features) > 1:
+            y = b.c2f(b.upsample_concat(y, features[-2]), max(spec.c2f, 1))
+        if spec.dfl:
+            y = b.dfl_head(y)
+        tf.identity(y, name=OUTPUT_NAME)
+    return graph_util.extract_sub_graph(graph.as_graph_def(), [OUTPUT_NAME])
+
+
+def _build_worker(args):
+    spec, out_dir = args
+    start = time.perf_counter()
+    graph_def = build_graph(spec)
+    path = os.path.join(out_dir, spec.name + ".pb")
+    save_graph_def(graph_def, path, store_dir=None)
+    return spec.name, path, len(graph_def.node), time.perf_counter() - start
+
+
+def build_corpus(specs=CORPUS, out_dir=CORPUS_DIR, workers=WORKERS):
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_build_worker, [(s, out_dir) for s in specs]))
+    for name, path, nodes, secs in results:
+        print(f"  {name:<14} {nodes:5d} nodes  {secs:6.2f}s  {path}")
+    return [path for _, path, _, _ in results]
+
+
+# ----------------------------------------------------------------------------
+# Checks: each raises (or returns a failure string) on a wrong result
+# ----------------------------------------------------------------------------
+
+def _feeds(graph_def, seed=0):
+    x = next(n for n in graph_def.node if n.op == 'Placeholder')
+    shape = [d.size for d in x.attr['shape'].shape.dim]
+    return [{x.name + ":0": np.random.default_rng(seed).random(shape, dtype=np.float32)}]
+
+
+def _equivalent(old, new, feeds):
+    bad = [r for r in compare_graphs(old, new, [OUTPUT_NAME + ":0"], feeds, atol=1e-3, rtol=1e-3)
+           if not r['ok']]
+    return f"outputs differ (max abs {bad[0]['max_abs']:.3g})" if bad else None
+
+
+def check_flop_profile(graph_def, feeds, workdir):
+    flops, _ = flop_profile(graph_def)
+    return None if sum(flops.values()) > 0 else "zero FLOPs"
+
+
+def check_topology_hash(graph_def, feeds, workdir):
+    diff = diff_graphs(graph_def, graph_def)
+    changed = [k for k in ('added', 'removed', 'renamed', 'rewired') if diff[k]]
+    return f"self-diff not empty: {changed}" if changed else None
+
+
+def check_numpy_executor(graph_def, feeds, workdir):
+    expected = run_graph(graph_def, feeds, [OUTPUT_NAME + ":0"])[0][0]
+    got = NumpyGraph(graph_def, [OUTPUT_NAME + ":0"]).run(
+        {k.split(':')[0]: v for k, v in feeds[0].items()})[OUTPUT_NAME + ":0"]
+    err = float(np.abs(got - expected).max())
+    return None if np.allclose(got, expected, atol=1e-3, rtol=1e-3) else f"max abs {err:.3g}"
+
+
+def check_attention_rewrite(graph_def, feeds, workdir):
+    rewritten, _ = rewrite_attention(graph_def)
+    return _equivalent(graph_def, rewritten, feeds)
+
+
+def check_split_concat(graph_def, feeds, workdir):
+    lowered, _ = lower_split_concat(graph_def, [OUTPUT_NAME])
+    return _equivalent(graph_def, lowered, feeds)
+
+
+def check_partition_plan(graph_def, feeds, workdir):
+    plan = plan_partitions(graph_def, [INPUT_NAME], [OUTPUT_NAME], plan_dir=workdir)
+    return None if plan['partitions'] else "no partitions"
+
+
+def check_cut_enumeration(graph_def, feeds, workdir):
+    flops, shapes = flop_profile(graph_def)
+    cuts, _ = enumerate_cuts(graph_def, flops, shapes)
+    return None if cuts else "no cut sets"
+
+
+def check_const_store(graph_def, feeds, workdir):
+    path = os.path.join(workdir, "graph.pb")
+    save_graph(graph_def, path, store_dir=os.path.join(workdir, "store"))
+    return _equivalent(graph_def, load_graph(path, store_dir=os.path.join(workdir, "store")), feeds)
+
+
+def check_transpose_sinking(graph_def, feeds, workdir):
+    sunk, _ = sink_transposes(graph_def, [OUTPUT_NAME + ":0"])
+    return _equivalent(graph_def, sunk, feeds)
+
+
+def check_silu_substitute(graph_def, feeds, workdir):
+    """hard-swish only approximates SiLU: every pattern must go and the output stay close."""
+    silus = find_silu(graph_def)
+    swapped = substitute(graph_def, build_policy(silus, "hswish"), [OUTPUT_NAME])
+    left = find_silu(swapped)
+    if left:
+        return f"{len(left)}/{len(silus)} SiLU left"
+    ref = run_graph(graph_def, feeds, [OUTPUT_NAME + ":0"])[0][0]
+    out = run_graph(swapped, feeds, [OUTPUT_NAME + ":0"])[0][0]
+    if out.shape != ref.shape or not np.isfinite(out).all():
+        return f"output {out.shape}, expected finite {ref.shape}"
+    return None
+
+
+def check_resize_lowering(graph_def, feeds, workdir):
+    """Every lowering must reproduce each upsample and the output bit for bit."""
+    for mode in LOWERINGS:
+        lowered_def, lowered = lower_upsampling(graph_def, mode, [OUTPUT_NAME])
+        fetches = [name + ":0" for name in lowered] + [OUTPUT_NAME + ":0"]
+        bad = [r for r in compare_graphs(graph_def, lowered_def, fetches, feeds, atol=0.0, rtol=0.0)
+               if not r['ok']]
+        if bad:
+            return f"{mode}: {bad[0]['tensor']} not bit-exact (max abs {bad[0]['max_abs']:.3g})"
+    return None
+
+
+def check_memory_planner(graph_def, feeds, workdir):
+    """Arena execution must give exactly the heap result, in no more than the no-reuse size."""
+    outputs = [OUTPUT_NAME + ":0"]
+    plan = plan_arena(graph_def, outputs)
+    if plan['size'] > plan['no_reuse_bytes'] + plan['alignment'] * len(plan['tensors']):
+        return f"arena {plan['size']} B exceeds no-reuse {plan['no_reuse_bytes']} B"
+    feed = {k.split(':')[0]: v for k, v in feeds[0].items()}
+    heap = NumpyGraph(graph_def, outputs).run(feed)[outputs[0]]
+    arena = NumpyGraph(graph_def, outputs, arena_plan=plan).run(feed)[outputs[0]]
+    if not np.array_equal(heap, arena):
+        return f"arena output differs (max abs {float(np.abs(heap - arena).max()):.3g})"
+    return None
+
+
+def check_dpu_latency(graph_def, feeds, workdir):
+    est = estimate(graph_def, target_config("B2304"))
+    if not est['layers'] or not np.isfinite(est['total_ms']) or est['total_ms'] <= 0:
+        return f"{len(est['layers'])} DPU layers, total {est['total_ms']} ms"
+    parts = est['dpu_ms'] + est['cpu_ms'] + est['transfer_ms'] + est['call_ms']
+    return None if np.isclose(parts, est['total_ms']) else "breakdown doesn't sum to the total"
+
+
+CHECKS = {
+    'flop_profile': check_flop_profile,
+    'topology_hash': check_topology_hash,
+    'numpy_executor': check_numpy_executor,
+    'attention_rewrite': check_attention_rewrite,
+    'split_concat': check_split_concat,
+    'partition_plan': check_partition_plan,
+    'cut_enumeration': check_cut_enumeration,
+    'const_store': check_const_store,
+    'transpose_sinking': check_transpose_sinking,
+    'silu_substitute': check_silu_substitute,
+    'resize_lowering': check_resize_lowering,
+    'memory_planner': check_memory_planner,
+    'dpu_latency': check_dpu_latency,
+}
+
+
+def run_suite(paths, checks=CHECKS, baseline=None, ratio=REGRESSION_RATIO):
+    """
+    Every check on every graph. Runs serially so the timings aren't skewed by
+    other checks competing for cores. Returns (results, failures).
+    """
+    baseline = baseline or {}
+    results, failures = {}, []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        graph_def = load_graph(path)
+        feeds = _feeds(graph_def)
+        print(f"\n{name} ({len(graph_def.node)} nodes)")
+        for check, fn in checks.items():
+            base_s, per_k = BUDGETS[check]
+            budget = base_s + per_k * len(graph_def.node) / 1000
+            key = f"{name}/{check}"
+            with tempfile.TemporaryDirectory() as workdir:
+                start = time.perf_counter()
+                try:
+                    error = fn(graph_def, feeds, workdir)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                secs = time.perf_counter() - start
+            results[key] = secs
+            problems = [error] if error else []
+            if secs > budget:
+                problems.append(f"over budget ({budget:.1f}s)")
+            if key in baseline and secs > baseline[key] * ratio and secs > 0.05:
+                problems.append(f"regressed from {baseline[key]:.2f}s")
+            status = "FAIL" if problems else "ok  "
+            print(f"  [{status}] {check:<18} {secs:7.2f}s  {'; '.join(problems)}")
+            if problems:
+                failures.append((key, problems))
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic YOLO graph corpus and tooling regression suite")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--workers", type=int, default=WORKERS)
+    r = sub.add_parser("run")
+    r.add_argument("--check", action="append", choices=sorted(CHECKS), help="only these checks")
+    r.add_argument("--graph", action="append", help="only these corpus graphs (by name)")
+    r.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        print(f"Building {len(CORPUS)} graphs on {args.workers} workers...")
+        build_corpus(workers=args.workers)
+        return
+
+    names = args.graph or [s.name for s in CORPUS]
+    paths = [os.path.join(CORPUS_DIR, n + ".pb") for n in names]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        print(f"Missing {missing} - run 'build' first")
+        sys.exit(1)
+    checks = {k: CHECKS[k] for k in (args.check or CHECKS)}
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+
+    results, failures = run_suite(paths, checks, baseline)
+
+    print("\n" + "=" * 70)
+    print(f"{len(results) - len(failures)}/{len(results)} checks passed")
+    print("=" * 70)
+    for key, problems in failures:
+        print(f"  {key}: {'; '.join(problems)}")
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {BASELINE_FILE}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,5 @@
-import tensorflow as tf
-import cv2
-import numpy as np
-import os
+from preprocess import Preprocessor, list_images
+from warm_start import run_job
 
 # --- CONFIG ---
 MODEL_PATH = "yolo12_tf_fixed"
@@ -9,39 +7,32 @@ IMG_DIR    = "calib_dataset"
 INPUT_SIZE = 640
 
 def main():
-    print(f"Loading model from {MODEL_PATH}...")
-    try:
-        model = tf.saved_model.load(MODEL_PATH)
-        inference_func = model.signatures["serving_default"]
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        return
-
-    # Get input tensor name (usually 'images' or 'input')
-    input_tensor_name = list(inference_func.structured_input_signature[1].keys())[0]
-    print(f"Model expects input named: '{input_tensor_name}'")
+    # Loads the model here unless a warm_start.py worker already has it traced
+    print(f"Model: {MODEL_PATH}")
 
     # Load one image
-    img_files = [f for f in os.listdir(IMG_DIR) if f.lower().endswith(('.jpg', '.png'))]
+    img_files = list_images(IMG_DIR)
     if not img_files:
         print("No images found in calib_dataset!")
         return
     
-    img_path = os.path.join(IMG_DIR, img_files[0])
+    img_path = img_files[0]
     print(f"Testing with image: {img_path}")
 
-    # Preprocess (Standard YOLO: Resize -> RGB -> Norm -> NHWC)
+    # Preprocess (Standard YOLO: Letterbox -> RGB -> Norm -> NHWC)
     # Note: onnx2tf converts models to NHWC (height, width, channel)
-    img = cv2.imread(img_path)
-    img = cv2.resize(img, (INPUT_SIZE, INPUT_SIZE))
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img = img.astype(np.float32) / 255.0
-    img = np.expand_dims(img, 0) # Add batch dim -> (1, 640, 640, 3)
+    pre = Preprocessor(batch_size=1, height=INPUT_SIZE, width=INPUT_SIZE)
+    info = pre.load_file(img_path)
+    img = pre.batch # (1, 640, 640, 3)
+    print(f"Letterbox: scale {info.scale_x:.3f}, pad ({info.pad_x}, {info.pad_y})")
 
     # Run Inference
     print("Running inference...")
-    input_tensor = tf.convert_to_tensor(img)
-    output = inference_func(**{input_tensor_name: input_tensor})
+    try:
+        output = run_job('infer', model_dir=MODEL_PATH, batch=img)
+    except Exception as e:
+        print(f"Error running model: {e}")
+        return
 
     # Print Result Keys and Shapes
     print("\n--- SUCCESS ---")
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from input_fn import calib_input, input_node_name
+from mixed_precision import sqnr_db
+from rewrite_utils import run_graph
+from split_runtime import FROZEN_GRAPH, PLAN_FILE, TFLITE_DIR, load_graph_def, load_plan
+from tflite_runner import save_feeds
+
+# CPU islands of a partition plan as TFLite models for the board's A53s,
+# where a full TF install is too heavy. int8 is calibrated on the tensors the
+# partition actually receives: the calib_dataset images (same loader as
+# vai_q) are run through the full frozen graph up to the partition inputs.
+
+# --- CONFIG ---
+CALIB_STEPS = 32
+BENCH_RUNS  = 50
+MODES       = ("fp32", "fp16", "int8")
+
+
+def _array_name(tensor):
+    """'node:0' -> 'node', 'node:1' stays: the naming TFLiteConverter expects."""
+    return tensor[:-2] if tensor.endswith(":0") else tensor
+
+
+def partition_feeds(plan, partition, steps=CALIB_STEPS, source=None):
+    """[{partition input tensor: ndarray}] for `steps` calibration images."""
+    graph_def = load_graph_def(source or plan.get('source', FROZEN_GRAPH))
+    fetches = list(partition['inputs'])
+    feeds = [{input_node_name + ":0": calib_input(i)[input_node_name].copy()} for i in range(steps)]
+    return [dict(zip(fetches, values)) for values in run_graph(graph_def, feeds, fetches)]
+
+
+def convert(partition, mode, feeds):
+    """Partition .pb -> TFLite flatbuffer bytes."""
+    ph_order = list(partition['inputs'].values())
+    shapes = {ph: list(feeds[0][t].shape) for t, ph in partition['inputs'].items()}
+    converter = tf.compat.v1.lite.TFLiteConverter.from_frozen_graph(
+        partition['graph'], ph_order, [_array_name(t) for t in partition['outputs']], shapes)
+    if mode == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        tensors = list(partition['inputs'])
+
+        def representative():
+            for f in feeds:
+                yield [f[t].astype(np.float32) for t in tensors]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative
+        # int8 kernels wherever TFLite has them, float builtins for the rest
+        # (no Flex ops: the board has no TF to run them); float in/out interface
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+                                               tf.lite.OpsSet.TFLITE_BUILTINS]
+    return converter.convert()
+
+
+def export(plan, names, modes, steps, out_dir=TFLITE_DIR, source=None):
+    os.makedirs(out_dir, exist_ok=True)
+    for p in plan['partitions']:
+        if p['name'] not in names:
+            continue
+        print(f"\n{p['name']}: {p['nodes']} nodes, {len(p['inputs'])} in / {len(p['outputs'])} out")
+        feeds = partition_feeds(plan, p, steps, source)
+        for mode in modes:
+            start = time.perf_counter()
+            try:
+                model = convert(p, mode, feeds)
+            except Exception as e:
+                print(f"  [{mode}] FAILED: {e}")
+                continue
+            path = os.path.join(out_dir, f"{p['name']}_{mode}.tflite")
+            with open(path, "wb") as f:
+                f.write(model)
+            print(f"  [{mode}] {len(model) / 2 ** 20:.2f} MB in {time.perf_counter() - start:.1f}s -> {path}")
+
+
+# ----------------------------------------------------------------------------
+# Benchmark: each runtime in a fresh `python tflite_runner.py` process. Not a
+# multiprocessing child - spawn would re-import this module, and TF with it,
+# into every worker, hiding what the TFLite runtime alone costs.
+# ----------------------------------------------------------------------------
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tflite_runner.py")
+
+
+def _bench_runtime(partition, runtime, feeds, runs, out_dir):
+    with tempfile.TemporaryDirectory() as tmp:
+        part_path = os.path.join(tmp, "partition.json")
+        with open(part_path, "w") as f:
+            json.dump(partition, f)
+        feeds_path = os.path.join(tmp, "feeds.npz")
+        save_feeds(feeds_path, partition, feeds)
+        out_path = os.path.join(tmp, "out.npz")
+        subprocess.run([sys.executable, RUNNER, part_path, runtime, feeds_path, out_path,
+                        "--runs", str(runs), "--tflite-dir", out_dir], check=True)
+        with open(out_path + ".json") as f:
+            result = json.load(f)
+        data = np.load(out_path)
+        result['outputs'] = [[data[f"o{i}_{j}"] for j in range(len(partition['outputs']))]
+                             for i in range(result.pop('feeds'))]
+    return result
+
+
+def bench(plan, names, modes, runs, out_dir=TFLITE_DIR, source=None):
+    for p in plan['partitions']:
+        if p['name'] not in names:
+            continue
+        feeds = partition_feeds(plan, p, 4, source)
+        runtimes = ["tf"] + [m for m in modes
+                             if os.path.exists(os.path.join(out_dir, f"{p['name']}_{m}.tflite"))]
+        results = {rt: _bench_runtime(p, rt, feeds, runs, out_dir) for rt in runtimes}
+
+        print("\n" + "=" * 70)
+        print(f"{p['name']} ({p['nodes']} nodes)")
+        print("=" * 70)
+        print(f"  {'runtime':<8} {'module':<15} {'p50 ms':>8} {'p90 ms':>8} {'load MB':>8} "
+              f"{'peak MB':>8} {'RSS MB':>8} {'SQNR dB':>8}")
+        ref = results['tf']['outputs']
+        for rt, r in results.items():
+            sqnr = "ref" if rt == "tf" else f"{sqnr_db(ref, r['outputs']):.1f}"
+            print(f"  {rt:<8} {r['module']:<15} {r['p50_ms']:8.2f} {r['p90_ms']:8.2f} "
+                  f"{r['load_mb']:8.1f} {r['peak_mb']:8.1f} {r['peak_abs_mb']:8.1f} {sqnr:>8}")
+        print("  load/peak MB: over the bare interpreter with numpy; RSS MB: absolute process peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export CPU partitions to TFLite and benchmark runtimes")
+    parser.add_argument("cmd", choices=["export", "bench"])
+    parser.add_argument("--plan", default=PLAN_FILE)
+    parser.add_argument("--graph", help="frozen graph the plan was cut from (default: the plan's source)")
+    parser.add_argument("--partitions", nargs="*", help="default: every CPU partition")
+    parser.add_argument("--modes", nargs="*", choices=MODES, default=["fp32", "int8"])
+    parser.add_argument("--steps", type=int, default=CALIB_STEPS, help="export: calibration images")
+    parser.add_argument("--runs", type=int, default=BENCH_RUNS, help="bench: timed runs per runtime")
+    parser.add_argument("--out-dir", default=TFLITE_DIR)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.plan):
+        print(f"ERROR: No partition plan at {args.plan} - run split_runtime.py first.")
+        return
+    plan = load_plan(args.plan)
+    names = args.partitions or [p['name'] for p in plan['partitions'] if p['device'] == 'cpu']
+    print(f"Partitions: {', '.join(names)}")
+
+    if args.cmd == "export":
+        export(plan, names, args.modes, args.steps, args.out_dir, args.graph)
+    else:
+        bench(plan, names, args.modes, args.runs, args.out_dir, args.graph)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+
+# TFLite execution with nothing but numpy and tflite_runtime imported, so a
+# process that only runs exported partitions never pays for TensorFlow.
+# Full TF's interpreter is the fallback off the board. Also the benchmark
+# worker tflite_export.py starts as a fresh `python tflite_runner.py` process
+# per runtime, so each peak RSS includes exactly that runtime's imports.
+
+# --- CONFIG ---
+CPU_THREADS = 4       # interpreter threads: the four A53 cores
+WARMUP      = 5
+
+
+def tflite_interpreter(path, threads=CPU_THREADS):
+    """tflite_runtime when installed (the board), full TF's interpreter otherwise."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    interp = Interpreter(model_path=path, num_threads=threads)
+    interp.allocate_tensors()
+    return interp
+
+
+class TFLiteRunner:
+    """One exported partition: run({tensor: ndarray}) -> {tensor: ndarray}."""
+
+    def __init__(self, path, inputs, outputs, threads=CPU_THREADS):
+        self.outputs = outputs
+        self.interp = tflite_interpreter(path, threads)
+        by_name = {d['name']: d for d in self.interp.get_input_details()}
+        self.in_details = {t: by_name[ph] for t, ph in inputs.items()}
+        # Outputs keep the order they were exported in
+        self.out_index = [d['index'] for d in self.interp.get_output_details()]
+
+    def run(self, feeds):
+        for t, d in self.in_details.items():
+            self.interp.set_tensor(d['index'], np.asarray(feeds[t], d['dtype']))
+        self.interp.invoke()
+        return {t: self.interp.get_tensor(i) for t, i in zip(self.outputs, self.out_index)}
+
+
+# ----------------------------------------------------------------------------
+# Benchmark worker
+# ----------------------------------------------------------------------------
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_worker(partition, runtime, feeds, runs, tflite_dir):
+    """
+    Timings and memory for one runtime. base_mb is this process before any
+    runtime is imported, so load_mb includes importing TF or tflite_runtime.
+    """
+    base = _rss_mb()
+    if runtime == "tf":
+        from split_runtime import TFGraphBackend
+        backend = TFGraphBackend(partition)
+        run, close, module = backend.run, backend.close, "tensorflow"
+    else:
+        path = os.path.join(tflite_dir, f"{partition['name']}_{runtime}.tflite")
+        runner = TFLiteRunner(path, partition['inputs'], partition['outputs'])
+        run, close = runner.run, (lambda: None)
+        module = type(runner.interp).__module__.split('.')[0]
+    loaded = _rss_mb()
+    for i in range(WARMUP):
+        run(feeds[i % len(feeds)])
+    times, outs = [], []
+    for i in range(runs):
+        f = feeds[i % len(feeds)]
+        start = time.perf_counter()
+        out = run(f)
+        times.append(time.perf_counter() - start)
+        if i < len(feeds):
+            outs.append([out[t] for t in partition['outputs']])
+    close()
+    ms = np.array(times) * 1000
+    peak = _rss_mb()
+    return {'p50_ms': float(np.median(ms)), 'p90_ms': float(np.percentile(ms, 90)),
+            'module': module, 'base_mb': base, 'load_mb': loaded - base,
+            'peak_mb': peak - base, 'peak_abs_mb': peak, 'outputs': outs}
+
+
+def save_feeds(path, partition, feeds):
+    tensors = list(partition['inputs'])
+    np.savez(path, **{f"f{i}_{j}": f[t] for i, f in enumerate(feeds) for j, t in enumerate(tensors)})
+
+
+def load_feeds(path, partition):
+    tensors = list(partition['inputs'])
+    data = np.load(path)
+    count = len(data.files) // max(len(tensors), 1)
+    return [{t: data[f"f{i}_{j}"] for j, t in enumerate(tensors)} for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark one partition runtime in this process")
+    parser.add_argument("partition", help="partition entry of the plan, as a JSON file")
+    parser.add_argument("runtime", help="tf, or a TFLite mode (fp32, fp16, int8)")
+    parser.add_argument("feeds", help="npz written by save_feeds()")
+    parser.add_argument("out", help="npz for the outputs; the stats go to <out>.json")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--tflite-dir", default="tflite")
+    args = parser.parse_args()
+
+    with open(args.partition) as f:
+        partition = json.load(f)
+    result = bench_worker(partition, args.runtime, load_feeds(args.feeds, partition),
+                          args.runs, args.tflite_dir)
+    outs = result.pop('outputs')
+    np.savez(args.out, **{f"o{i}_{j}": o for i, out in enumerate(outs) for j, o in enumerate(out)})
+    with open(args.out + ".json", "w") as f:
+        json.dump(dict(result, feeds=len(outs)), f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import functools
+import time
+
+import cv2
+import numpy as np
+
+from inference_server import load_model
+from postprocess import IOU_THRES, batched_nms, decode_yolo, scale_detections
+from preprocess import INPUT_HEIGHT, INPUT_WIDTH, Preprocessor, list_images
+
+# High-resolution frames are cut into overlapping network-sized tiles at
+# native resolution instead of being shrunk to 640x640, so small objects keep
+# their pixels. Tiles go through the model in batches, detections are shifted
+# back to frame coordinates and merged with one class-aware NMS over all tiles.
+
+# --- CONFIG ---
+MODEL_PATH  = "yolo12_tf_fixed"
+IMG_DIR     = "calib_dataset"
+OVERLAP     = 0.2      # fraction of a tile shared with its neighbour
+TILE_BATCH  = 8        # used when the model's batch dimension is dynamic
+FULL_FRAME  = True     # also run the whole frame letterboxed, for objects larger than a tile
+EDGE_MARGIN = 2        # px; boxes this close to an inner tile edge are cut off and dropped
+GRID_CACHE  = 16       # distinct frame sizes whose TileGrid is kept
+
+
+def _axis_origins(length, tile, overlap):
+    """Tile starts along one axis: evenly spread, first at 0, last flush with the edge."""
+    if length <= tile:
+        return np.zeros(1, np.int64)
+    stride = tile * (1.0 - overlap)
+    count = int(np.ceil((length - tile) / stride)) + 1
+    return np.round(np.linspace(0, length - tile, count)).astype(np.int64)
+
+
+class TileGrid:
+    """Tile origins and sizes for one frame size; built once and reused for every frame."""
+
+    def __init__(self, frame_w, frame_h, tile_w=INPUT_WIDTH, tile_h=INPUT_HEIGHT, overlap=OVERLAP):
+        xs = _axis_origins(frame_w, tile_w, overlap)
+        ys = _axis_origins(frame_h, tile_h, overlap)
+        oy, ox = np.meshgrid(ys, xs, indexing='ij')
+        self.origins = np.stack([ox.ravel(), oy.ravel()], axis=1)          # (T, 2) x0, y0
+        self.sizes = np.array([min(tile_w, frame_w), min(tile_h, frame_h)])
+        self.frame_w, self.frame_h = frame_w, frame_h
+
+    @classmethod
+    @functools.lru_cache(maxsize=GRID_CACHE)
+    def get(cls, frame_w, frame_h, tile_w=INPUT_WIDTH, tile_h=INPUT_HEIGHT, overlap=OVERLAP):
+        return cls(frame_w, frame_h, tile_w, tile_h, overlap)
+
+    def __len__(self):
+        return len(self.origins)
+
+    def crop(self, frame, i):
+        (x0, y0), (w, h) = self.origins[i], self.sizes
+        return frame[y0:y0 + h, x0:x0 + w]
+
+    def inner_edge_mask(self, dets, i, margin=EDGE_MARGIN):
+        """
+        True for boxes (tile coords) that touch an edge of tile i that isn't a
+        frame edge. With enough overlap the neighbouring tile sees them whole.
+        """
+        (x0, y0), (w, h) = self.origins[i], self.sizes
+        cut = np.zeros(len(dets), bool)
+        if x0 > 0:
+            cut |= dets[:, 0] <= margin
+        if y0 > 0:
+            cut |= dets[:, 1] <= margin
+        if x0 + w < self.frame_w:
+            cut |= dets[:, 2] >= w - margin
+        if y0 + h < self.frame_h:
+            cut |= dets[:, 3] >= h - margin
+        return cut
+
+
+class TiledDetector:
+    """Tiles (plus optionally the full frame) -> batched model runs -> merged frame detections."""
+
+    def __init__(self, model_path=MODEL_PATH, overlap=OVERLAP, batch=TILE_BATCH,
+                 full_frame=FULL_FRAME, iou_thres=IOU_THRES):
+        self.run_model, static_batch = load_model(model_path)
+        self.batch = static_batch or batch
+        self.static = static_batch is not None
+        self.overlap = overlap
+        self.full_frame = full_frame
+        self.iou_thres = iou_thres
+        self.pre = Preprocessor(batch_size=self.batch)
+        self.tiles_run = 0
+
+    def _run(self, crops):
+        """Yields (detections in crop coords) for each crop, TILE_BATCH at a time."""
+        for start in range(0, len(crops), self.batch):
+            chunk = crops[start:start + self.batch]
+            infos = [self.pre.load(c, slot) for slot, c in enumerate(chunk)]
+            out = self.run_model(self.pre.batch if self.static else self.pre.batch[:len(chunk)])
+            self.tiles_run += len(chunk)
+            for i, info in enumerate(infos):
+                yield scale_detections(decode_yolo(out[i]), info)
+
+    def detect(self, frame):
+        h, w = frame.shape[:2]
+        grid = TileGrid.get(w, h, self.pre.width, self.pre.height, self.overlap)
+        crops = [grid.crop(frame, i) for i in range(len(grid))]
+        offsets = [grid.origins[i] for i in range(len(grid))]
+        if self.full_frame and len(grid) > 1:
+            crops.append(frame)
+            offsets.append(np.zeros(2, np.int64))
+
+        parts = []
+        for i, (dets, (x0, y0)) in enumerate(zip(self._run(crops), offsets)):
+            if i < len(grid) and len(grid) > 1:
+                dets = dets[~grid.inner_edge_mask(dets, i)]
+            if len(dets):
+                dets[:, 0:4:2] += x0
+                dets[:, 1:4:2] += y0
+                parts.append(dets)
+        if not parts:
+            return np.zeros((0, 6), np.float32)
+        dets = np.concatenate(parts)
+        keep = batched_nms(dets[:, :4], dets[:, 4], dets[:, 5].astype(np.int64), self.iou_thres)
+        return dets[keep]
+
+
+def _frames(source, limit):
+    if source is None:
+        for path in list_images(IMG_DIR, limit=limit):
+            yield cv2.imread(path)
+        return
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    n = 0
+    ok, frame = cap.read()
+    while ok and (limit is None or n < limit):
+        yield frame
+        n += 1
+        ok, frame = cap.read()
+    cap.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled inference for frames larger than the model input")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--source", help="video file or camera index (default: calib images)")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--overlap", type=float, default=OVERLAP)
+    parser.add_argument("--batch", type=int, default=TILE_BATCH)
+    parser.add_argument("--no-full-frame", action="store_true")
+    args = parser.parse_args()
+
+    det = TiledDetector(args.model, args.overlap, args.batch, not args.no_full_frame)
+    print(f"Model {args.model}, tile {det.pre.width}x{det.pre.height}, batch {det.batch}"
+          f"{' (fixed by the signature)' if det.static else ''}")
+
+    frames = pixels = boxes = 0
+    elapsed = 0.0
+    for frame in _frames(args.source, args.frames):
+        start = time.perf_counter()
+        dets = det.detect(frame)
+        elapsed += time.perf_counter() - start
+        if frames == 0:
+            h, w = frame.shape[:2]
+            print(f"Frame {w}x{h}: {len(TileGrid.get(w, h, det.pre.width, det.pre.height, args.overlap))} tiles")
+        frames += 1
+        pixels += frame.shape[0] * frame.shape[1]
+        boxes += len(dets)
+
+    if not frames:
+        print("No frames.")
+        return
+    mpix = pixels / 1e6
+    print("\n" + "=" * 70)
+    print(f"TILED INFERENCE: {frames} frames, {det.tiles_run} tiles, {boxes} detections")
+    print("=" * 70)
+    print(f"  {frames / elapsed:.2f} FPS, {det.tiles_run / elapsed:.1f} tiles/s")
+    print(f"  {mpix / elapsed:.2f} MP/s  ({elapsed / mpix * 1000:.1f} ms per megapixel)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import argparse
+
+import numpy as np
+import tensorflow as tf
+
+from const_store import load_graph
+from graph_stats import op_histogram
+from rewrite_utils import (base_name, compare_graphs, const_value, consumers_map, graph_endpoints,
+                           make_const, make_node, node_map, print_comparison, prune, sample_feeds,
+                           save_graph_def, type_attr, unique_name)
+
+# --- CONFIG ---
+INPUT_GRAPH  = "frozen_yolo_clean.pb"
+OUTPUT_GRAPH = "frozen_yolo_sunk.pb"
+CHECK_FEEDS  = 2
+MAX_ROUNDS   = 200
+
+# Ops where op(transpose(x)) == transpose(op(x)) as long as every operand
+# gets the same transpose (constants are pre-transposed, scalars broadcast).
+UNARY_OPS = {
+    'Identity', 'Sigmoid', 'Tanh', 'Relu', 'Relu6', 'LeakyRelu', 'Elu', 'Selu', 'Softplus',
+    'Neg', 'Abs', 'Exp', 'Log', 'Sqrt', 'Rsqrt', 'Square', 'Erf', 'Floor', 'Round', 'Cast',
+}
+BINARY_OPS = {
+    'Add', 'AddV2', 'Sub', 'Mul', 'RealDiv', 'Maximum', 'Minimum', 'SquaredDifference', 'Pow',
+}
+REDUCE_OPS = {'Mean', 'Sum', 'Max', 'Min', 'Prod'}
+
+
+def _index_dtype(node):
+    """numpy dtype for a rewritten axis input: the node's Tidx, int32 where there is none (Split)."""
+    return tf.as_dtype(node.attr['Tidx'].type).as_numpy_dtype if 'Tidx' in node.attr else np.int32
+
+
+class _Sinker:
+    """
+    Moves Transpose nodes towards the outputs through layout-agnostic ops,
+    rewriting axes of Concat/Split/Pad/reductions on the way, and composes
+    or drops them where two meet. Works in place on a copy of the GraphDef.
+    """
+
+    def __init__(self, graph_def):
+        self.graph = tf.compat.v1.GraphDef()
+        self.graph.CopyFrom(graph_def)
+        self.nodes = node_map(self.graph)
+        self.counts = {'sunk': 0, 'composed': 0, 'cancelled': 0}
+
+    def add(self, node):
+        node.name = unique_name(self.nodes, node.name)
+        new = self.graph.node.add()
+        new.CopyFrom(node)
+        self.nodes[new.name] = new
+        return new.name
+
+    def perm_of(self, inp):
+        """perm if `inp` is the output of a Transpose with a constant perm, else None."""
+        node = self.nodes.get(base_name(inp))
+        if node is None or node.op != 'Transpose' or inp.startswith('^'):
+            return None
+        perm = const_value(self.nodes, node.input[1])
+        return None if perm is None else [int(p) for p in perm]
+
+    def transpose_after(self, node, perm):
+        """
+        `node` now computes the un-transposed result: rename it and give its
+        old name to a Transpose of it, so its consumers don't change.
+        """
+        name = node.name
+        del self.nodes[name]
+        node.name = unique_name(self.nodes, name + "/pre_transpose")
+        self.nodes[node.name] = node
+        dtype = node.attr['T'] if 'T' in node.attr else node.attr['DstT']
+        p = self.add(make_const(name + "/perm", np.array(perm, np.int32)))
+        self.add(make_node('Transpose', name, [node.name, p], T=dtype, Tperm=type_attr(tf.int32)))
+        self.counts['sunk'] += 1
+
+    def const_input(self, node, i, perm):
+        """Replace constant input i by its inverse-transposed value (broadcast to full rank)."""
+        value = const_value(self.nodes, node.input[i])
+        if value.ndim == 0 or value.size == 1:
+            return
+        value = value.reshape((1,) * (len(perm) - value.ndim) + value.shape)
+        inv = np.argsort(perm)
+        node.input[i] = self.add(make_const(node.name + f"/const_{i}_t", np.transpose(value, inv)))
+
+    # --- One step per op type; each returns True if it moved a transpose ---
+
+    def sink_through(self, node, single_use):
+        data = [i for i in node.input if not i.startswith('^')]
+        if node.op in UNARY_OPS:
+            perm = self.perm_of(data[0])
+            if perm is None or not single_use(data[0]):
+                return False
+            node.input[0] = self.nodes[base_name(data[0])].input[0]
+            self.transpose_after(node, perm)
+            return True
+
+        if node.op in BINARY_OPS:
+            perms = [self.perm_of(i) for i in data]
+            perm = next((p for p in perms if p is not None), None)
+            if perm is None or any(p is not None and p != perm for p in perms):
+                return False
+            if any(p is not None and not single_use(i) for i, p in zip(data, perms)):
+                return False
+            others = [i for i, p in enumerate(perms) if p is None]
+            values = [const_value(self.nodes, node.input[i]) for i in others]
+            if any(v is None or v.ndim > len(perm) for v in values):
+                return False
+            for i, p in enumerate(perms):
+                if p is not None:
+                    node.input[i] = self.nodes[base_name(node.input[i])].input[0]
+            for i in others:
+                self.const_input(node, i, perm)
+            self.transpose_after(node, perm)
+            return True
+
+        if node.op == 'ConcatV2':
+            values, axis_inp = data[:-1], data[-1]
+            perms = [self.perm_of(i) for i in values]
+            axis = const_value(self.nodes, axis_inp)
+            if axis is None or perms[0] is None or any(p != perms[0] for p in perms):
+                return False
+            if not all(single_use(i) for i in values):
+                return False
+            perm = perms[0]
+            for i, inp in enumerate(values):
+                node.input[i] = self.nodes[base_name(inp)].input[0]
+            node.input[len(values)] = self.add(make_const(
+                node.name + "/axis_t", np.array(perm[int(axis) % len(perm)], _index_dtype(node))))
+            self.transpose_after(node, perm)
+            return True
+
+        if node.op in ('Pad', 'PadV2', 'MirrorPad'):
+            perm = self.perm_of(data[0])
+            pads = const_value(self.nodes, data[1])
+            if perm is None or pads is None or not single_use(data[0]):
+                return False
+            new_pads = np.zeros_like(pads)
+            for i, p in enumerate(perm):
+                new_pads[p] = pads[i]
+            node.input[0] = self.nodes[base_name(data[0])].input[0]
+            node.input[1] = self.add(make_const(node.name + "/paddings_t", new_pads))
+            self.transpose_after(node, perm)
+            return True
+
+        if node.op in REDUCE_OPS:
+            perm = self.perm_of(data[0])
+            axes = const_value(self.nodes, data[1])
+            keep = 'keep_dims' in node.attr and node.attr['keep_dims'].b
+            if perm is None or axes is None or not keep or not single_use(data[0]):
+                return False
+            new_axes = np.array([perm[int(a) % len(perm)] for a in np.atleast_1d(axes)],
+                                _index_dtype(node))
+            node.input[0] = self.nodes[base_name(data[0])].input[0]
+            node.input[1] = self.add(make_const(node.name + "/axes_t", new_axes))
+            self.transpose_after(node, perm)
+            return True
+        return False
+
+    def sink_split(self, node, consumers):
+        """Split(transpose(x)) -> transposes after each output, only if each output feeds a Transpose."""
+        value_idx, axis_idx = (1, 0) if node.op == 'Split' else (0, 2)
+        perm = self.perm_of(node.input[value_idx])
+        axis = const_value(self.nodes, node.input[axis_idx])
+        if perm is None or axis is None or len(consumers[base_name(node.input[value_idx])]) != 1:
+            return False
+        users = consumers[node.name]
+        if not users or any(c.op != 'Transpose' or i != 0 for c, i in users):
+            return False
+        if any(const_value(self.nodes, c.input[1]) is None for c, _ in users):
+            return False
+        node.input[value_idx] = self.nodes[base_name(node.input[value_idx])].input[0]
+        node.input[axis_idx] = self.add(make_const(
+            node.name + "/axis_t", np.array(perm[int(axis) % len(perm)], _index_dtype(node))))
+        # Each consuming Transpose(q) of a split output becomes Transpose(perm[q])
+        for c, _ in users:
+            outer = [int(q) for q in const_value(self.nodes, c.input[1])]
+            c.input[1] = self.add(make_const(c.name + "/composed_perm",
+                                             np.array([perm[q] for q in outer], np.int32)))
+        self.counts['sunk'] += 1
+        return True
+
+    def merge_transposes(self):
+        """
+        Transpose(Transpose(x)) -> one Transpose; identity perms -> Identity.
+        The inner one stays only if something else still reads it.
+        """
+        changed = False
+        for n in list(self.graph.node):
+            if n.op != 'Transpose' or n.name not in self.nodes:
+                continue
+            perm = const_value(self.nodes, n.input[1])
+            if perm is None:
+                continue
+            perm = [int(p) for p in perm]
+            inner = self.perm_of(n.input[0])
+            if inner is not None:
+                src = self.nodes[base_name(n.input[0])].input[0]
+                perm = [inner[p] for p in perm]
+                n.input[0] = src
+                n.input[1] = self.add(make_const(n.name + "/composed_perm", np.array(perm, np.int32)))
+                self.counts['composed'] += 1
+                changed = True
+            if perm == list(range(len(perm))):
+                n.op = 'Identity'
+                del n.input[1:]
+                n.attr.pop('Tperm', None)
+                self.counts['cancelled'] += 1
+                changed = True
+        return changed
+
+    def run(self, outputs, max_rounds=MAX_ROUNDS):
+        """
+        Rounds of moves until nothing moves. Within a round every independent
+        move is made: a node is skipped if it or one of its inputs was touched
+        by an earlier move, since the consumer map no longer describes it.
+        """
+        for _ in range(max_rounds):
+            consumers = consumers_map(self.graph)
+
+            def single_use(inp):
+                return len(consumers[base_name(inp)]) == 1
+
+            moved = False
+            touched = set()
+            for n in list(self.graph.node):
+                name = n.name
+                inputs = {base_name(i) for i in n.input if not i.startswith('^')}
+                if name in touched or inputs & touched:
+                    continue
+                if n.op in ('Split', 'SplitV'):
+                    users = {c.name for c, _ in consumers[name]}
+                    if users & touched or not self.sink_split(n, consumers):
+                        continue
+                    touched |= users
+                elif not self.sink_through(n, single_use):
+                    continue
+                touched |= inputs | {name, n.name}
+                moved = True
+            moved |= self.merge_transposes()
+            self.graph = prune(self.graph, outputs)
+            self.nodes = node_map(self.graph)
+            if not moved:
+                break
+        else:
+            print(f"WARNING: transpose sinking stopped after {max_rounds} rounds, "
+                  f"before reaching a fixpoint")
+        return self.graph
+
+
+def sink_transposes(graph_def, outputs):
+    """Returns (graph_def, counts)."""
+    sinker = _Sinker(graph_def)
+    return sinker.run([base_name(o) for o in outputs]), sinker.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push Transposes through layout-agnostic ops")
+    parser.add_argument("input", nargs='?', default=INPUT_GRAPH)
+    parser.add_argument("output", nargs='?', default=OUTPUT_GRAPH)
+    parser.add_argument("--packed", action="store_true",
+                        help="write only the const-store topology, not the full .pb")
+    args = parser.parse_args()
+
+    print(f"Loading {args.input}...")
+    original = load_graph(args.input)
+    _, outputs = graph_endpoints(original)
+    before = op_histogram(original)
+
+    sunk, counts = sink_transposes(original, outputs)
+    after = op_histogram(sunk)
+
+    print("\n" + "=" * 70)
+    print("TRANSPOSE SINKING")
+    print("=" * 70)
+    for key, count in counts.items():
+        print(f"  {key}: {count}")
+    print(f"  Transpose: {before.get('Transpose', 0)} -> {after.get('Transpose', 0)}")
+    print(f"  Nodes: {len(original.node)} -> {len(sunk.node)}")
+
+    print("\n" + "=" * 70)
+    print("NUMERICAL CHECK (original vs sunk)")
+    print("=" * 70)
+    feeds = sample_feeds(original, CHECK_FEEDS)
+    if not print_comparison(compare_graphs(original, sunk, outputs, feeds)):
+        print("\nERROR: Rewritten graph is not equivalent - not saving.")
+        return
+    save_graph_def(sunk, args.output, full=not args.packed)
+    print(f"\nSaved to {args.output}")
+
+    remaining = [n for n in sunk.node if n.op == 'Transpose']
+    if remaining:
+        print(f"\n{len(remaining)} Transposes left (next to a Reshape/Conv/MatMul or an output):")
+        consumers = consumers_map(sunk)
+        for n in remaining[:15]:
+            users = ", ".join(sorted({c.op for c, _ in consumers[n.name]})) or "output"
+            print(f"  {n.name} -> {users}")
+
+
+if __name__ == "__main__":
+    main()
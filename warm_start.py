@@ -0,0 +1,297 @@
+import argparse
+import os
+import pickle
+import socket
+import socketserver
+import stat
+import struct
+import time
+
+import numpy as np
+
+from artifact_manifest import check_manifest
+
+# A long-lived worker that keeps `import tensorflow`, the loaded SavedModels
+# and their traced signatures around, so short CLI jobs skip all three.
+# Every job is a plain function below: run_job() sends it to the worker when
+# one is listening and otherwise runs it in-process (cold), so the tools
+# behave the same either way - just slower without the worker.
+#
+# Jobs travel as pickles, so the socket lives in a 0700 per-user directory
+# and both ends check that the other side is the same user before unpickling
+# anything. Path arguments are made absolute on the client; the worker keeps
+# its own cwd, so start it from the project directory.
+
+# --- CONFIG ---
+SOCKET_NAME = "yolo_warm.sock"
+PRELOAD     = ["yolo12_tf_fixed"]
+PATH_ARGS   = ("model_dir", "output_dir", "output_path")
+
+_models = {}     # path -> (mtime, loaded SavedModel object)
+_keras = {}      # path -> (mtime, Keras model)
+
+
+def _socket_dir():
+    """Per-user 0700 directory: $XDG_RUNTIME_DIR if set, else ~/.cache/yolo_warm."""
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    path = os.path.join(base, "yolo_warm") if base else os.path.expanduser("~/.cache/yolo_warm")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def _check_private(path):
+    """Raise unless `path` is owned by us and not writable by group or others."""
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is not private to uid {os.getuid()}")
+
+
+def default_socket():
+    return os.path.join(_socket_dir(), SOCKET_NAME)
+
+
+def _peer_uid(sock):
+    """uid of the process on the other end of a Unix socket (Linux SO_PEERCRED)."""
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+def _mtime(path):
+    """mtime of the file that changes when a model is rewritten (saved_model.pb for a directory)."""
+    pb = os.path.join(path, "saved_model.pb")
+    return os.path.getmtime(pb if os.path.isdir(path) else path)
+
+
+def _cached(cache, path, load):
+    """cache[path], reloaded if the model on disk changed since it was loaded."""
+    path = os.path.abspath(path)
+    mtime = _mtime(path)
+    if path not in cache or cache[path][0] != mtime:
+        check_manifest(path)
+        cache[path] = (mtime, load(path))
+    return cache[path][1]
+
+
+def _forget(path):
+    """Drop cached models for a path a job has just written."""
+    path = os.path.abspath(path)
+    _models.pop(path, None)
+    _keras.pop(path, None)
+
+
+def _saved_model(path):
+    import tensorflow as tf
+    return _cached(_models, path, tf.saved_model.load)
+
+
+def _signature(path):
+    fn = _saved_model(path).signatures["serving_default"]
+    input_name, spec = list(fn.structured_input_signature[1].items())[0]
+    return fn, input_name, spec
+
+
+def _keras_model(path):
+    import tensorflow as tf
+    return _cached(_keras, path, tf.keras.models.load_model)
+
+
+# ----------------------------------------------------------------------------
+# Jobs (run in the worker, or in-process as the cold fallback)
+# ----------------------------------------------------------------------------
+
+def job_ping():
+    return {'pid': os.getpid(), 'models': sorted(_models), 'keras': sorted(_keras)}
+
+
+def job_warm(model_dir):
+    """Load and trace the signature once with zeros."""
+    fn, input_name, spec = _signature(model_dir)
+    shape = [d if d is not None else 1 for d in spec.shape.as_list()]
+    fn(**{input_name: np.zeros(shape, spec.dtype.as_numpy_dtype)})
+    return {'input': input_name, 'shape': shape}
+
+
+def job_infer(model_dir, batch):
+    """serving_default on one batch -> {output key: ndarray}."""
+    fn, input_name, _ = _signature(model_dir)
+    return {k: v.numpy() for k, v in fn(**{input_name: batch}).items()}
+
+
+def job_freeze(model_dir):
+    """Frozen serving_default -> (serialized GraphDef, input names, output names)."""
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+    frozen = convert_variables_to_constants_v2(_signature(model_dir)[0])
+    return (frozen.graph.as_graph_def().SerializeToString(),
+            [t.name for t in frozen.inputs], [t.name for t in frozen.outputs])
+
+
+def job_add_signature(model_dir, output_dir, input_shape, input_name='images'):
+    import tensorflow as tf
+    obj = _saved_model(model_dir)
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=input_shape, dtype=tf.float32, name=input_name)])
+    def serving_fn(images):
+        return obj(images)
+
+    tf.saved_model.save(obj, output_dir, signatures={'serving_default': serving_fn})
+    _forget(output_dir)
+    return output_dir
+
+
+def job_quantize(model_dir, output_path):
+    from quantize_yolo import quantize
+    quantize(_keras_model(model_dir), output_path)
+    _forget(output_path)
+    return output_path
+
+
+JOBS = {
+    'ping': job_ping,
+    'warm': job_warm,
+    'infer': job_infer,
+    'freeze': job_freeze,
+    'add_signature': job_add_signature,
+    'quantize': job_quantize,
+}
+
+
+# ----------------------------------------------------------------------------
+# Wire format: 8-byte length + pickle, both directions (same-user socket only)
+# ----------------------------------------------------------------------------
+
+def _send(sock, obj):
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(struct.pack("!Q", len(payload)) + payload)
+
+
+def _recv(sock):
+    header = _recv_exact(sock, 8)
+    return pickle.loads(_recv_exact(sock, struct.unpack("!Q", header)[0]))
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("warm worker closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        if _peer_uid(self.request) != os.getuid():
+            print("  rejected a connection from another user")
+            return
+        while True:
+            try:
+                job, kwargs = _recv(self.request)
+            except ConnectionError:
+                return
+            start = time.perf_counter()
+            try:
+                reply = ('ok', JOBS[job](**kwargs))
+            except Exception as e:
+                reply = ('error', f"{type(e).__name__}: {e}")
+            print(f"  {job}: {reply[0]} in {time.perf_counter() - start:.2f}s")
+            _send(self.request, reply)
+
+
+class WarmClient:
+    def __init__(self, sock):
+        self.sock = sock
+
+    def call(self, job, **kwargs):
+        # The worker has its own cwd: relative paths mean the client's
+        kwargs = {k: os.path.abspath(v) if k in PATH_ARGS else v for k, v in kwargs.items()}
+        _send(self.sock, (job, kwargs))
+        status, result = _recv(self.sock)
+        if status != 'ok':
+            raise RuntimeError(f"warm worker: {result}")
+        return result
+
+    def close(self):
+        self.sock.close()
+
+
+def connect(socket_path=None):
+    """WarmClient if a worker owned by this user is listening, else None."""
+    socket_path = socket_path or default_socket()
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        _check_private(os.path.dirname(os.path.abspath(socket_path)))
+        _check_private(socket_path)
+    except PermissionError as e:
+        print(f"[warm_start] ignoring worker socket: {e}")
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        if _peer_uid(sock) != os.getuid():
+            raise PermissionError("worker runs as another user")
+    except OSError:     # PermissionError included
+        sock.close()
+        return None
+    return WarmClient(sock)
+
+
+def run_job(job, socket_path=None, **kwargs):
+    """Run `job` on the warm worker if there is one, otherwise cold in this process."""
+    socket_path = socket_path or default_socket()
+    client = connect(socket_path)
+    if client is None:
+        print(f"[warm_start] no worker at {socket_path}, loading cold")
+        return JOBS[job](**kwargs)
+    try:
+        print(f"[warm_start] using worker at {socket_path}")
+        return client.call(job, **kwargs)
+    finally:
+        client.close()
+
+
+def serve(socket_path=None, preload=PRELOAD):
+    socket_path = socket_path or default_socket()
+    _check_private(os.path.dirname(os.path.abspath(socket_path)))
+    start = time.perf_counter()
+    for path in preload:
+        print(f"Preloading {path}: {job_warm(path)}")
+    print(f"Warm in {time.perf_counter() - start:.1f}s")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    # One job at a time: TF already parallelizes inside a run, and jobs share the model cache
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _Handler)
+    finally:
+        os.umask(old_umask)
+    with server:
+        print(f"Warm worker listening on {socket_path} (pid {os.getpid()})")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent warm TensorFlow worker")
+    parser.add_argument("cmd", choices=["serve", "ping"])
+    parser.add_argument("--socket", help="default: yolo_warm/yolo_warm.sock in $XDG_RUNTIME_DIR or ~/.cache")
+    parser.add_argument("--preload", nargs="*", default=PRELOAD)
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve(args.socket, args.preload)
+    else:
+        client = connect(args.socket)
+        if client is None:
+            print(f"No worker at {args.socket or default_socket()}")
+            return
+        print(client.call('ping'))
+        client.close()
+
+
+if __name__ == "__main__":
+    main()